@@ -0,0 +1,474 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# ----------------------------------------------------------------------
+# Author:        yury.matveev@desy.de
+# ----------------------------------------------------------------------
+
+"""
+Headless benchmark of frame pipeline: DataSource2D with Dummy proxy, no display.
+
+Two modes:
+
+    live (default): acquisition is started with DataSource2D.start, Dummy camera thread generates frames
+                    at requested rate (--fps), acquisition and analysis threads run as in the application,
+                    and the benchmark main thread plays the frame viewer: takes every new frame for display.
+                    So pacing and hand-off contention between threads are included. Measured: processed,
+                    analysed and displayed frames/s, latencies of stages and dropped frames per hand-off
+                    (pipeline telemetry), CPU time and allocations (tracemalloc, all threads) per frame.
+
+    stages (--stages): only the processing stages are measured. Pre-generated frames are passed
+                    synchronously in one thread through the same code, as during acquisition (frames are
+                    injected into camera proxy and DataSource2D directly, so this mode uses their internals):
+
+                        acquisition: camera proxy publishes frame, DataSource2D takes it (rotation, flip, reduction)
+                        display:     frame preparation for display (dark image subtraction, level mode)
+                        analysis:    ROIs statistics and peak search
+
+                    There is no pacing and no contention, the numbers show the cost of processing only.
+
+For each combination of frame size, dtype, ROI count, level mode, dark subtraction and peak search
+results are printed (or saved) as JSON, so they can be compared between releases.
+
+Usage:
+    python3 benchmarks/pipeline_benchmark.py --output results.json
+    python3 benchmarks/pipeline_benchmark.py --quick --fps 100
+    python3 benchmarks/pipeline_benchmark.py --stages --quick
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import tempfile
+import itertools
+import tracemalloc
+
+from datetime import datetime
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from PyQt5 import QtCore
+
+from petra_camera.version import __version__
+from petra_camera.constants import APP_NAME
+from petra_camera.utils.xmlsettings import XmlSettings
+from petra_camera.devices.datasource2d import DataSource2D, peak_search
+
+CAMERA_NAME = 'pipeline_benchmark'
+
+CONFIG = """<camera_viewer version="2.0">
+    <roi font="Arial,10" bg_color="#1e90ff" fg_color="#ffffff" fr_color="#ff0000"/>
+    <camera id="0" name="{name}" proxy="Dummy" enabled="True" {attributes}/>
+</camera_viewer>
+"""
+
+# Dummy frames for live mode: the same spots, as in stages mode
+LIVE_CAMERA = 'width="{size}" height="{size}" dtype="{dtype}" spots="3" noise="5"'
+
+SIZES = (500, 1024, 2048, 4096)
+DTYPES = ('uint8', 'uint16', 'float64')
+ROIS = (0, 1, 8)
+LEVEL_MODES = ('lin', 'sqrt', 'log')
+
+QUICK_SIZES = (500, 1024)
+QUICK_DTYPES = ('uint16',)
+QUICK_ROIS = (1,)
+QUICK_LEVEL_MODES = ('lin', 'log')
+
+FRAME_BANK = 3          # frames are generated in advance and used in turn
+ALLOCATION_FRAMES = 5   # frames, measured with tracemalloc
+
+LIVE_FPS = 1000         # requested rate in live mode, Dummy maximum: as fast as pipeline can
+WARM_UP_TIME = 0.5      # [s], live mode, before measurement
+ALLOCATION_TIME = 0.5   # [s], live mode, measured with tracemalloc
+DISPLAY_POLL = 0.001    # [s], live mode, how often "display" checks for new frame
+START_TIMEOUT = 10      # [s], live mode, wait for the first frame
+
+
+# ----------------------------------------------------------------------
+def make_frames(size, dtype, number=FRAME_BANK):
+    """
+    generates frames with several gaussian spots and noise, scaled to dtype range
+
+    :param size: int, frame width and height
+    :param dtype: str
+    :param number: int, number of frames
+    :return: list of 2d np.array
+    """
+    rng = np.random.default_rng(0)
+
+    axis = np.linspace(-1, 1, size)
+    x, y = axis[:, None], axis[None, :]
+
+    base = np.zeros((size, size))
+    for cx, cy, sigma in ((0., 0., 0.1), (0.5, -0.4, 0.05), (-0.6, 0.3, 0.08)):
+        base += np.exp(-((x - cx) ** 2 + (y - cy) ** 2) / (2 * sigma ** 2))
+
+    if np.issubdtype(np.dtype(dtype), np.integer):
+        scale = 0.8 * np.iinfo(dtype).max
+    else:
+        scale = 1000.
+
+    frames = []
+    for _ in range(number):
+        frame = (base + 0.05 * rng.random((size, size))) * scale / 1.05
+        frames.append(frame.astype(dtype))
+
+    return frames
+
+
+# ----------------------------------------------------------------------
+def make_data_source(folder, name, attributes=''):
+    """
+
+    :param folder: str, where config is written
+    :param name: str, camera name (settings are kept per camera)
+    :param attributes: str, attributes of Dummy camera node
+    :return: DataSource2D
+    """
+    config_file = os.path.join(folder, '{}.xml'.format(name))
+    with open(config_file, 'w') as f:
+        f.write(CONFIG.format(name=name, attributes=attributes))
+
+    data_source = DataSource2D(XmlSettings(config_file), 0)
+    if not data_source.load_status[0]:
+        raise RuntimeError('Cannot load camera: {}'.format(data_source.load_status[1]))
+
+    return data_source
+
+
+# ----------------------------------------------------------------------
+def configure(data_source, size, num_rois, level_mode, dark, peaks, frames=None):
+    """
+    sets data source to requested state
+
+    :param frames: list of frames for stages mode, None - live mode: acquisition is running
+    """
+    data_source.set_picture_clip((0, 0, size, size))
+    data_source.set_reduction(1)
+
+    while data_source.num_roi():
+        data_source.delete_roi(0)
+
+    step = max(size // (num_rois + 1), 1)
+    for ind in range(num_rois):
+        data_source.add_roi()
+        data_source.set_roi_value(ind, 'x', ind * step // 2)
+        data_source.set_roi_value(ind, 'y', ind * step // 2)
+        data_source.set_roi_value(ind, 'w', size // 2)
+        data_source.set_roi_value(ind, 'h', size // 2)
+
+    data_source.level_mode = level_mode
+
+    data_source.toggle_dark_image(False)
+    if dark:
+        if frames is not None:
+            run_frame(data_source, frames[-1])
+        data_source.set_dark_image()
+        data_source.toggle_dark_image(True)
+
+    data_source.peak_search.update({'search': peaks, 'search_mode': True, 'rel_threshold': 50})
+
+
+# ----------------------------------------------------------------------
+def run_frame(data_source, frame, stages=None):
+    """
+    stages mode: passes one frame through the pipeline, the same calls as acquisition thread does
+
+    :param data_source: DataSource2D
+    :param frame: 2d np.array
+    :param stages: dict, where cpu time of stages is accumulated
+    :return: None
+    """
+    proxy = data_source._device_proxy
+
+    start = time.process_time()
+    proxy._publish_frame(frame)
+    frame, info = proxy.maybe_read_frame()
+    info = data_source._store_frame(frame, info)
+    acquired = time.process_time()
+
+    data_source.get_frame()
+    displayed = time.process_time()
+
+    data_source.analyse_frame(info, frame)
+    analysed = time.process_time()
+
+    if stages is not None:
+        stages['acquisition'] += acquired - start
+        stages['display'] += displayed - acquired
+        stages['analysis'] += analysed - displayed
+
+
+# ----------------------------------------------------------------------
+def measure(data_source, frames, min_frames, min_time):
+    """
+    stages mode: measures speed and allocations for the current configuration
+
+    :return: dict with results
+    """
+    # warm up: caches, first allocations
+    for frame in frames:
+        run_frame(data_source, frame)
+
+    stages = {'acquisition': 0., 'display': 0., 'analysis': 0.}
+
+    count = 0
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    for frame in itertools.cycle(frames):
+        run_frame(data_source, frame, stages)
+        count += 1
+        if count >= min_frames and time.perf_counter() - wall_start >= min_time:
+            break
+
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    # transient memory, allocated while frame passes the pipeline (above what was allocated before)
+    tracemalloc.start()
+    allocated = 0
+    peak = 0
+    for frame in itertools.islice(itertools.cycle(frames), ALLOCATION_FRAMES):
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        run_frame(data_source, frame)
+        _, frame_peak = tracemalloc.get_traced_memory()
+        allocated += frame_peak - before
+        peak = max(peak, frame_peak - before)
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {'frames': count,
+            'fps': count / wall,
+            'wall_ms_per_frame': wall / count * 1000,
+            'cpu_ms_per_frame': cpu / count * 1000,
+            'stages_cpu_ms_per_frame': {name: value / count * 1000 for name, value in stages.items()},
+            'alloc_mb_per_frame': allocated / ALLOCATION_FRAMES / 2 ** 20,
+            'alloc_peak_mb': peak / 2 ** 20,
+            'retained_mb': retained / 2 ** 20}
+
+
+# ----------------------------------------------------------------------
+def display(data_source, duration):
+    """
+    live mode: plays frame viewer, takes each new frame for display, as fast as possible
+
+    :param data_source: DataSource2D
+    :param duration: float, [s]
+    :return: None
+    """
+    last_sequence = None
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        if data_source.frame_sequence == last_sequence:
+            time.sleep(DISPLAY_POLL)
+            continue
+
+        frame, info = data_source.get_frame(with_info=True)
+        if info is not None:
+            last_sequence = info.sequence
+            data_source.frame_displayed(info.replace(display_time=time.time()))
+
+
+# ----------------------------------------------------------------------
+def start_live(data_source, fps):
+    """
+    starts acquisition and waits for the first frame
+
+    :param data_source: DataSource2D
+    :param fps: int, requested rate
+    :return: None
+    """
+    data_source.save_settings('FPS', fps)
+    data_source.start(False)
+
+    end = time.perf_counter() + START_TIMEOUT
+    while not data_source.got_first_frame:
+        if time.perf_counter() > end:
+            raise RuntimeError('No frames from camera')
+        time.sleep(0.01)
+
+
+# ----------------------------------------------------------------------
+def measure_live(data_source, min_time):
+    """
+    live mode: measures rates, latencies, drops, CPU time and allocations with running acquisition
+
+    :return: dict with results
+    """
+    display(data_source, WARM_UP_TIME)
+
+    data_source.telemetry.reset()
+    dropped_before = data_source.get_telemetry()['dropped']
+
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    display(data_source, min_time)
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    achieved, requested = data_source.get_frame_rate()
+    telemetry = data_source.get_telemetry()
+
+    processed = telemetry['frames']['processed']
+    dropped = {name: value - dropped_before[name] if name != 'display' else value
+               for name, value in telemetry['dropped'].items()}
+
+    # transient memory of all threads, per processed frame
+    tracemalloc.start()
+    processed_before = data_source.get_telemetry()['frames']['processed']
+    before, _ = tracemalloc.get_traced_memory()
+    display(data_source, ALLOCATION_TIME)
+    _, peak = tracemalloc.get_traced_memory()
+    allocated_frames = data_source.get_telemetry()['frames']['processed'] - processed_before
+    tracemalloc.stop()
+
+    return {'frames': processed,
+            'requested_fps': requested,
+            'fps': processed / wall,
+            'analysed_fps': telemetry['frames']['analysed'] / wall,
+            'displayed_fps': telemetry['frames']['displayed'] / wall,
+            'achieved_fps': achieved,
+            'cpu_ms_per_frame': cpu / processed * 1000 if processed else None,
+            'cpu_load': cpu / wall,
+            'latency_ms': {name: {key: value[key] for key in ('mean', 'p50', 'p95', 'max')}
+                           for name, value in telemetry['latency'].items()},
+            'dropped': dropped,
+            'alloc_peak_mb': (peak - before) / 2 ** 20,
+            'alloc_frames': allocated_frames}
+
+
+# ----------------------------------------------------------------------
+def run_stages(folder, args, combinations):
+    """
+    stages mode: one data source, frames are injected
+
+    :return: list of results
+    """
+    data_source = make_data_source(folder, CAMERA_NAME)
+
+    results = []
+    try:
+        for size, dtype in itertools.product(args.sizes, args.dtypes):
+            frames = make_frames(size, dtype)
+            for num_rois, level_mode, dark, peak in combinations:
+                configure(data_source, size, num_rois, level_mode, dark, peak, frames)
+
+                result = {'size': size, 'dtype': dtype, 'rois': num_rois, 'level_mode': level_mode,
+                          'dark': dark, 'peak_search': peak}
+                result.update(measure(data_source, frames, args.frames, args.time))
+                results.append(result)
+
+                print('{size:>5} {dtype:>8} rois={rois} {level_mode:>4} dark={dark:d} peaks={peak_search:d}: '
+                      '{fps:8.1f} fps, {cpu_ms_per_frame:8.2f} ms cpu/frame, '
+                      '{alloc_mb_per_frame:8.2f} MB/frame'.format(**result), file=sys.stderr)
+    finally:
+        data_source.close_camera()
+
+    return results
+
+
+# ----------------------------------------------------------------------
+def run_live(folder, args, combinations):
+    """
+    live mode: data source with Dummy camera of requested size and dtype, acquisition is running
+
+    :return: list of results
+    """
+    results = []
+    for size, dtype in itertools.product(args.sizes, args.dtypes):
+        data_source = make_data_source(folder, '{}_{}_{}'.format(CAMERA_NAME, size, dtype),
+                                       LIVE_CAMERA.format(size=size, dtype=dtype))
+        try:
+            start_live(data_source, args.fps)
+            for num_rois, level_mode, dark, peak in combinations:
+                configure(data_source, size, num_rois, level_mode, dark, peak)
+
+                result = {'size': size, 'dtype': dtype, 'rois': num_rois, 'level_mode': level_mode,
+                          'dark': dark, 'peak_search': peak}
+                result.update(measure_live(data_source, args.time))
+                results.append(result)
+
+                print('{size:>5} {dtype:>8} rois={rois} {level_mode:>4} dark={dark:d} peaks={peak_search:d}: '
+                      '{fps:8.1f} fps ({analysed_fps:.1f} analysed, {displayed_fps:.1f} displayed), '
+                      '{cpu_load:5.2f} CPU, total latency p95 {total_p95} ms'
+                      ''.format(total_p95=result['latency_ms']['total']['p95'], **result), file=sys.stderr)
+        finally:
+            # acquisition thread of data source is not daemon, has to be stopped explicitly
+            data_source.stop(False)
+            data_source.close_camera()
+
+    return results
+
+
+# ----------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description='Headless benchmark of camera frame pipeline')
+    parser.add_argument('--sizes', type=int, nargs='+', help='frame sizes (square frames)')
+    parser.add_argument('--dtypes', nargs='+', help='frame dtypes')
+    parser.add_argument('--rois', type=int, nargs='+', help='numbers of ROIs')
+    parser.add_argument('--levels', nargs='+', choices=LEVEL_MODES, help='level modes')
+    parser.add_argument('--no-dark', action='store_true', help='skip runs with dark subtraction')
+    parser.add_argument('--no-peaks', action='store_true', help='skip runs with peak search')
+    parser.add_argument('--stages', action='store_true',
+                        help='measure processing stages only (synchronous, no acquisition threads)')
+    parser.add_argument('--fps', type=int, default=LIVE_FPS, help='requested acquisition rate in live mode')
+    parser.add_argument('--frames', type=int, default=20,
+                        help='stages mode: minimal number of frames per configuration')
+    parser.add_argument('--time', type=float, default=1., help='minimal time per configuration, s')
+    parser.add_argument('--quick', action='store_true', help='small set of configurations')
+    parser.add_argument('--output', help='JSON file, if not given results are printed')
+
+    args = parser.parse_args()
+
+    # noise gives a lot of peaks, warnings about it are not interesting here
+    logging.getLogger(APP_NAME).setLevel(logging.ERROR)
+
+    args.sizes = args.sizes or (QUICK_SIZES if args.quick else SIZES)
+    args.dtypes = args.dtypes or (QUICK_DTYPES if args.quick else DTYPES)
+    rois = args.rois or (QUICK_ROIS if args.quick else ROIS)
+    levels = args.levels or (QUICK_LEVEL_MODES if args.quick else LEVEL_MODES)
+    darks = (False,) if args.no_dark else (False, True)
+    peaks = (False,) if args.no_peaks or not peak_search else (False, True)
+
+    combinations = list(itertools.product(rois, levels, darks, peaks))
+
+    with tempfile.TemporaryDirectory() as folder:
+        # keep user settings untouched
+        QtCore.QSettings.setPath(QtCore.QSettings.NativeFormat, QtCore.QSettings.UserScope, folder)
+        QtCore.QSettings.setPath(QtCore.QSettings.IniFormat, QtCore.QSettings.UserScope, folder)
+
+        if args.stages:
+            results = run_stages(folder, args, combinations)
+        else:
+            results = run_live(folder, args, combinations)
+
+    report = {'version': __version__,
+              'date': datetime.now().isoformat(timespec='seconds'),
+              'python': platform.python_version(),
+              'numpy': np.__version__,
+              'platform': platform.platform(),
+              'processor': platform.processor(),
+              'cpu_count': os.cpu_count(),
+              'mode': 'stages' if args.stages else 'live',
+              'requested_fps': None if args.stages else args.fps,
+              'peak_search_available': peak_search,
+              'results': results}
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+# ----------------------------------------------------------------------
+if __name__ == '__main__':
+    main()
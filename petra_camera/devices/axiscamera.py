@@ -59,7 +59,6 @@ class AXISCamera(BaseCamera):
 
         self._image_source = 'imagergb' if self.color else 'imagegrayscale'
 
-        self._last_frame = np.zeros((1, 1))
         self._last_time = time.time()
 
         self._eid = None
@@ -151,8 +150,7 @@ class AXISCamera(BaseCamera):
             try:
                 data = event.attr_value
                 if data.quality == tango.AttrQuality.ATTR_VALID:
-                    self._last_frame = self._process_frame(data.value)
-                    self._new_frame_flag = True
+                    self._publish_frame(self._process_frame(data.value), data.time.totime())
                     return
                 else:
                     err = f"{self._my_name} error: AttrQuality is {data.quality}"
@@ -11,10 +11,12 @@ import logging
 import time
 import numpy as np
 
-from PyQt5 import QtCore
 from distutils.util import strtobool
 
 from petra_camera.devices.screen_motor import MotorExecutor
+from petra_camera.utils.frame_buffer import LatestFrame
+from petra_camera.utils.frame_info import FrameInfo
+from petra_camera.utils.settings_cache import SettingsCache, shared_qsettings, qsettings_lock
 
 from petra_camera.constants import APP_NAME
 logger = logging.getLogger(APP_NAME)
@@ -38,8 +40,7 @@ class BaseCamera(object):
 
         self._frame_size = None
 
-        self._new_frame_flag = False
-        self._last_frame = None
+        self._frame_buffer = LatestFrame()  # hands frames from camera threads/callbacks to DataSource2D
 
         self._eid = None  # Tango even ID
 
@@ -51,6 +52,18 @@ class BaseCamera(object):
 
         self._my_name = settings.get("name")
 
+        # settings from Tango servers are re-read after TTL, could be set in config
+        if 'settings_ttl' in settings.keys():
+            ttl = float(settings.get("settings_ttl"))
+            self._settings_cache = SettingsCache({'device_proxy': ttl, 'settings_proxy': ttl, 'roi_server': ttl})
+        else:
+            self._settings_cache = SettingsCache()
+
+        # settings, which Tango servers push with change events, are not polled
+        self._settings_events = []  # (proxy, event id)
+        self._event_driven_settings = set()  # options, which got valid value with the last event
+        self._settings_listeners = []
+
         # picture rotate and flip properties
         if 'flip_vertical' in settings.keys():
             self.flip_v = bool(strtobool(settings.get("flip_vertical")))
@@ -102,6 +115,9 @@ class BaseCamera(object):
         else:
             self._motor_worker = None
 
+        # all stored settings are read in one go, the following get_settings calls are served from cache
+        self.preload_settings()
+
         # for high resolution cameras to decrease CPU load
         self.reduce_resolution = max(self.get_settings('Reduce', int), 1)
 
@@ -112,12 +128,31 @@ class BaseCamera(object):
 
         self._picture_size = [size_x, size_y, size_x + size_w, size_y + size_h]
 
+        # Tango settings (exposure, gain, etc.) are pushed by servers, if they support change events.
+        # Subscription is done in post_init, when subclasses have completed the settings map
+        if 'settings_events' in settings.keys():
+            self._use_settings_events = bool(strtobool(settings.get("settings_events")))
+        else:
+            self._use_settings_events = True
+
+    # ----------------------------------------------------------------------
+    def post_init(self):
+        """
+        called by DataSource2D after camera proxy was completely constructed
+
+        :return: None
+        """
+        if self._use_settings_events:
+            self.subscribe_settings_events()
+
     # ----------------------------------------------------------------------
     def close_camera(self):
         """
         save camera close
         :return:
         """
+        self.unsubscribe_settings_events()
+
         if self._motor_worker is not None:
             self._motor_worker.stop()
 
@@ -127,6 +162,8 @@ class BaseCamera(object):
         self.error_msg = ''
         self.error_flag = False
 
+        self._frame_buffer.reset_statistics()
+
         return self._start_acquisition()
 
     # ----------------------------------------------------------------------
@@ -141,16 +178,51 @@ class BaseCamera(object):
     # ----------------------------------------------------------------------
     # ------------------------ Frame functionality -------------------------
     # ----------------------------------------------------------------------
-    def maybe_read_frame(self):
+    def _publish_frame(self, frame, event_time=None):
         """
+        called by camera threads or Tango callbacks, when new frame is received
 
-        :return: None if no new picture or 2d np.array if there is a new frame
+        :param frame: 2d np.array
+        :param event_time: float, time stamp of frame given by camera or Tango event, if known
+        :return: None
         """
-        if not self._new_frame_flag:
-            return None
+        info = FrameInfo(event_time=event_time, receive_time=time.time(), clip=self.get_picture_clip(),
+                         dtype=str(frame.dtype))
 
-        self._new_frame_flag = False
-        return self.rotate()
+        self._frame_buffer.put((frame, info))
+
+    # ----------------------------------------------------------------------
+    def maybe_read_frame(self, timeout=0):
+        """
+
+        :param timeout: float, how long to wait for a new frame, 0 - do not wait
+        :return: (None, None) if no new picture or (2d np.array, FrameInfo) if there is a new frame
+        """
+        sequence, data = self._frame_buffer.get(timeout)
+        if data is None:
+            return None, None
+
+        frame, info = data
+        info = info.replace(sequence=sequence, reduction=self.reduce_resolution, rotation=self.rotate_angle,
+                            flip_v=self.flip_v, flip_h=self.flip_h)
+
+        return self.rotate(frame, info), info
+
+    # ----------------------------------------------------------------------
+    def get_dropped_frames(self):
+        """
+
+        :return: int, frames, which were replaced by newer ones before DataSource2D took them
+        """
+        return self._frame_buffer.overwritten
+
+    # ----------------------------------------------------------------------
+    def wake_frame_reader(self):
+        """
+        interrupts maybe_read_frame, which is waiting for new frame
+        :return: None
+        """
+        self._frame_buffer.wake()
 
     # ----------------------------------------------------------------------
     def maybe_read_msg(self):
@@ -161,23 +233,28 @@ class BaseCamera(object):
         return self._last_camera_msg
 
     # ----------------------------------------------------------------------
-    def rotate(self):
+    def rotate(self, frame, info=None):
         """
         rotate and flip picture
+        :param frame: 2d np.array
+        :param info: FrameInfo, if given - its geometry is used instead of the current one
         :return: 2d np.array
         """
+        if info is None:
+            info = FrameInfo(reduction=self.reduce_resolution, rotation=self.rotate_angle,
+                             flip_v=self.flip_v, flip_h=self.flip_h)
 
-        if self.flip_v and self.flip_h:
-            self._last_frame = self._last_frame[::-1, ::-1]
-        elif self.flip_v:
-            self._last_frame = self._last_frame[::, ::-1]
-        elif self.flip_h:
-            self._last_frame = self._last_frame[::-1, :]
+        if info.flip_v and info.flip_h:
+            frame = frame[::-1, ::-1]
+        elif info.flip_v:
+            frame = frame[::, ::-1]
+        elif info.flip_h:
+            frame = frame[::-1, :]
 
-        if self.rotate_angle:
-            self._last_frame = np.rot90(self._last_frame, self.rotate_angle)
+        if info.rotation:
+            frame = np.rot90(frame, info.rotation)
 
-        return self._last_frame[::self.reduce_resolution, ::self.reduce_resolution]
+        return frame[::info.reduction, ::info.reduction]
 
     # ----------------------------------------------------------------------
     def is_running(self):
@@ -264,32 +341,11 @@ class BaseCamera(object):
 
         _start_time = time.time()
 
-        if option in self._settings_map.keys():
-            try:
-                if self._settings_map[option][0] == 'roi_server' and self._roi_server is not None:
-                    value = getattr(self._roi_server, self._settings_map[option][1])
-
-                elif self._settings_map[option][0] == 'settings_proxy' and self._settings_proxy is not None:
-                    value = self._settings_proxy.read_attribute(self._settings_map[option][1]).value
-
-                elif self._settings_map[option][0] == 'device_proxy' and self._device_proxy is not None:
-                    value = self._device_proxy.read_attribute(self._settings_map[option][1]).value
-
-                elif self._settings_map[option][0] == 'self':
-                    value = getattr(self, self._settings_map[option][1])
-
-                elif self._settings_map[option][0] is None:
-                    value = None
-                else:
-                    raise RuntimeError('Unknown setting source')
-            except:
-                value = None
-
+        source = self._settings_map[option][0] if option in self._settings_map.keys() else 'qsettings'
+        if source in ['self', None]:
+            value = self._read_setting(option)
         else:
-            try:
-                value = QtCore.QSettings(APP_NAME).value("{}/{}".format(self._my_name, option))
-            except:
-                value = None
+            value = self._settings_cache.get(option, source, lambda: self._read_setting(option))
 
         if option in ['view_w', 'view_h']:
             if value is None or int(value) < 1:
@@ -365,11 +421,236 @@ class BaseCamera(object):
             elif option == "counter_h" and self.rotate_angle in [1, 3]:
                 value = roi('w')
 
-        if do_log:
+        if do_log and logger.isEnabledFor(logging.DEBUG):
             logger.debug(f'{self._my_name}: {cast.__name__}({option}): {value} (in {(time.time() - _start_time)*1000:.2f} msec)')
 
         return value
 
+    # ----------------------------------------------------------------------
+    def _read_setting(self, option):
+        """
+        reads raw value of setting from its source, bypassing cache
+
+        :param option: str, setting name
+        :return: value or None if it cannot be read
+        """
+        if option in self._settings_map.keys():
+            try:
+                if self._settings_map[option][0] == 'roi_server' and self._roi_server is not None:
+                    value = getattr(self._roi_server, self._settings_map[option][1])
+
+                elif self._settings_map[option][0] == 'settings_proxy' and self._settings_proxy is not None:
+                    value = self._settings_proxy.read_attribute(self._settings_map[option][1]).value
+
+                elif self._settings_map[option][0] == 'device_proxy' and self._device_proxy is not None:
+                    value = self._device_proxy.read_attribute(self._settings_map[option][1]).value
+
+                elif self._settings_map[option][0] == 'self':
+                    value = getattr(self, self._settings_map[option][1])
+
+                elif self._settings_map[option][0] is None:
+                    value = None
+                else:
+                    raise RuntimeError('Unknown setting source')
+            except:
+                value = None
+
+        else:
+            try:
+                with qsettings_lock():
+                    value = shared_qsettings().value("{}/{}".format(self._my_name, option))
+            except:
+                value = None
+
+        return value
+
+    # ----------------------------------------------------------------------
+    def preload_settings(self):
+        """
+        fills settings cache in bulk: all stored settings of camera with one QSettings group read
+        and all Tango mapped settings with one read_attributes call per device
+
+        :return: None
+        """
+        with qsettings_lock():
+            settings = shared_qsettings()
+            settings.beginGroup(self._my_name)
+            try:
+                for key in settings.childKeys():
+                    if key not in self._settings_map.keys():
+                        self._settings_cache.put(key, settings.value(key), 'qsettings')
+            finally:
+                settings.endGroup()
+
+        settings_map = self.get_tango_settings_map(list(self._settings_map.keys()))
+        for source in ['device_proxy', 'settings_proxy', 'roi_server']:
+            options = [(option, attribute) for option_source, _, option, attribute in settings_map
+                       if option_source == source]
+            if not options:
+                continue
+
+            proxy = [proxy for option_source, proxy, _, _ in settings_map if option_source == source][0]
+            try:
+                values = proxy.read_attributes([attribute for _, attribute in options])
+            except Exception as err:
+                logger.debug(f'{self._my_name}: cannot preload settings from {source}: {err}')
+                continue
+
+            for (option, _), value in zip(options, values):
+                if not getattr(value, 'has_failed', False):
+                    self._settings_cache.put(option, value.value, source)
+
+    # ----------------------------------------------------------------------
+    def subscribe_settings_events(self):
+        """
+        subscribes to CHANGE_EVENT and ATTR_CONF_EVENT of all Tango mapped settings.
+        Settings, for which server does not send events, stay polled
+
+        :return: None
+        """
+        for source, proxy, option, attribute in self.get_tango_settings_map(list(self._settings_map.keys())):
+            try:
+                eid = proxy.subscribe_event(attribute, tango.EventType.CHANGE_EVENT,
+                                            lambda event, x=option: self._setting_changed(event, x))
+            except tango.DevFailed as err:
+                logger.debug(f'{self._my_name}: no change events for {attribute}, will be polled: {err}')
+                continue
+
+            self._settings_events.append((proxy, eid))
+
+            try:
+                eid = proxy.subscribe_event(attribute, tango.EventType.ATTR_CONF_EVENT,
+                                            lambda event, x=option: self._setting_config_changed(event, x))
+                self._settings_events.append((proxy, eid))
+            except tango.DevFailed as err:
+                logger.debug(f'{self._my_name}: no configuration events for {attribute}: {err}')
+
+        if self._settings_events:
+            logger.info(f'{self._my_name}: settings updated by Tango events: {sorted(self._event_driven_settings)}')
+
+    # ----------------------------------------------------------------------
+    def unsubscribe_settings_events(self):
+        """
+
+        :return: None
+        """
+        for proxy, eid in self._settings_events:
+            try:
+                proxy.unsubscribe_event(eid)
+            except Exception as err:
+                logger.debug(f'{self._my_name}: cannot unsubscribe settings event: {err}')
+
+        self._settings_events = []
+        self._event_driven_settings = set()
+
+    # ----------------------------------------------------------------------
+    def _setting_changed(self, event, option):
+        """
+        callback for CHANGE_EVENT, called from Tango thread
+
+        :param event: tango.EventData
+        :param option: str, setting name
+        :return: None
+        """
+        if event.err:
+            # e.g. server restart, till the next good event the setting is read from server
+            self._event_driven_settings.discard(option)
+            self._settings_cache.invalidate(option)
+            logger.debug(f'{self._my_name}: error in change event of {option}: {event.errors}')
+        else:
+            self._settings_cache.put(option, event.attr_value.value, 'tango_event')
+            self._event_driven_settings.add(option)
+
+        self._notify_settings_listeners(option)
+
+    # ----------------------------------------------------------------------
+    def _setting_config_changed(self, event, option):
+        """
+        callback for ATTR_CONF_EVENT (e.g. new limits), called from Tango thread
+
+        :param event: tango.AttrConfEventData
+        :param option: str, setting name
+        :return: None
+        """
+        if not event.err:
+            self._notify_settings_listeners(option)
+
+    # ----------------------------------------------------------------------
+    def add_settings_listener(self, callback):
+        """
+
+        :param callback: callable(option), called, when setting was changed by other client.
+                         Could be called from any thread
+        :return: None
+        """
+        if callback not in self._settings_listeners:
+            self._settings_listeners.append(callback)
+
+    # ----------------------------------------------------------------------
+    def remove_settings_listener(self, callback):
+        if callback in self._settings_listeners:
+            self._settings_listeners.remove(callback)
+
+    # ----------------------------------------------------------------------
+    def _notify_settings_listeners(self, option):
+        for callback in list(self._settings_listeners):
+            try:
+                callback(option)
+            except Exception as err:
+                logger.error(f'{self._my_name}: error in settings listener: {err}')
+
+    # ----------------------------------------------------------------------
+    def get_tango_settings_map(self, options):
+        """
+        tells, which of settings are Tango attributes and have to be polled, so they can be read in batch.
+        Settings, updated by Tango events, are not included
+
+        :param options: list of settings names
+        :return: list of (source, DeviceProxy, option, attribute name)
+        """
+        proxies = {'device_proxy': self._device_proxy,
+                   'settings_proxy': self._settings_proxy,
+                   'roi_server': self._roi_server}
+
+        settings_map = []
+        for option in options:
+            if option in self._settings_map.keys() and option not in self._event_driven_settings:
+                source, attribute = self._settings_map[option]
+                if proxies.get(source) is not None:
+                    settings_map.append((source, proxies[source], option, attribute))
+
+        return settings_map
+
+    # ----------------------------------------------------------------------
+    def update_settings_cache(self, option, value, source):
+        """
+        puts value, read outside (e.g. in batch), to settings cache
+
+        :param option: str, setting name
+        :param value: raw value
+        :param source: str, setting source
+        :return: None
+        """
+        self._settings_cache.put(option, value, source)
+
+    # ----------------------------------------------------------------------
+    def invalidate_settings(self, option=None):
+        """
+        drops cached value, so it will be read from source
+
+        :param option: str, setting name, None - all settings
+        :return: None
+        """
+        self._settings_cache.invalidate(option)
+
+    # ----------------------------------------------------------------------
+    def get_settings_statistics(self):
+        """
+
+        :return: dict with settings cache hits and misses
+        """
+        return self._settings_cache.get_statistics()
+
     # ----------------------------------------------------------------------
     def save_settings(self, option, value):
         """
@@ -380,7 +661,8 @@ class BaseCamera(object):
         :return:
         """
 
-        logger.debug(f'{self._my_name}: setting {option}: new value {value}')
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f'{self._my_name}: setting {option}: new value {value}')
 
         if option in ["counter_x", "counter_y", "counter_w", "counter_h"]:
 
@@ -428,8 +710,16 @@ class BaseCamera(object):
 
             else:
                 raise RuntimeError(f'Unknown setting source {self._settings_map[option][0]}')
+
+            if option in self._event_driven_settings:
+                # server could correct (e.g. clip) written value, till the change event it is read from server
+                self._settings_cache.invalidate(option)
+            elif self._settings_map[option][0] not in ['self', None]:
+                self._settings_cache.put(option, value, self._settings_map[option][0])
         else:
-            QtCore.QSettings(APP_NAME).setValue("{}/{}".format(self._my_name, option), value)
+            with qsettings_lock():
+                shared_qsettings().setValue("{}/{}".format(self._my_name, option), value)
+            self._settings_cache.put(option, value, 'qsettings')
 
         if option == 'Reduce':
             self.reduce_resolution = value
@@ -11,14 +11,14 @@
 import numpy as np
 import tango
 import logging
-from watchdog.observers import Observer
-from watchdog.events import PatternMatchingEventHandler
 
 import os.path as ospath
 
 from PIL import Image
 
 from petra_camera.devices.base_camera import BaseCamera
+from petra_camera.utils.folder_watch import FolderWatcher, POLL_PERIOD, MAX_DEPTH
+from petra_camera.utils.file_ingest import FileIngest, BufferPool, WORKERS, SPARE_BUFFERS
 
 from petra_camera.constants import APP_NAME
 logger = logging.getLogger(APP_NAME)
@@ -44,17 +44,23 @@ class DalsaProxy(BaseCamera):
         else:
             self._possible_sources = ['Event', 'Files']
 
-        self._my_event_handler = PatternMatchingEventHandler(["*.tif"], "", False, True)
-        self._my_event_handler.on_created = self._on_created
+        # recursive - the whole folder tree is watched, newest - only the newest run folder,
+        # polling - the newest run folder is checked periodically (if inotify does not work, e.g. for GPFS)
+        watch_mode = str(settings.get("watch_mode")) if 'watch_mode' in settings.keys() else 'recursive'
+        poll_period = float(settings.get("poll_period")) if 'poll_period' in settings.keys() else POLL_PERIOD
+        watch_depth = int(settings.get("watch_depth")) if 'watch_depth' in settings.keys() else MAX_DEPTH
+        self._folder_watcher = FolderWatcher(self._my_name, ["*.tif"], self._on_file,
+                                             watch_mode, poll_period, watch_depth)
 
-        self._my_observer = None
+        # files are decoded in worker threads, only the newest complete file is shown
+        workers = int(settings.get("ingest_workers")) if 'ingest_workers' in settings.keys() else WORKERS
+        self._buffers = BufferPool(workers + SPARE_BUFFERS)
+        self._file_ingest = FileIngest(self._my_name, self._decode_file, self._publish_frame, workers)
 
         self._source = self._possible_sources[0]
 
         self.path = self._possible_folders[0]
 
-        self._last_frame = np.zeros((1, 1))
-
         self._running = False
 
     # ----------------------------------------------------------------------
@@ -79,9 +85,8 @@ class DalsaProxy(BaseCamera):
 
                 logger.debug(f'{self._my_name}: starting acquisition: file mode')
 
-                self._my_observer = Observer()
-                self._my_observer.schedule(self._my_event_handler, self.path, recursive=True)
-                self._my_observer.start()
+                self._file_ingest.start()
+                self._folder_watcher.start(self.path)
                 self._running = True
                 return True
             else:
@@ -99,8 +104,8 @@ class DalsaProxy(BaseCamera):
         elif self._source == 'Files':
 
             logger.debug(f'{self._my_name}: stopping acquisition: file mode')
-            self._my_observer.stop()
-            self._my_observer.join()
+            self._folder_watcher.stop()
+            self._file_ingest.stop()
 
         else:
             raise RuntimeError('Unknown mode')
@@ -116,9 +121,9 @@ class DalsaProxy(BaseCamera):
             try:
                 data = event.attr_value
                 if data.quality == tango.AttrQuality.ATTR_VALID:
-                    self._last_frame = np.array(data.value)[self._picture_size[0]:self._picture_size[2],
-                                       self._picture_size[1]:self._picture_size[3]]
-                    self._new_frame_flag = True
+                    self._publish_frame(np.array(data.value)[self._picture_size[0]:self._picture_size[2],
+                                                             self._picture_size[1]:self._picture_size[3]],
+                                        data.time.totime())
                     return
                 else:
                     err = f"{self._my_name} error: AttrQuality is {data.quality}"
@@ -131,15 +136,27 @@ class DalsaProxy(BaseCamera):
         logger.error(f'{self._my_name} error: {err}', exc_info=True)
 
     # ----------------------------------------------------------------------
-    def _on_created(self, event):
+    def _on_file(self, file_name, closed=False):
+
+        self.id = ' file: {}'.format(ospath.splitext(ospath.basename(file_name))[0])
+        self._file_ingest.file_event(file_name, closed)
+
+    # ----------------------------------------------------------------------
+    def _decode_file(self, file_name):
+        """
+        called from ingest worker threads
 
-        logger.debug(f'{self._my_name}: new file system event')
+        :param file_name: str
+        :return: 2d np.array, picture clip of image
+        """
+        with Image.open(file_name) as image:
+            image = np.asarray(image)[self._picture_size[0]:self._picture_size[2],
+                                      self._picture_size[1]:self._picture_size[3]]
 
-        self.id = ' file: {}'.format(ospath.splitext(ospath.basename(event.src_path))[0])
+        frame = self._buffers.get(image.shape, image.dtype)
+        np.copyto(frame, image)
 
-        self._last_frame = np.array(Image.open(event.src_path))[self._picture_size[0]:self._picture_size[2],
-                                                                self._picture_size[1]:self._picture_size[3]]
-        self._new_frame_flag = True
+        return frame
 
     # ----------------------------------------------------------------------
     def _set_new_path(self, path):
@@ -149,8 +166,7 @@ class DalsaProxy(BaseCamera):
         need_to_restart = self._running
         if self._running:
             self.stop_acquisition()
-            self._last_frame = np.zeros((1, 1))
-            self._new_frame_flag = True
+            self._publish_frame(np.zeros((1, 1)))
 
         self.path = path
 
@@ -205,8 +221,7 @@ class DalsaProxy(BaseCamera):
         need_to_restart = self._running
         if self._running:
             self.stop_acquisition()
-            self._last_frame = np.zeros((1, 1))
-            self._new_frame_flag = True
+            self._publish_frame(np.zeros((1, 1)))
 
         self._source = source
 
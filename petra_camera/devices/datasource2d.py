@@ -11,12 +11,12 @@ import logging
 import threading
 import time
 import json
-import math
 import tango
 
-import scipy.ndimage.measurements as scipymeasure
 import numpy as np
 
+from distutils.util import strtobool
+
 try:
     from skimage.feature import peak_local_max
     peak_search = True
@@ -24,18 +24,28 @@ except:
     peak_search = False
 
 from petra_camera.utils.errors import report_error
-from petra_camera.utils.functions import FWHM
+from petra_camera.utils.roi_statistics import RoiStatistics, IntegralImage, empty_roi_data
+from petra_camera.utils.frame_pacing import FramePacer
+from petra_camera.utils.frame_buffer import LatestFrame
+from petra_camera.utils.telemetry import PipelineTelemetry
+from petra_camera.utils.shared_frames import SharedFrameRing
+from petra_camera.utils.frame_history import FrameHistory
+from petra_camera.utils.frame_recorder import FrameRecorder, QUEUE_SIZE
 
 from PyQt5 import QtCore
 
 from petra_camera.constants import APP_NAME
 logger = logging.getLogger(APP_NAME)
 
+SHARED_MEMORY_SLOTS = 4
+
 
 # ----------------------------------------------------------------------
 class DataSource2D(QtCore.QObject):
     """
     """
+    FRAME_WAIT_TIMEOUT = 0.1  # [s], how long acquisition thread waits for new frame before checks camera state
+
     new_frame = QtCore.pyqtSignal()
 
     update_roi_statistics = QtCore.pyqtSignal()
@@ -44,6 +54,8 @@ class DataSource2D(QtCore.QObject):
 
     got_error = QtCore.pyqtSignal(str)
 
+    settings_changed = QtCore.pyqtSignal(str)  # setting was changed on Tango server (e.g. by other client)
+
     # ----------------------------------------------------------------------
     def __init__(self, settings, camera_id):
         """
@@ -62,12 +74,17 @@ class DataSource2D(QtCore.QObject):
 
         self._frame_mutex = QtCore.QMutex()  # sync access to frame
         self._last_frame = np.zeros((1, 1))  # keeps last read frame
+        self.frame_sequence = 0  # number of last read frame
+        self._last_frame_info = None  # FrameInfo of last read frame
+        self._analysis_worker = None  # thread, which calculates ROIs statistics and peak search
         self._last_camera_msg = ''
 
         self.got_first_frame = False
 
         self._state = "idle"
         self.fps_limit = 1
+        self._pacer = FramePacer(self.fps_limit)
+        self.telemetry = PipelineTelemetry()  # latencies and frame drops along the pipeline
 
         self.set_new_image = False
 
@@ -78,7 +95,10 @@ class DataSource2D(QtCore.QObject):
         # ROIs parameters and data
         self.rois = []
         self.rois_data = []
+        self._rois_mutex = QtCore.QMutex()  # ROIs are added/deleted by GUI, while analysis thread uses them
         self._counter_roi = 0
+        self._roi_statistics = RoiStatistics()
+        self.integral_image = None  # optional summed-area table of last analysed frame
 
         # ROIs parameters and data
         self.markers = []
@@ -87,6 +107,24 @@ class DataSource2D(QtCore.QObject):
         self.peak_search = {}
         self.peak_coordinates = []
 
+        # sequence number and FrameInfo of frame, used for the last ROIs statistics and peak search
+        self.analysis_sequence = 0
+        self.analysis_info = None
+        self._analysis_listeners = []  # callables(camera_id, ROIs data), called for each new analysed frame
+        self._frame_listeners = []  # callables(camera_id, frame, FrameInfo), called for each new frame
+
+        # optional ring of frames in shared memory for other processes, created with the first frame
+        self._shared_memory = None
+        self._shared_ring = None
+
+        # optional in-memory history of last frames
+        self.history = None
+        self._history_max_shape = None
+
+        # continuous recording to file
+        self._recorder = None
+        self._recorder_queue = QUEUE_SIZE
+
         self._dark_image = None
         self.subtract_dark_image = False
 
@@ -98,12 +136,34 @@ class DataSource2D(QtCore.QObject):
 
                     module = importlib.import_module("petra_camera.devices.{}".format(proxyClass.lower()))
                     self._device_proxy = getattr(module, proxyClass)(device)
+                    self._device_proxy.post_init()
 
                     self.device_name = device.get('name') + self._device_proxy.file_name
+                    self._device_proxy.add_settings_listener(self.settings_changed.emit)
+
+                    if 'integral_image' in device.keys() and strtobool(device.get('integral_image')):
+                        self.integral_image = IntegralImage()
+
+                    if 'shared_memory' in device.keys() and strtobool(device.get('shared_memory')):
+                        self._shared_memory = {'name': device.get('shared_memory_name')
+                                               if 'shared_memory_name' in device.keys() else f'petra_camera_{camera_id}',
+                                               'slots': int(device.get('shared_memory_slots'))
+                                               if 'shared_memory_slots' in device.keys() else SHARED_MEMORY_SLOTS,
+                                               'warned': False}
+
+                    if 'history_frames' in device.keys() or 'history_mb' in device.keys():
+                        self.history = FrameHistory(int(device.get('history_frames', 0)),
+                                                    float(device.get('history_mb', 0)))
+                        self._history_max_shape = (self.get_settings('max_width', int),
+                                                   self.get_settings('max_height', int))
+
+                    if 'recorder_queue' in device.keys():
+                        self._recorder_queue = int(device.get('recorder_queue'))
 
                     # reset flags and variables
                     self.got_first_frame = False
                     self._last_frame = np.zeros((1, 1))
+                    self._last_frame_info = None
 
                     # load LUT and levels settings
                     lut = self.get_settings('lut', str)
@@ -123,6 +183,9 @@ class DataSource2D(QtCore.QObject):
 
                     self.auto_screen = self.get_settings('auto_screen', bool)
 
+                    # sets the acquisition pacing
+                    self.get_settings('FPS', int)
+
                     # load ROI params
                     self.rois = []
                     self.rois_data = []
@@ -154,10 +217,7 @@ class DataSource2D(QtCore.QObject):
                             for setting in ['x', 'y', 'w', 'h']:
                                 self.save_settings('counter_{}'.format(setting), self.rois[ind][setting])
 
-                        self.rois_data.append(dict.fromkeys(['max_x', 'max_y', 'max_v',
-                                                             'min_x', 'min_y', 'min_v',
-                                                             'com_x', 'com_y', 'com_v',
-                                                             'fwhm_x', 'fwhm_y', 'sum']))
+                        self.rois_data.append(empty_roi_data())
 
                     # load markers params
                     self.markers = []
@@ -179,10 +239,17 @@ class DataSource2D(QtCore.QObject):
                     if self.peak_search['abs_threshold'] == 0:
                         self.peak_search['abs_threshold'] = 16000
 
+                    self._analysis_worker = AnalysisWorker(self)
+                    self._analysis_worker.start()
+
                     # if Tango server for camera already acquiring - start data thread
                     if self._device_proxy.is_running():
                         self.start(False)
 
+                    statistics = self._device_proxy.get_settings_statistics()
+                    logger.info(f"{self.device_name}: settings loaded, cache hits {statistics['hits']}, "
+                                f"misses {statistics['misses']}")
+
                     self.load_status = True, ''
                     return
 
@@ -208,9 +275,19 @@ class DataSource2D(QtCore.QObject):
         if self.is_running():
             self.stop(False)
 
+        self.stop_recording()
+
+        if self._analysis_worker is not None:
+            self._analysis_worker.stop()
+
         if self._device_proxy is not None:
+            self._device_proxy.remove_settings_listener(self.settings_changed.emit)
             self._device_proxy.close_camera()
 
+        if self._shared_ring is not None:
+            self._shared_ring.close()
+            self._shared_ring = None
+
     # ----------------------------------------------------------------------
     def start(self, auto_screen):
         """
@@ -235,6 +312,7 @@ class DataSource2D(QtCore.QObject):
         """
         if self._state != 'idle':
             self._state = "abort"
+            self._device_proxy.wake_frame_reader()
 
         while self._state != 'idle':
             time.sleep(0.1)
@@ -252,6 +330,7 @@ class DataSource2D(QtCore.QObject):
         """
         if self._worker:
             self._state = 'abort'
+            self._device_proxy.wake_frame_reader()
             self._worker.join()
 
         self._worker = threading.Thread(target=self.run, name=f'{self.device_name}_DataSource')
@@ -264,19 +343,28 @@ class DataSource2D(QtCore.QObject):
         """
         if self._start_acquisition():
 
+            self._pacer.reset()
+            self.telemetry.reset()
+            self._analysis_worker.reset_statistics()
+
             while self._state == "running":
 
-                frame = self._device_proxy.maybe_read_frame()
+                # the next frame is processed at the next slot of the schedule, meanwhile the newest frame wins
+                delay = self._pacer.time_to_deadline()
+                if delay:
+                    time.sleep(min(delay, self.FRAME_WAIT_TIMEOUT))
+                    continue
+
+                frame, info = self._device_proxy.maybe_read_frame(self.FRAME_WAIT_TIMEOUT)
 
                 if frame is not None:
-                    self.got_first_frame = True
-                    self._frame_mutex.lock()
-                    self._last_frame = frame
-                    self._frame_mutex.unlock()
+                    info = self._store_frame(frame, info)
                     self.new_frame.emit()
 
-                    self.calculate_roi_statistics()
-                    self.find_peaks()
+                    # analysis is done in separate thread, which takes only the newest frame
+                    self._analysis_worker.submit(info, frame)
+
+                    self._pacer.frame_done()
 
                 msg = self._device_proxy.maybe_read_msg()
                 if msg:
@@ -286,8 +374,6 @@ class DataSource2D(QtCore.QObject):
                     self.got_error.emit(str(self._device_proxy.error_msg))
                     self._state = "abort"
 
-                time.sleep(1 / self.fps_limit)  # to decrease processor load
-
             logger.info("Closing {}...".format(self.device_name))
 
             if self._device_proxy:
@@ -295,6 +381,40 @@ class DataSource2D(QtCore.QObject):
 
         self._state = "idle"
 
+    # ----------------------------------------------------------------------
+    def _store_frame(self, frame, info):
+        """
+        keeps new frame as the last one
+
+        :param frame: 2d np.array
+        :param info: FrameInfo
+        :return: FrameInfo with process time
+        """
+        info = info.replace(process_time=time.time())
+
+        self.got_first_frame = True
+        self._frame_mutex.lock()
+        self._last_frame = frame
+        self._last_frame_info = info
+        self.frame_sequence = info.sequence
+        self._frame_mutex.unlock()
+
+        self.telemetry.frame_processed(info)
+
+        if self._shared_memory is not None:
+            self._publish_shared(frame, info)
+
+        if self.history is not None:
+            self.history.add(frame, info, self._history_max_shape)
+
+        for callback in list(self._frame_listeners):
+            try:
+                callback(self.camera_id, frame, info)
+            except Exception as err:
+                logger.error(f'Error in frame listener: {err}')
+
+        return info
+
     # ----------------------------------------------------------------------
     def _start_acquisition(self):
         """
@@ -318,39 +438,223 @@ class DataSource2D(QtCore.QObject):
     # ----------------------------------------------------------------------
     # ---------------------- Frame functionality ---------------------------
     # ----------------------------------------------------------------------
-    def get_frame(self):
+    def get_frame(self, with_info=False):
         """
         returns last frame after applying dark image and level mode
-        :return: 2d np.array
+
+        :param with_info: if True, FrameInfo of this frame is returned as well
+        :return: 2d np.array or (2d np.array, FrameInfo or None)
         """
         self._frame_mutex.lock()
+        info = self._last_frame_info
+        frame = self._correct_frame(self._last_frame)
+        self._frame_mutex.unlock()
+        if np.max(frame) == 0:
+            frame = np.ones_like(frame)
+
+        if with_info:
+            return frame, info
+        else:
+            return frame
+
+    # ----------------------------------------------------------------------
+    def _correct_frame(self, frame):
+        """
+        applies dark image and level mode
+
+        :param frame: 2d np.array
+        :return: 2d np.array
+        """
         if self.subtract_dark_image and self._dark_image is not None:
             try:
-                invalid_idx = self._last_frame < self._dark_image
-                frame = self._last_frame - self._dark_image
+                invalid_idx = frame < self._dark_image
+                frame = frame - self._dark_image
                 frame[invalid_idx] = 0
             except:
                 self.subtract_dark_image = False
                 self._dark_image = None
-                frame = self._last_frame
-        else:
-            frame = self._last_frame
 
         if self.level_mode == 'sqrt':
             frame = np.sqrt(np.abs(frame))
         elif self.level_mode == 'log':
             frame = np.log(np.maximum(1, frame))
 
-        self._frame_mutex.unlock()
+        return frame
+
+    # ----------------------------------------------------------------------
+    def get_history_frame(self, index):
+        """
+        returns frame from history after applying dark image and level mode
+
+        :param index: int, 0 - the oldest frame in history, -1 - the newest
+        :return: (2d np.array, FrameInfo)
+        """
+        frame, info = self.history.get(index)
+        frame = self._correct_frame(frame)
         if np.max(frame) == 0:
-            return np.ones_like(frame)
-        else:
-            return frame
+            frame = np.ones_like(frame)
+
+        return frame, info
+
+    # ----------------------------------------------------------------------
+    def _publish_shared(self, frame, info):
+        """
+        copies frame to shared memory ring, ring slots are sized for full sensor with frame data type
+
+        :param frame: np.array
+        :param info: FrameInfo
+        :return: None
+        """
+        if self._shared_ring is None:
+            slot_bytes = self.get_settings('max_width', int) * self.get_settings('max_height', int) * frame.itemsize
+            if frame.ndim == 3:
+                slot_bytes *= frame.shape[2]
+
+            try:
+                self._shared_ring = SharedFrameRing(self._shared_memory['name'], self._shared_memory['slots'],
+                                                    max(slot_bytes, frame.nbytes))
+            except Exception as err:
+                logger.error(f'{self.device_name}: cannot create shared memory ring: {err}')
+                self._shared_memory = None
+                return
+
+        if not self._shared_ring.publish(frame, info) and not self._shared_memory['warned']:
+            self._shared_memory['warned'] = True
+            logger.warning(f'{self.device_name}: frame {frame.shape} {frame.dtype} does not fit to shared memory ring')
+
+    # ----------------------------------------------------------------------
+    def get_history_memory(self):
+        """
+
+        :return: int, memory in bytes, reserved for frame history (not necessarily in RSS yet)
+        """
+        if self.history is None:
+            return 0
+
+        return self.history.memory()
+
+    # ----------------------------------------------------------------------
+    def start_recording(self, file_name, max_frames=0):
+        """
+        starts recording of all new frames (as they came from camera proxy) to file in background thread
+
+        :param file_name: str, .h5/.hdf5/.nxs or .npy
+        :param max_frames: int, 0 - no limit
+        :return: None
+        """
+        self.stop_recording()
+
+        self._recorder = FrameRecorder(file_name, self.device_name, max_frames, self._recorder_queue)
+        self._recorder.start()
+        self.add_frame_listener(self._recorder.add_frame)
+
+        logger.info(f'{self.device_name}: recording to {file_name} started')
+
+    # ----------------------------------------------------------------------
+    def stop_recording(self):
+        """
+        stops recording, waits till all queued frames are written
+
+        :return: dict, recording statistics (see FrameRecorder.get_statistics) or None if there was no recording
+        """
+        if self._recorder is None:
+            return None
+
+        recorder, self._recorder = self._recorder, None
+        self.remove_frame_listener(recorder.add_frame)
+        recorder.stop()
+
+        return recorder.get_statistics()
+
+    # ----------------------------------------------------------------------
+    def get_recording_statistics(self):
+        """
+
+        :return: dict, recording statistics (see FrameRecorder.get_statistics) or None if there is no recording
+        """
+        recorder = self._recorder
+        if recorder is None:
+            return None
+
+        return recorder.get_statistics()
+
+    # ----------------------------------------------------------------------
+    def get_last_frame(self):
+        """
+        returns last frame as it came from camera proxy (after rotation, flip and reduction), without copy.
+        Frame is replaced, not modified, by new frames, so it can be used after return, but must not be changed
+
+        :return: (2d np.array, FrameInfo) or (None, None) if there was no frame yet
+        """
+        self._frame_mutex.lock()
+        frame, info = self._last_frame, self._last_frame_info
+        self._frame_mutex.unlock()
+
+        if info is None:
+            return None, None
+
+        return frame, info
+
+    # ----------------------------------------------------------------------
+    def add_frame_listener(self, callback):
+        """
+
+        :param callback: callable(camera_id, frame, FrameInfo), called from acquisition thread for each new frame,
+                         has to return quickly
+        :return: None
+        """
+        if callback not in self._frame_listeners:
+            self._frame_listeners.append(callback)
+
+    # ----------------------------------------------------------------------
+    def remove_frame_listener(self, callback):
+        if callback in self._frame_listeners:
+            self._frame_listeners.remove(callback)
+
+    # ----------------------------------------------------------------------
+    def get_frame_info(self):
+        """
+
+        :return: FrameInfo of last read frame or None if there was no frame yet
+        """
+        return self._last_frame_info
 
     # ----------------------------------------------------------------------
     def get_msg(self):
         return self._last_camera_msg
 
+    # ----------------------------------------------------------------------
+    def get_frame_rate(self):
+        """
+
+        :return: (float, float), achieved and requested acquisition rate
+        """
+        if self._state != 'running':
+            return 0., self.fps_limit
+
+        return self._pacer.get_rate()
+
+    # ----------------------------------------------------------------------
+    def frame_displayed(self, info):
+        """
+        called by frame viewer, when frame was painted
+
+        :param info: FrameInfo with display time
+        :return: None
+        """
+        self.telemetry.frame_displayed(info)
+
+    # ----------------------------------------------------------------------
+    def get_telemetry(self):
+        """
+
+        :return: dict with latencies per pipeline stage (ms) and dropped frames per hand-off
+        """
+        acquisition_dropped = self._device_proxy.get_dropped_frames() if self._device_proxy is not None else 0
+        analysis_dropped = self._analysis_worker.get_dropped_frames() if self._analysis_worker is not None else 0
+
+        return self.telemetry.get_summary(acquisition_dropped, analysis_dropped)
+
     # ----------------------------------------------------------------------
     # ------------------- Levels functionality ----------------------------
     # ----------------------------------------------------------------------
@@ -455,10 +759,46 @@ class DataSource2D(QtCore.QObject):
         self.rois[roi_id][setting] = value
         self.save_settings('roi_{}_{}'.format(roi_id, setting), value)
 
+        if setting in ['x', 'y', 'w', 'h']:
+            self._update_roi_sum(roi_id)
+
         if roi_id == self._counter_roi:
             if setting in ['x', 'y', 'w', 'h']:
                 self.save_settings('counter_{}'.format(setting), value)
 
+    # ----------------------------------------------------------------------
+    def _update_roi_sum(self, roi_id):
+        """
+        if integral image is enabled, updates ROI sum immediately without touching pixels,
+        the rest of statistics comes with the next analysis
+
+        :param roi_id: int
+        :return: None
+        """
+        if self.integral_image is None or not self.integral_image.is_ready():
+            return
+
+        roi = self.rois[roi_id]
+        if roi['bg']:
+            # thresholded sum cannot be taken from integral image
+            return
+
+        self.rois_data[roi_id]['sum'] = self.integral_image.sum(roi['x'], roi['y'], roi['w'], roi['h'])
+
+    # ----------------------------------------------------------------------
+    def get_rectangle_sum(self, x, y, w, h, background=0):
+        """
+        sum of arbitrary rectangle of last analysed frame
+
+        :param x, y, w, h: rectangle in frame coordinates
+        :param background: constant pedestal per pixel to be subtracted
+        :return: sum or None if integral image is disabled
+        """
+        if self.integral_image is None:
+            return None
+
+        return self.integral_image.background_sum(x, y, w, h, background)
+
     # ----------------------------------------------------------------------
     def num_roi(self):
         """
@@ -497,18 +837,41 @@ class DataSource2D(QtCore.QObject):
         """
         return self.rois_data[self._counter_roi][value]
 
+    # ----------------------------------------------------------------------
+    def get_active_roi_data(self):
+        """
+
+        :return: dict, statistics of counter ROI together with metadata of frame they were calculated for
+        """
+        data = dict(self.rois_data[self._counter_roi])
+        info = self.analysis_info
+        data['frame'] = info.as_dict() if info is not None else None
+
+        return data
+
+    # ----------------------------------------------------------------------
+    def get_all_roi_data(self):
+        """
+
+        :return: dict, statistics of all ROIs together with metadata of frame they were calculated for
+        """
+        info = self.analysis_info
+
+        return {'counter_roi': self._counter_roi,
+                'rois': [dict(data) for data in list(self.rois_data)],
+                'frame': info.as_dict() if info is not None else None}
+
     # ----------------------------------------------------------------------
     def add_roi(self):
         """
 
         :return: None
         """
+        self._rois_mutex.lock()
         self.rois.append({'x': 0, 'y': 0, 'w': 50, 'h': 50, 'bg': 0, 'visible': True, 'mark': '',
                           'color': self.settings.option('roi', 'fr_color')})
-        self.rois_data.append(dict.fromkeys(['max_x', 'max_y', 'max_v',
-                                             'min_x', 'min_y', 'min_v',
-                                             'com_x', 'com_y', 'com_v',
-                                             'fwhm_x', 'fwhm_y', 'sum']))
+        self.rois_data.append(empty_roi_data())
+        self._rois_mutex.unlock()
 
         self._save_roi_settings()
 
@@ -519,75 +882,116 @@ class DataSource2D(QtCore.QObject):
         :param index: roi to be deleted
         :return: None
         """
-
+        self._rois_mutex.lock()
         del self.rois[index]
         del self.rois_data[index]
+        self._rois_mutex.unlock()
+
         self._save_roi_settings()
 
     # ----------------------------------------------------------------------
     def calculate_roi_statistics(self):
         """
-        calculates ROIs statistics after new frame comes of ROIs parameter changed
+        requests recalculation of ROIs statistics for the last frame (e.g. after ROIs parameter changed)
+
+        :return: None
+        """
+        self._request_analysis()
 
+    # ----------------------------------------------------------------------
+    def _request_analysis(self):
+        """
+        resubmits last frame to analysis worker
         :return: None
         """
-        if self._last_frame is None:
+        if self._analysis_worker is None:
             return
 
-        for info, data in zip(self.rois, self.rois_data):
-            if info['visible']:
+        self._frame_mutex.lock()
+        info, frame = self._last_frame_info, self._last_frame
+        self._frame_mutex.unlock()
 
-                image_size = self.get_picture_clip()
-                _reduction = self.get_reduction()
+        self._analysis_worker.submit(info, frame)
 
-                _image_x_pos, _image_y_pos = image_size[0], image_size[1]
-                x, y, = int((info['x'] - _image_x_pos) // _reduction), int((info['y'] - _image_y_pos) // _reduction)
-                w, h = int(info['w'] // _reduction), int(info['h'] // _reduction)
+    # ----------------------------------------------------------------------
+    def analyse_frame(self, info, frame):
+        """
+        called by analysis worker: calculates ROIs statistics and does peak search for given frame
 
-                array = self._last_frame[x:x + w, y:y + h]
-                if array != []:
-                    array[array < info['bg']] = 0  # All low values set to 0
+        :param info: FrameInfo of frame or None (if there was no frame yet)
+        :param frame: 2d np.array
+        :return: None
+        """
+        if info is not None:
+            clip, reduction, sequence = info.clip, info.reduction, info.sequence
+        else:
+            clip, reduction, sequence = self.get_picture_clip(), self.get_reduction(), 0
 
-                    roi_sum = np.sum(array)
+        if self.integral_image is not None and frame is not None:
+            self.integral_image.build(frame, clip, reduction, sequence)
 
-                    try:
-                        roiExtrema = scipymeasure.extrema(array)  # all in one!
-                    except:
-                        roiExtrema = (0, 0, (0, 0), (0, 0))
+        self._calculate_roi_statistics(frame, clip, reduction)
+        self._find_peaks(frame)
 
-                    roi_max = (int(roiExtrema[3][0] + x + _image_x_pos), int(roiExtrema[3][1] + y + _image_y_pos))
-                    roi_min = (int(roiExtrema[2][0] + x + _image_x_pos), int(roiExtrema[2][1] + y + _image_y_pos))
+        # recalculations of the same frame (e.g. after ROI change) are not pipeline latency
+        new_frame = info is not None and sequence != self.analysis_sequence
+        if new_frame:
+            self.telemetry.frame_analysed(info, time.time())
 
-                    try:
-                        roi_com = scipymeasure.center_of_mass(array)
-                    except:
-                        roi_com = (0, 0)
+        self.analysis_sequence = sequence
+        self.analysis_info = info
 
-                    if math.isnan(roi_com[0]) or math.isnan(roi_com[1]):
-                        roi_com = (0, 0)
+        if new_frame and self._analysis_listeners:
+            data = self.get_all_roi_data()
+            for callback in list(self._analysis_listeners):
+                try:
+                    callback(self.camera_id, data)
+                except Exception as err:
+                    logger.error(f'Error in analysis listener: {err}')
 
-                    roi_com = (int(roi_com[0] + x + _image_x_pos), int(roi_com[1] + y + _image_y_pos))
+        self.update_roi_statistics.emit()
+        self.update_peak_search.emit()
 
-                    try:
-                        intensity_at_com = self._last_frame[int(round(roi_com[0])), int(round(roi_com[1]))]
-                    except:
-                        intensity_at_com = [0, 0]
+    # ----------------------------------------------------------------------
+    def add_analysis_listener(self, callback):
+        """
 
-                    roi_FWHM = (FWHM(np.sum(array, axis=1)), FWHM(np.sum(array, axis=0)))
+        :param callback: callable(camera_id, dict from get_all_roi_data), called from analysis thread
+                         for each new analysed frame, has to return quickly
+        :return: None
+        """
+        if callback not in self._analysis_listeners:
+            self._analysis_listeners.append(callback)
 
-                    data['max_x'], data['max_y'] = roi_max
-                    data['max_v'] = np.round(roiExtrema[1], 3)
+    # ----------------------------------------------------------------------
+    def remove_analysis_listener(self, callback):
+        if callback in self._analysis_listeners:
+            self._analysis_listeners.remove(callback)
 
-                    data['min_x'], data['min_y'] = roi_min
-                    data['min_v'] = np.round(roiExtrema[0], 3)
+    # ----------------------------------------------------------------------
+    def _calculate_roi_statistics(self, frame, clip, reduction):
+        """
+        calculates ROIs statistics for frame
 
-                    data['com_x'], data['com_y'] = roi_com
-                    data['com_v'] = np.round(intensity_at_com, 3)
+        :param frame: 2d np.array
+        :param clip: (x, y, w, h) - picture clip of frame
+        :param reduction: int, picture reduction of frame
+        :return: None
+        """
+        if frame is None:
+            return
 
-                    data['fwhm_x'], data['fwhm_y'] = roi_FWHM
-                    data['sum'] = np.round(roi_sum, 3)
+        # ROI and its data are taken together: if ROI is deleted meanwhile, results go to its orphaned data
+        self._rois_mutex.lock()
+        rois, rois_data = list(self.rois), list(self.rois_data)
+        self._rois_mutex.unlock()
 
-        self.update_roi_statistics.emit()
+        # with integral image sums and projections of ROIs are taken from it
+        results = self._roi_statistics.calculate(frame, rois, clip, reduction, self.integral_image)
+
+        for data, result in zip(rois_data, results):
+            if result is not None:
+                data.update(result)
 
     # ----------------------------------------------------------------------
     # ------------- Peak search functionality ------------------------------
@@ -606,24 +1010,36 @@ class DataSource2D(QtCore.QObject):
     # ----------------------------------------------------------------------
     def find_peaks(self):
         """
-        finds peaks after new frame comes of parameter changed
+        requests peak search for the last frame (e.g. after parameter changed)
+        :return: None
+        """
+        self._request_analysis()
+
+    # ----------------------------------------------------------------------
+    def _find_peaks(self, frame):
+        """
+        finds peaks in frame
+
+        :param frame: 2d np.array
         :return: None
         """
         if peak_search:
             if self.peak_search['search']:
                 try:
                     if self.peak_search['search_mode']:
-                        coordinates = peak_local_max(self._last_frame,
+                        coordinates = peak_local_max(frame,
                                                      threshold_rel=self.peak_search['rel_threshold'] / 100)
                     else:
-                        coordinates = peak_local_max(self._last_frame,
+                        coordinates = peak_local_max(frame,
                                                      threshold_abs=self.peak_search['abs_threshold'])
 
                     if len(coordinates) > 100:
-                        report_error(
-                            'Too many ({}) peaks found. Show first 100. Adjust the threshold'.format(len(coordinates)),
-                            self, True)
+                        # called from analysis thread, so no message box here
+                        logger.warning(f'{self.device_name}: too many ({len(coordinates)}) peaks found. '
+                                       f'Show first 100. Adjust the threshold')
                         self.peak_coordinates = coordinates[:100]
+                    else:
+                        self.peak_coordinates = coordinates
                 except:
                     self.peak_coordinates = ()
             else:
@@ -631,8 +1047,6 @@ class DataSource2D(QtCore.QObject):
         else:
             self.peak_coordinates = ()
 
-        self.update_peak_search.emit()
-
     # ----------------------------------------------------------------------
     # ---------------Communication with camera worker-----------------------
     # ----------------------------------------------------------------------
@@ -647,6 +1061,7 @@ class DataSource2D(QtCore.QObject):
         if self._device_proxy:
             if setting == 'FPS':
                 self.fps_limit = max(1, self._device_proxy.get_settings('FPS', int))
+                self._pacer.set_rate(self.fps_limit)
                 return self.fps_limit
             else:
                 return self._device_proxy.get_settings(setting, cast)
@@ -664,9 +1079,43 @@ class DataSource2D(QtCore.QObject):
         if self._device_proxy:
             if setting == 'FPS':
                 self.fps_limit = value
+                self._pacer.set_rate(max(1, value))
 
             self._device_proxy.save_settings(setting, value)
 
+    # ----------------------------------------------------------------------
+    def get_tango_settings_map(self, options):
+        """
+
+        :param options: list of settings names
+        :return: list of (source, DeviceProxy, option, attribute name) for settings, which are Tango attributes
+        """
+        if self._device_proxy:
+            return self._device_proxy.get_tango_settings_map(options)
+        else:
+            return []
+
+    # ----------------------------------------------------------------------
+    def update_settings_cache(self, option, value, source):
+        if self._device_proxy:
+            self._device_proxy.update_settings_cache(option, value, source)
+
+    # ----------------------------------------------------------------------
+    def invalidate_settings(self, option=None):
+        if self._device_proxy:
+            self._device_proxy.invalidate_settings(option)
+
+    # ----------------------------------------------------------------------
+    def get_settings_statistics(self):
+        """
+
+        :return: dict with settings cache hits and misses of camera proxy
+        """
+        if self._device_proxy:
+            return self._device_proxy.get_settings_statistics()
+        else:
+            return None
+
     # ----------------------------------------------------------------------
     def is_running(self):
         """
@@ -850,4 +1299,60 @@ class DataSource2D(QtCore.QObject):
             self.subtract_dark_image = state
 
         if self.got_first_frame:
-            self.new_frame.emit()
\ No newline at end of file
+            self.new_frame.emit()
+
+
+# ----------------------------------------------------------------------
+class AnalysisWorker(threading.Thread):
+    """
+    separate thread, that calculates ROIs statistics and peak search. Takes only the newest frame, frames which
+    came while previous one was analysed are dropped, so acquisition never waits for analysis
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, data_source):
+        super(AnalysisWorker, self).__init__(name=f'{data_source.device_name}_Analysis', daemon=True)
+
+        self._data_source = data_source
+        self._frames = LatestFrame()
+        self._stop_event = threading.Event()
+
+    # ----------------------------------------------------------------------
+    def submit(self, info, frame):
+        """
+
+        :param info: FrameInfo of frame
+        :param frame: 2d np.array
+        :return: None
+        """
+        self._frames.put((info, frame))
+
+    # ----------------------------------------------------------------------
+    def get_dropped_frames(self):
+        """
+
+        :return: int, frames, which were replaced by newer ones before analysis took them
+        """
+        return self._frames.overwritten
+
+    # ----------------------------------------------------------------------
+    def reset_statistics(self):
+        self._frames.reset_statistics()
+
+    # ----------------------------------------------------------------------
+    def stop(self):
+        self._stop_event.set()
+        self._frames.wake()
+        self.join()
+
+    # ----------------------------------------------------------------------
+    def run(self):
+        while not self._stop_event.is_set():
+            _, data = self._frames.get(timeout=None)
+            if data is None:
+                continue
+
+            try:
+                self._data_source.analyse_frame(*data)
+            except Exception as err:
+                logger.error(f'{self._data_source.device_name}: error during frame analysis: {err}', exc_info=True)
@@ -3,6 +3,21 @@
 # ----------------------------------------------------------------------
 
 """Dummy 2D data generator.
+
+Synthetic camera for tests and stress tests. Everything can be configured in camera node of config:
+
+    width, height:  frame size (default 500x500)
+    dtype:          frame data type, e.g. uint8, uint16, float32 (default float64)
+    bit_depth:      for integer types: number of used bits (default - full dtype range)
+    color:          True/False, RGB frames
+    spots:          number of beam spots (default 1)
+    spot_size:      sigma of spot in pixels (default 1/20 of frame)
+    spot_speed:     [pixels/s], 0 - spots do not move (default)
+    noise:          noise amplitude in percents of max value (default 10)
+    noise_bank:     number of precomputed noise frames (default 16)
+
+Noise is precomputed, per frame only noise frame is copied and small spots patches are added,
+so the generation costs almost nothing and hundreds of frames per second are possible.
 """
 
 import time
@@ -10,8 +25,10 @@ import numpy as np
 import logging
 
 from threading import Thread
+from distutils.util import strtobool
 
 from petra_camera.devices.base_camera import BaseCamera
+from petra_camera.utils.frame_pacing import FramePacer
 
 from petra_camera.constants import APP_NAME
 logger = logging.getLogger(APP_NAME)
@@ -25,6 +42,9 @@ class Dummy(BaseCamera):
     FRAME_H = 500
 
     NOISE = 10
+    NOISE_BANK = 16
+
+    FPS_MAX = 1000
 
     _settings_map = {'max_width': ('self', 'FRAME_W'),
                      'max_height': ('self', 'FRAME_H')}
@@ -33,74 +53,201 @@ class Dummy(BaseCamera):
 
     # ----------------------------------------------------------------------
     def __init__(self, settings):
+
+        # frame geometry has to be known before base class reads picture clip
+        if 'width' in settings.keys():
+            self.FRAME_W = int(settings.get('width'))
+
+        if 'height' in settings.keys():
+            self.FRAME_H = int(settings.get('height'))
+
         super(Dummy, self).__init__(settings)
 
-        x, y = np.meshgrid(np.linspace(-4, 4, self.FRAME_H),
-                           np.linspace(-4, 4, self.FRAME_W))
-        x += 0.0
-        y += -1.0
+        self._dtype = np.dtype(settings.get('dtype') if 'dtype' in settings.keys() else 'float64')
 
-        mean, sigma = 0, 0.2
-        self._baseData = 100 * np.exp(-((np.sqrt(x * x + y * y * 4) - mean) ** 4 / (2.0 * sigma ** 2)))
-        self._data = self._baseData
+        if np.issubdtype(self._dtype, np.integer):
+            max_bits = np.iinfo(self._dtype).bits
+            if 'bit_depth' in settings.keys():
+                self._bit_depth = min(int(settings.get('bit_depth')), max_bits)
+            else:
+                self._bit_depth = max_bits
+            self._max_value = 2 ** self._bit_depth - 1
+        else:
+            self._bit_depth = None
+            self._max_value = 100.
+
+        if 'color' in settings.keys():
+            self._color = bool(strtobool(settings.get('color')))
+        else:
+            self._color = False
+
+        num_spots = int(settings.get('spots')) if 'spots' in settings.keys() else 1
+        spot_size = float(settings.get('spot_size')) if 'spot_size' in settings.keys() \
+            else min(self.FRAME_W, self.FRAME_H) / 20
+        spot_speed = float(settings.get('spot_speed')) if 'spot_speed' in settings.keys() else 0.
+
+        noise = float(settings.get('noise')) if 'noise' in settings.keys() else self.NOISE
+        bank_size = max(int(settings.get('noise_bank')), 1) if 'noise_bank' in settings.keys() else self.NOISE_BANK
+
+        self._noise_bank = self._make_noise_bank(bank_size, noise)
+        self._bank_index = 0
+
+        self._spot = self._make_spot(spot_size)
+        self._spots = self._make_spots(num_spots, spot_speed)
 
         self._fps = self.get_settings('FPS', int)
         if self._fps == 0:
             self._fps = 25
 
-        self._generator_thread = Thread(target=self._generator)
+        self._pacer = FramePacer(self._fps)
+
         self._generate = False
         self._run = True
-        self._new_frame_thead = Thread(target=self._new_frame)
+        self._last_time = time.monotonic()
 
-        self._generator_thread.start()
+        self._new_frame_thead = Thread(target=self._new_frame, name=f'{self._my_name}_Dummy', daemon=True)
         self._new_frame_thead.start()
 
-        self._generator_thread_working = True
-        self._new_frame_thead_working = True
-
     # ----------------------------------------------------------------------
     def close_camera(self):
 
         self._run = False
-        while self._generator_thread_working or self._new_frame_thead_working:
-            time.sleep(1/self._fps)
+        self._new_frame_thead.join()
 
     # ----------------------------------------------------------------------
-    def _new_frame(self):
-        while self._run:
-            _last_time = time.time()
-            time.sleep(1 / self._fps)
-            if self._generate:
+    def _make_noise_bank(self, bank_size, noise):
+        """
+        precomputes noise frames
 
-                self._last_frame = self._data[self._picture_size[0]:self._picture_size[2],
-                                              self._picture_size[1]:self._picture_size[3]]
-                self._new_frame_flag = True
-                logger.debug(f"{self._my_name} new frame")
+        :param bank_size: int, number of frames
+        :param noise: float, noise amplitude in percents of max value
+        :return: list of np.array
+        """
+        shape = (self.FRAME_W, self.FRAME_H, 3) if self._color else (self.FRAME_W, self.FRAME_H)
+        rng = np.random.default_rng()
 
-                _last_time = time.time()
+        bank = []
+        for _ in range(bank_size):
+            frame = rng.uniform(0.0, self._max_value * noise / 100, shape)
+            bank.append(frame.astype(self._dtype))
 
-        self._new_frame_thead_working = False
+        return bank
 
     # ----------------------------------------------------------------------
-    def _generator(self):
+    def _make_spot(self, sigma):
         """
+        precomputes spot patch
+
+        :param sigma: float, spot size in pixels
+        :return: np.array
+        """
+        sigma = max(sigma, 0.5)
+        half = int(3 * sigma)
+        x = np.arange(-half, half + 1)
+        spot = np.exp(-(x[:, None] ** 2 + x[None, :] ** 2) / (2 * sigma ** 2))
+
+        spot *= self._max_value * 0.8
+
+        if self._color:
+            spot = np.stack([spot, spot * 0.5, spot * 0.25], axis=2)
+
+        return spot
+
+    # ----------------------------------------------------------------------
+    def _make_spots(self, num_spots, speed):
         """
+
+        :param num_spots: int
+        :param speed: float, [pixels/s]
+        :return: list of [x, y, vx, vy]
+        """
+        rng = np.random.default_rng()
+
+        spots = []
+        for ind in range(num_spots):
+            if ind == 0:
+                x, y = self.FRAME_W / 2, self.FRAME_H / 2
+            else:
+                x, y = rng.uniform(0, self.FRAME_W), rng.uniform(0, self.FRAME_H)
+
+            angle = rng.uniform(0, 2 * np.pi)
+            spots.append([x, y, speed * np.cos(angle), speed * np.sin(angle)])
+
+        return spots
+
+    # ----------------------------------------------------------------------
+    def _move_spots(self, dt):
+        """
+        moves spots, spots bounce from frame borders
+
+        :param dt: float, [s] time since last move
+        :return: None
+        """
+        for spot in self._spots:
+            for ind, limit in ((0, self.FRAME_W), (1, self.FRAME_H)):
+                spot[ind] += spot[ind + 2] * dt
+                if spot[ind] < 0 or spot[ind] > limit:
+                    spot[ind + 2] *= -1
+                    spot[ind] = min(max(spot[ind], 0), limit)
+
+    # ----------------------------------------------------------------------
+    def _generate_frame(self):
+        """
+        makes new frame for current picture clip: copy of next noise frame plus spots
+
+        :return: np.array
+        """
+        x0, y0, x1, y1 = self._picture_size
+
+        noise = self._noise_bank[self._bank_index]
+        self._bank_index = (self._bank_index + 1) % len(self._noise_bank)
+
+        frame = noise[x0:x1, y0:y1].copy()
+
+        half = self._spot.shape[0] // 2
+        for x, y, _, _ in self._spots:
+            # spot patch and frame overlap in frame coordinates
+            sx0, sy0 = int(x) - half - x0, int(y) - half - y0
+            fx0, fy0 = max(sx0, 0), max(sy0, 0)
+            fx1 = min(sx0 + self._spot.shape[0], frame.shape[0])
+            fy1 = min(sy0 + self._spot.shape[1], frame.shape[1])
+            if fx1 <= fx0 or fy1 <= fy0:
+                continue
+
+            # saturate like a real sensor, also integer data must not overflow
+            region = frame[fx0:fx1, fy0:fy1]
+            region[...] = np.minimum(region + self._spot[fx0 - sx0:fx1 - sx0, fy0 - sy0:fy1 - sy0],
+                                     self._max_value)
+
+        return frame
+
+    # ----------------------------------------------------------------------
+    def _new_frame(self):
         while self._run:
-            _last_time = time.time()
-            time.sleep(1 / 10)
+            delay = self._pacer.time_to_deadline()
+            if delay:
+                time.sleep(min(delay, 0.1))
+                continue
+
             if self._generate:
-                nPoints = self.FRAME_W * self.FRAME_H
-                self._data = self._baseData + np.random.uniform(0.0, self.NOISE, nPoints).reshape(self.FRAME_W, self.FRAME_H)
-                _last_time = time.time()
+                now = time.monotonic()
+                self._move_spots(now - self._last_time)
+                self._last_time = now
 
-        self._generator_thread_working = False
+                self._publish_frame(self._generate_frame(), time.time())
+                logger.debug(f"{self._my_name} new frame")
+
+                self._pacer.frame_done()
+            else:
+                time.sleep(0.1)
 
     # ----------------------------------------------------------------------
     def _start_acquisition(self):
 
         logger.debug(f"{self._my_name} starting thread")
 
+        self._last_time = time.monotonic()
+        self._pacer.reset()
         self._generate = True
         return True
 
@@ -108,19 +255,25 @@ class Dummy(BaseCamera):
     def stop_acquisition(self):
         self._generate = False
 
+    # ----------------------------------------------------------------------
+    def is_running(self):
+        return self._generate
+
     # ----------------------------------------------------------------------
     def get_settings(self, option, cast, do_rotate=True, do_log=True):
 
-        if option in ['FPSmax', 'max_width', 'max_height']:
+        if option in ['FPSmax', 'max_width', 'max_height', 'max_level_limit']:
 
             logger.debug(f'{self._my_name}: setting {cast.__name__}({option}) requested')
 
             if option == 'FPSmax':
-                return 200
+                return self.FPS_MAX
             elif option == 'max_width':
                 return self.FRAME_W
             elif option == 'max_height':
                 return self.FRAME_H
+            elif option == 'max_level_limit':
+                return int(self._max_value) + 1
         else:
             return super(Dummy, self).get_settings(option, cast, do_rotate, do_log)
 
@@ -131,5 +284,6 @@ class Dummy(BaseCamera):
 
             logger.debug(f'{self._my_name}: setting {option}: new value {value}')
             self._fps = value
+            self._pacer.set_rate(value)
 
-        super(Dummy, self).save_settings(option, value)
\ No newline at end of file
+        super(Dummy, self).save_settings(option, value)
@@ -13,12 +13,12 @@ import tango
 import logging
 import os.path as ospath
 
-from watchdog.observers import Observer
-from watchdog.events import PatternMatchingEventHandler
-
-from PIL import Image
+from distutils.util import strtobool
 
 from petra_camera.devices.base_camera import BaseCamera
+from petra_camera.utils.nexus_reader import NexusFrameReader, h5py_available
+from petra_camera.utils.folder_watch import FolderWatcher, POLL_PERIOD, MAX_DEPTH
+from petra_camera.utils.file_ingest import FileIngest, BufferPool, SPARE_BUFFERS
 
 from petra_camera.constants import APP_NAME
 logger = logging.getLogger(APP_NAME)
@@ -49,17 +49,35 @@ class LambdaProxy(BaseCamera):
         else:
             self._possible_sources = ['Event', 'Files']
 
-        self._my_event_handler = PatternMatchingEventHandler(["*.nxs"], "", False, True)
-        self._my_event_handler.on_created = self._on_created
+        # recursive - the whole folder tree is watched, newest - only the newest run folder,
+        # polling - the newest run folder is checked periodically (if inotify does not work, e.g. for GPFS)
+        watch_mode = str(settings.get("watch_mode")) if 'watch_mode' in settings.keys() else 'recursive'
+        poll_period = float(settings.get("poll_period")) if 'poll_period' in settings.keys() else POLL_PERIOD
+        watch_depth = int(settings.get("watch_depth")) if 'watch_depth' in settings.keys() else MAX_DEPTH
+        self._folder_watcher = FolderWatcher(self._my_name, ["*.nxs"], self._on_file,
+                                             watch_mode, poll_period, watch_depth)
+
+        # files are read with HDF5 hyperslabs, file handle is kept between events
+        if h5py_available:
+            self._nexus_reader = NexusFrameReader(str(settings.get("dataset")) if 'dataset' in settings.keys() else None)
+        else:
+            self._nexus_reader = None
 
-        self._my_observer = None
+        # files are read in worker thread (one: reader keeps file open), only the newest file is shown.
+        # Files written in SWMR mode can be read at any moment, others only when they are complete
+        if 'swmr' in settings.keys():
+            swmr = bool(strtobool(settings.get("swmr")))
+        else:
+            swmr = False
+
+        self._buffers = BufferPool(1 + SPARE_BUFFERS)
+        self._file_ingest = FileIngest(self._my_name, self._read_last_frame, self._publish_frame, 1,
+                                       wait_stable=not swmr)
 
         self._source = self._possible_sources[0]
 
         self.path = self._possible_folders[0]
 
-        self._last_frame = np.zeros((1, 1))
-
         self._running = False
 
     # ----------------------------------------------------------------------
@@ -75,12 +93,14 @@ class LambdaProxy(BaseCamera):
 
         elif self._source == 'Files':
 
-            if self.path != '':
+            if self._nexus_reader is None:
+                logger.error(f'{self._my_name}: h5py is not installed, files mode is not possible')
+
+            elif self.path != '':
                 logger.debug(f'{self._my_name}: starting acquisition: files mode')
 
-                self._my_observer = Observer()
-                self._my_observer.schedule(self._my_event_handler, self.path, recursive=True)
-                self._my_observer.start()
+                self._file_ingest.start()
+                self._folder_watcher.start(self.path)
                 self._running = True
 
         return self._running
@@ -92,8 +112,10 @@ class LambdaProxy(BaseCamera):
             self._device_proxy.unsubscribe_event(self._eid)
 
         elif self._source == 'Files':
-            self._my_observer.stop()
-            self._my_observer.join()
+            self._folder_watcher.stop()
+            self._file_ingest.stop()
+            if self._nexus_reader is not None:
+                self._nexus_reader.close()
         else:
             raise RuntimeError('Unknown mode')
         self._running = False
@@ -108,8 +130,7 @@ class LambdaProxy(BaseCamera):
             try:
                 data = event.attr_value
                 if data.quality == tango.AttrQuality.ATTR_VALID:
-                    self._last_frame = self._process_frame(data.value)
-                    self._new_frame_flag = True
+                    self._publish_frame(self._process_frame(data.value), data.time.totime())
                     return
                 else:
                     err = f"{self._my_name} error: AttrQuality is {data.quality}"
@@ -121,20 +142,33 @@ class LambdaProxy(BaseCamera):
         self.error_msg = str(err)
         logger.error(f'{self._my_name} error: {err}', exc_info=True)
     # ----------------------------------------------------------------------
-    def _on_created(self, event):
+    def _on_file(self, file_name, closed=False):
+
+        self.id = ' file: {}'.format(ospath.splitext(ospath.basename(file_name))[0])
+        self._file_ingest.file_event(file_name, closed)
+
+    # ----------------------------------------------------------------------
+    def _read_last_frame(self, file_name):
+        """
+        called from ingest worker, reads only picture clip of the last frame in file
+
+        :param file_name: str
+        :return: 2d np.array or None if there is no new frame
+        """
+        try:
+            return self._nexus_reader.read_last(file_name, self._picture_size, buffers=self._buffers)
 
-        self.id = ' file: {}'.format(ospath.splitext(ospath.basename(event.src_path))[0])
-        self._last_frame = np.array(Image.open(event.src_path))[self._picture_size[0]:self._picture_size[2],
-                                                                self._picture_size[1]:self._picture_size[3]]
-        self._new_frame_flag = True
+        except Exception:
+            # file can be not yet complete, next event will try again
+            self._nexus_reader.close()
+            raise
 
     # ----------------------------------------------------------------------
     def _set_new_path(self, path):
         need_to_restart = self._running
         if self._running:
             self.stop_acquisition()
-            self._last_frame = np.zeros((1, 1))
-            self._new_frame_flag = True
+            self._publish_frame(np.zeros((1, 1)))
 
         self.path = path
 
@@ -195,8 +229,7 @@ class LambdaProxy(BaseCamera):
         need_to_restart = self._running
         if self._running:
             self.stop_acquisition()
-            self._last_frame = np.zeros((1, 1))
-            self._new_frame_flag = True
+            self._publish_frame(np.zeros((1, 1)))
 
         self._source = source
 
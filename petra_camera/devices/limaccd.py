@@ -6,7 +6,6 @@
 """TangotoTine camera proxy
 """
 
-import numpy as np
 import time
 import logging
 import HasyUtils as hu
@@ -54,8 +53,6 @@ class LimaCCD(BaseCamera):
                 self._image_source = tango.DeviceProxy(db.get_db_host().split('.')[0] + ':' + db.get_db_port() + "/" + device_name)
                 break
 
-        self._last_frame = np.zeros((1, 1))
-
         self.period = 0.1
 
         self._camera_read_thread = None
@@ -118,9 +115,8 @@ class LimaCCD(BaseCamera):
             if self._device_proxy.video_last_image_counter != last_counter:
                 last_counter = self._device_proxy.video_last_image_counter
                 try:
-                    self._last_frame = self._image_source.image[self._picture_size[0]:self._picture_size[2],
-                                                                self._picture_size[1]:self._picture_size[3]]
-                    self._new_frame_flag = True
+                    self._publish_frame(self._image_source.image[self._picture_size[0]:self._picture_size[2],
+                                                                 self._picture_size[1]:self._picture_size[3]])
                     logger.debug(f"{self._my_name} new frame")
 
                     time.sleep(self.period)
@@ -6,7 +6,6 @@
 """TangotoTine camera proxy
 """
 
-import numpy as np
 import time
 import logging
 from threading import Thread
@@ -56,8 +55,6 @@ class LMScreen(BaseCamera):
 
         super(LMScreen, self).__init__(settings)
 
-        self._last_frame = np.zeros((1, 1))
-
         self.period = 1/self.get_settings('FPS', int)
 
         self._camera_read_thread = None
@@ -113,9 +110,8 @@ class LMScreen(BaseCamera):
 
         while self._camera_read_thread_running:
             try:
-                self._last_frame = self._device_proxy.Frame[self._picture_size[0]:self._picture_size[2],
-                                                            self._picture_size[1]:self._picture_size[3]]
-                self._new_frame_flag = True
+                self._publish_frame(self._device_proxy.Frame[self._picture_size[0]:self._picture_size[2],
+                                                             self._picture_size[1]:self._picture_size[3]])
                 logger.debug(f"{self._my_name} new frame")
 
                 time.sleep(self.period)
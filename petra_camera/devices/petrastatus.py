@@ -92,10 +92,9 @@ class PetraStatus(BaseCamera):
                         c_data[..., 0] = data & 255
                         c_data[..., 1] = (data >> 8) & 255
                         c_data[..., 2] = (data >> 16) & 255
-                        self._last_frame = c_data
                         self._last_camera_msg = tango.DeviceProxy(self._tango_server).laststatusmessage
-                        self._new_frame_flag = True
                         self._new_msg_flag = True
+                        self._publish_frame(c_data)
                         logger.debug(f"{self._my_name} new frame")
                     else:
                         ans = requests.get(f'https://winweb.desy.de/mca/accstatus/infoscreen/petra_status_800.png?{random()}')
@@ -103,9 +102,8 @@ class PetraStatus(BaseCamera):
                             picture_stream = io.BytesIO(ans.content)
                             picture = Image.open(picture_stream)
                             frame = np.rot90(np.asarray(picture, dtype=np.int32), 1)[::-1, :]
-                            self._last_frame = frame[self._picture_size[0]: self._picture_size[2],
-                                                     self._picture_size[1]: self._picture_size[3]]
-                            self._new_frame_flag = True
+                            self._publish_frame(frame[self._picture_size[0]: self._picture_size[2],
+                                                      self._picture_size[1]: self._picture_size[3]])
                             logger.debug(f"{self._my_name} new frame")
                 except Exception as err:
                     logger.error(f"{self._my_name}: cannot get new frame: {repr(err)}", exc_info=True)
@@ -0,0 +1,307 @@
+# ----------------------------------------------------------------------
+# Author:        yury.matveev@desy.de
+# ----------------------------------------------------------------------
+
+"""Replay of recorded frames.
+
+Plays back files as if they came from camera: picture clip, reduction, rotation and flips are applied
+exactly like for live cameras. Settings in camera node of config:
+
+    file:       recorded file (.h5, .hdf5, .nxs, .npy, .tif, .tiff) or folder with such files (played in name order)
+    dataset:    path of frames dataset in HDF5/NeXus files (default: entry/data/data,
+                entry/instrument/detector/data or the first dataset with frames)
+    rate:       frames per second or 'max' - as fast as viewer takes frames, no frame is skipped
+                (default - FPS setting, 25)
+    loop:       True/False, start again after the last frame (default True)
+
+Files are opened only when their frames are played: npy files are memory mapped, from HDF5 files only picture
+clip of the current frame is read, so replay of big files does not need memory.
+Frames recorded by petra_camera are already rotated and reduced, so rotation and reduction for replay of such
+files usually should stay off.
+"""
+
+import os
+import time
+import numpy as np
+import logging
+
+from threading import Thread
+from distutils.util import strtobool
+
+try:
+    import h5py
+    h5py_available = True
+except ImportError:
+    h5py_available = False
+
+try:
+    from PIL import Image
+    pil_available = True
+except ImportError:
+    pil_available = False
+
+from petra_camera.devices.base_camera import BaseCamera
+from petra_camera.utils.frame_pacing import FramePacer
+from petra_camera.utils.nexus_reader import find_frames_dataset
+
+from petra_camera.constants import APP_NAME
+logger = logging.getLogger(APP_NAME)
+
+HDF5_EXTENSIONS = ('.h5', '.hdf5', '.nxs')
+NPY_EXTENSIONS = ('.npy',)
+TIFF_EXTENSIONS = ('.tif', '.tiff')
+
+
+# ----------------------------------------------------------------------
+class Replay(BaseCamera):
+    """
+    """
+    FRAME_W = 1
+    FRAME_H = 1
+
+    DEFAULT_FPS = 25
+
+    _settings_map = {'max_width': ('self', 'FRAME_W'),
+                     'max_height': ('self', 'FRAME_H')}
+
+    visible_layouts = ('FPS',)
+
+    # ----------------------------------------------------------------------
+    def __init__(self, settings):
+
+        if 'file' not in settings.keys():
+            raise RuntimeError('Replay: file is not given')
+
+        self._files = self._find_files(str(settings.get('file')))
+        if not self._files:
+            raise RuntimeError(f'Replay: no frames files in {settings.get("file")}')
+
+        self._dataset = str(settings.get('dataset')) if 'dataset' in settings.keys() else None
+
+        # frame geometry has to be known before base class reads picture clip
+        self.FRAME_W, self.FRAME_H = self._read_frame_shape(self._files[0])[:2]
+
+        super(Replay, self).__init__(settings)
+
+        self.file_name = f' ({os.path.basename(settings.get("file"))})'
+
+        if 'loop' in settings.keys():
+            self._loop = bool(strtobool(settings.get('loop')))
+        else:
+            self._loop = True
+
+        self._fps = self.get_settings('FPS', int)
+        if self._fps == 0:
+            self._fps = self.DEFAULT_FPS
+
+        self._as_fast_as_possible = False
+        if 'rate' in settings.keys():
+            if str(settings.get('rate')).lower() == 'max':
+                self._as_fast_as_possible = True
+            else:
+                self._fps = float(settings.get('rate'))
+
+        self._pacer = FramePacer(self._fps)
+
+        self._generate = False
+        self._run = True
+
+        self._new_frame_thead = Thread(target=self._new_frame, name=f'{self._my_name}_Replay', daemon=True)
+        self._new_frame_thead.start()
+
+    # ----------------------------------------------------------------------
+    def close_camera(self):
+
+        self._run = False
+        self._new_frame_thead.join()
+
+        super(Replay, self).close_camera()
+
+    # ----------------------------------------------------------------------
+    @staticmethod
+    def _find_files(path):
+        """
+
+        :param path: str, file or folder
+        :return: list of str, files with frames
+        """
+        extensions = HDF5_EXTENSIONS + NPY_EXTENSIONS + TIFF_EXTENSIONS
+        if os.path.isdir(path):
+            return [os.path.join(path, name) for name in sorted(os.listdir(path))
+                    if os.path.splitext(name)[1].lower() in extensions]
+
+        if os.path.isfile(path) and os.path.splitext(path)[1].lower() in extensions:
+            return [path]
+
+        return []
+
+    # ----------------------------------------------------------------------
+    def _read_frame_shape(self, file_name):
+        """
+
+        :param file_name: str
+        :return: tuple, shape of one frame
+        """
+        extension = os.path.splitext(file_name)[1].lower()
+
+        if extension in NPY_EXTENSIONS:
+            return _frame_shape(np.load(file_name, mmap_mode='r').shape)
+
+        elif extension in HDF5_EXTENSIONS:
+            if not h5py_available:
+                raise RuntimeError('h5py is not installed, cannot replay HDF5 files')
+            with h5py.File(file_name, 'r') as h5_file:
+                return _frame_shape(find_frames_dataset(h5_file, self._dataset).shape)
+
+        else:
+            if not pil_available:
+                raise RuntimeError('PIL is not installed, cannot replay TIFF files')
+            with Image.open(file_name) as image:
+                width, height = image.size
+                return height, width
+
+    # ----------------------------------------------------------------------
+    def _clip(self):
+        """
+
+        :return: tuple of slices, current picture clip
+        """
+        x0, y0, x1, y1 = self._picture_size
+        return slice(x0, x1), slice(y0, y1)
+
+    # ----------------------------------------------------------------------
+    def _iterate_stack(self, data):
+        """
+        yields frames of stack, only picture clip is read from disk
+
+        :param data: np.memmap or h5py.Dataset
+        :return: generator of np.array
+        """
+        if len(_frame_shape(data.shape)) == len(data.shape):
+            yield np.array(data[self._clip()])
+            return
+
+        for index in range(data.shape[0]):
+            yield np.array(data[(index,) + self._clip()])
+
+    # ----------------------------------------------------------------------
+    def _iterate_frames(self):
+        """
+        yields all frames of all files, files are opened one by one
+
+        :return: generator of np.array
+        """
+        for file_name in self._files:
+            extension = os.path.splitext(file_name)[1].lower()
+            try:
+                if extension in NPY_EXTENSIONS:
+                    yield from self._iterate_stack(np.load(file_name, mmap_mode='r'))
+
+                elif extension in HDF5_EXTENSIONS:
+                    with h5py.File(file_name, 'r') as h5_file:
+                        yield from self._iterate_stack(find_frames_dataset(h5_file, self._dataset))
+
+                else:
+                    with Image.open(file_name) as image:
+                        for index in range(getattr(image, 'n_frames', 1)):
+                            image.seek(index)
+                            yield np.array(image)[self._clip()]
+
+            except (OSError, KeyError, RuntimeError) as err:
+                logger.error(f'{self._my_name}: cannot replay {file_name}: {err}')
+
+    # ----------------------------------------------------------------------
+    def _new_frame(self):
+        frames = None
+        played = 0  # frames played in this pass
+        while self._run:
+            if not self._generate:
+                frames = None
+                time.sleep(0.1)
+                continue
+
+            if self._as_fast_as_possible:
+                # no frame is lost: the next one is published, when DataSource2D took the previous one
+                if not self._frame_buffer.wait_consumed(0.1):
+                    continue
+            else:
+                delay = self._pacer.time_to_deadline()
+                if delay:
+                    time.sleep(min(delay, 0.1))
+                    continue
+
+            if frames is None:
+                frames = self._iterate_frames()
+                played = 0
+
+            frame = next(frames, None)
+            if frame is None:
+                frames = None
+                if not played:
+                    self.error_msg = 'Replay: no frames could be read'
+                    self.error_flag = True
+                    self._generate = False
+                elif not self._loop:
+                    logger.info(f'{self._my_name}: replay finished')
+                    self._generate = False
+                continue
+
+            played += 1
+            self._publish_frame(frame, time.time())
+
+            if not self._as_fast_as_possible:
+                self._pacer.frame_done()
+
+    # ----------------------------------------------------------------------
+    def _start_acquisition(self):
+
+        logger.debug(f"{self._my_name} starting replay")
+
+        self._pacer.reset()
+        self._generate = True
+        return True
+
+    # ----------------------------------------------------------------------
+    def stop_acquisition(self):
+        self._generate = False
+
+    # ----------------------------------------------------------------------
+    def get_settings(self, option, cast, do_rotate=True, do_log=True):
+
+        if option in ['FPSmax', 'max_width', 'max_height']:
+
+            logger.debug(f'{self._my_name}: setting {cast.__name__}({option}) requested')
+
+            if option == 'FPSmax':
+                return 1000
+            elif option == 'max_width':
+                return self.FRAME_W
+            elif option == 'max_height':
+                return self.FRAME_H
+        else:
+            return super(Replay, self).get_settings(option, cast, do_rotate, do_log)
+
+    # ----------------------------------------------------------------------
+    def save_settings(self, option, value):
+
+        if option == 'FPS':
+
+            logger.debug(f'{self._my_name}: setting {option}: new value {value}')
+            self._fps = value
+            self._pacer.set_rate(value)
+
+        super(Replay, self).save_settings(option, value)
+
+
+# ----------------------------------------------------------------------
+def _frame_shape(shape):
+    """
+    single frames are 2d or color (w, h, 3/4), everything else is stack of frames
+
+    :param shape: tuple, shape of data in file
+    :return: tuple, shape of one frame
+    """
+    if len(shape) == 2 or (len(shape) == 3 and shape[2] in (3, 4)):
+        return tuple(shape)
+
+    return tuple(shape[1:])
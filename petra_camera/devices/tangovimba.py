@@ -122,7 +122,6 @@ class TangoVimba(BaseCamera):
         self._image_source = \
             self.SERVER_SETTINGS['color' if self._color else 'bw']['high' if self._high_depth else 'low'][1]
 
-        self._last_frame = np.zeros((1, 1))
         self._last_time = time.time()
 
         self._mode = 'event'
@@ -237,8 +236,7 @@ class TangoVimba(BaseCamera):
                 self._frame_thread_running = False
                 raise RuntimeError('Camera was stopped!')
             try:
-                self._last_frame = self._process_frame(getattr(self._device_proxy, self._image_source))
-                self._new_frame_flag = True
+                self._publish_frame(self._process_frame(getattr(self._device_proxy, self._image_source)))
             except Exception as err:
                 logger.error(f'{self._my_name}: error: {err}', exc_info=True)
                 self.error_flag = True
@@ -256,8 +254,7 @@ class TangoVimba(BaseCamera):
             try:
                 data = event.attr_value
                 if data.quality == tango.AttrQuality.ATTR_VALID:
-                    self._last_frame = self._process_frame(data.value)
-                    self._new_frame_flag = True
+                    self._publish_frame(self._process_frame(data.value), data.time.totime())
                     return
                 else:
                     err = f"{self._my_name} error: AttrQuality is {data.quality}"
@@ -149,6 +149,17 @@ class Ui_SettingsDialog(object):
         self.dsb_circle_size = QtWidgets.QDoubleSpinBox(self.groupBox)
         self.dsb_circle_size.setObjectName("dsb_circle_size")
         self.horizontalLayout_6.addWidget(self.dsb_circle_size)
+        self.label_16 = QtWidgets.QLabel(self.groupBox)
+        self.label_16.setObjectName("label_16")
+        self.horizontalLayout_6.addWidget(self.label_16)
+        self.dsb_position_refresh = QtWidgets.QDoubleSpinBox(self.groupBox)
+        self.dsb_position_refresh.setDecimals(1)
+        self.dsb_position_refresh.setMinimum(0.1)
+        self.dsb_position_refresh.setMaximum(60.0)
+        self.dsb_position_refresh.setSingleStep(0.1)
+        self.dsb_position_refresh.setProperty("value", 1.0)
+        self.dsb_position_refresh.setObjectName("dsb_position_refresh")
+        self.horizontalLayout_6.addWidget(self.dsb_position_refresh)
         spacerItem4 = QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Minimum)
         self.horizontalLayout_6.addItem(spacerItem4)
         self.verticalLayout_2.addLayout(self.horizontalLayout_6)
@@ -199,4 +210,5 @@ class Ui_SettingsDialog(object):
         self.label_10.setText(_translate("SettingsDialog", "Center search:"))
         self.label_11.setText(_translate("SettingsDialog", "cross size"))
         self.label_12.setText(_translate("SettingsDialog", "circle size"))
+        self.label_16.setText(_translate("SettingsDialog", "Position refresh period, s"))
         self.cmd_reset_settings.setText(_translate("SettingsDialog", "Reset all settings"))
@@ -32,6 +32,8 @@ from petra_camera.utils.xmlsettings import XmlSettings
 from petra_camera.widgets.import_cameras import ImportCameras
 from petra_camera.widgets.batch_progress import BatchProgress
 from petra_camera.roisrv.roiserver import RoiServer
+from petra_camera.roisrv.frameserver import FrameServer
+from petra_camera.utils.settings_poller import SettingsPoller
 from petra_camera.devices.datasource2d import DataSource2D
 
 from petra_camera.gui.MainWindow_ui import Ui_MainWindow
@@ -88,6 +90,10 @@ class PETRACamera(QtWidgets.QMainWindow):
         self.camera_dock_title = {}
         self.camera_devices = {}
 
+        # one thread reads settings for all cameras
+        self.settings_poller = SettingsPoller()
+        self.settings_poller.start()
+
         self.camera_list = self.get_cameras()
 
         logger.debug(f"Start loader for cameras: {self.camera_list}")
@@ -112,6 +118,7 @@ class PETRACamera(QtWidgets.QMainWindow):
         self.loader.new_set_to_be_done(list(self.camera_list.keys()), [], [])
 
         self._roi_server = None
+        self._frame_server = None
         self.start_server()
 
         self.setWindowTitle("Camera Viewer ({}@{})".format(getpass.getuser(), socket.gethostname()))
@@ -193,11 +200,22 @@ class PETRACamera(QtWidgets.QMainWindow):
             try:
                 self._roi_server = RoiServer(self.settings.option("roi_server", "host"),
                                              self.settings.option("roi_server", "port"),
-                                             self.camera_list)
+                                             self.camera_devices, self.camera_list)
                 self._roi_server.start()
             except Exception as err:
                 logger.exception(err)
 
+        if self.settings.has_node('frame_server') and \
+                self.settings.option("frame_server", "enable").lower() == "true":
+            try:
+                self._frame_server = FrameServer(self.settings.option("frame_server", "host"),
+                                                 self.settings.option("frame_server", "port"),
+                                                 self.camera_devices, self.camera_list,
+                                                 self.settings.option("frame_server", "unix_socket"))
+                self._frame_server.start()
+            except Exception as err:
+                logger.exception(err)
+
     # ----------------------------------------------------------------------
     def _show_about(self):
         """
@@ -214,6 +232,10 @@ class PETRACamera(QtWidgets.QMainWindow):
             logger.info("Applying new settings...")
 
             self.camera_list = self._get_cameras_list()
+            if self._roi_server is not None:
+                self._roi_server.set_cameras_list(self.camera_list)
+            if self._frame_server is not None:
+                self._frame_server.set_cameras_list(self.camera_list)
 
             to_add = list(set(self.camera_list) - set(existing_cameras))
             to_close = list(set(existing_cameras) - set(self.camera_list))
@@ -273,6 +295,12 @@ class PETRACamera(QtWidgets.QMainWindow):
             logger.info("Stopping ROI server...")
             self._roi_server.stop()
 
+        if self._frame_server is not None:
+            logger.info("Stopping frame server...")
+            self._frame_server.stop()
+
+        self.settings_poller.stop()
+
         if hasattr(self, '_status_timer'):
             self._status_timer.stop()
 
@@ -503,8 +531,16 @@ class PETRACamera(QtWidgets.QMainWindow):
         mem = float(process.memory_info().rss) / (1024. * 1024.)
         cpu = psutil.cpu_percent()
 
-        self._lb_resources_status.setText("| {:.2f}MB | CPU {} % |".format(mem,
-                                                                           cpu))
+        status = "| {:.2f}MB | CPU {} % |".format(mem, cpu)
+
+        # memory, reserved for frame histories, gets into RSS only when ring is filled (pages of np.zeros
+        # are mapped at the first write), so it is reported separately
+        history = sum(device.get_history_memory() for device in list(self.camera_devices.values()))
+        if history:
+            status += " History reserved {:.2f}MB |".format(history / (1024. * 1024.))
+
+        self._lb_resources_status.setText(status)
+
         for widget in self.camera_widgets.values():
             id, state = widget.get_last_state()
             if id in self.camera_list:
@@ -0,0 +1,521 @@
+# ----------------------------------------------------------------------
+# Author:        yury.matveev@desy.de
+# ----------------------------------------------------------------------
+
+
+"""Binary server of the latest frames for local clients.
+
+Clients, which need frames of cameras, opened in viewer, get them from viewer instead of own Tango connections.
+Server listens on TCP (by default only on localhost) or Unix socket, all clients are served by one thread.
+
+Requests are text lines:
+    "get_frame camera_id [after_sequence] [timeout]\\n" - last frame of camera, if after_sequence is given,
+        reply comes, when frame with bigger sequence number is received (or timeout, default 5 s)
+    "list_cameras\\n" - ids of opened cameras
+
+Reply: binary header (HEADER) followed by payload of 'size' bytes:
+    magic, status, ndim, dtype (numpy dtype.str, e.g. '<u2'), shape (3 x uint32, unused dimensions are 0),
+    sequence, event_time, clip (x, y, w, h), reduction, size
+
+For status OK payload is frame data in C order, for list_cameras and errors (status NO_FRAME, ERROR) payload is
+utf-8 text. Frame data is sent directly from frame buffer, it is copied only if frame is not contiguous
+(e.g. after rotation or reduction).
+
+Client example:
+
+    header = HEADER.unpack(recv_exactly(sock, HEADER.size))
+    data = np.frombuffer(recv_exactly(sock, header[-1]), dtype=header[3].rstrip(b'\\0').decode())
+"""
+
+import struct
+import socket
+import selectors
+import time
+import os
+
+import numpy as np
+
+import logging
+
+from collections import deque
+from queue import Queue
+from PyQt5 import QtCore
+
+from petra_camera.utils.propagating_thread import ExcThread
+
+from petra_camera.constants import APP_NAME
+logger = logging.getLogger(APP_NAME)
+
+# magic, status, ndim, dtype, shape[3], sequence, event_time, clip[4], reduction, size
+HEADER = struct.Struct('<4sBB8s3Iqd4iIQ')
+MAGIC = b'PCF1'
+
+OK = 0
+NO_FRAME = 1
+ERROR = 2
+
+
+# ----------------------------------------------------------------------
+class FrameServer(QtCore.QObject):
+    """
+    """
+
+    SELECT_TIMEOUT = .1                            # [s], how often server checks stop request
+    MAX_REQUEST_LEN = 256
+    MAX_CLIENT_NUMBER = 32
+    MAX_QUEUED_REQUESTS = 100
+    WAIT_TIMEOUT = 5.                              # [s], default timeout for get_frame with after_sequence
+    CMD_LIST = ["get_frame", "list_cameras"]
+
+    # ----------------------------------------------------------------------
+    def __init__(self, host, port, camera_devices, cameras_list, unix_socket=None):
+        """
+
+        :param host: str, if empty - localhost
+        :param port: int
+        :param camera_devices: dict, camera_id: DataSource2D, filled by camera loader
+        :param cameras_list: dict, camera_id: camera name, enabled cameras
+        :param unix_socket: str, path of Unix socket, if given - used instead of TCP
+        """
+
+        super(FrameServer, self).__init__()
+
+        self._camera_devices = camera_devices
+        self._cameras_list = cameras_list
+
+        self._unix_socket = unix_socket
+        if unix_socket:
+            if os.path.exists(unix_socket):
+                os.remove(unix_socket)
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._socket.bind(unix_socket)
+            address = unix_socket
+        else:
+            host = str(host) if host else '127.0.0.1'
+            self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self._socket.bind((host, int(port)))
+            address = f'{host}:{port}'
+
+        self._socket.setblocking(False)
+
+        self._selector = selectors.DefaultSelector()
+
+        # acquisition threads wake up server thread, when new frame comes
+        self._wakeup_read, self._wakeup_write = socket.socketpair()
+        self._wakeup_read.setblocking(False)
+        self._wakeup_write.setblocking(False)
+
+        self._waiting = []              # connections, which wait for new frame
+        self._listened_cameras = {}     # camera_id: DataSource2D, to which frame listener is added
+
+        self._state = "idle"
+
+        self._errorQueue = Queue()
+        self._serverWorker = ExcThread(self.run, 'frameServer', self._errorQueue)
+
+        logger.info(f"Frame server {address}")
+
+    # ----------------------------------------------------------------------
+    def set_cameras_list(self, cameras_list):
+        """
+        called, when set of enabled cameras changed
+
+        :param cameras_list: dict, camera_id: camera name
+        :return: None
+        """
+        self._cameras_list = cameras_list
+
+    # ----------------------------------------------------------------------
+    def start(self):
+        """
+        """
+        self._serverWorker.start()
+
+    # ----------------------------------------------------------------------
+    def run(self):
+        """
+        """
+        self._state = "run"
+        self._socket.listen(self.MAX_CLIENT_NUMBER)
+        self._selector.register(self._socket, selectors.EVENT_READ, None)
+        self._selector.register(self._wakeup_read, selectors.EVENT_READ, 'wakeup')
+
+        try:
+            while not self._serverWorker.stopped():
+                for key, mask in self._selector.select(self.SELECT_TIMEOUT):
+                    if key.data is None:
+                        self._accept()
+                        continue
+
+                    if key.data == 'wakeup':
+                        self._drain_wakeup()
+                        continue
+
+                    connection = key.data
+                    try:
+                        if mask & selectors.EVENT_READ:
+                            self._read(connection)
+                        if mask & selectors.EVENT_WRITE and not connection.closed:
+                            self._write(connection)
+
+                    except KillConnection as err:
+                        logger.warning(f'Frame server client {connection.address}: {err}')
+                        self._close_connection(connection)
+
+                    except Exception as err:
+                        logger.error(f'Frame server client {connection.address}: {repr(err)}', exc_info=True)
+                        self._close_connection(connection)
+
+                if self._waiting:
+                    self._serve_waiting()
+                    # cameras could be reloaded meanwhile
+                    self._update_listeners()
+
+        finally:
+            for key in list(self._selector.get_map().values()):
+                if isinstance(key.data, Connection):
+                    self._close_connection(key.data)
+
+            self._update_listeners()
+
+            self._selector.close()
+            self._socket.close()
+            self._wakeup_read.close()
+            self._wakeup_write.close()
+            if self._unix_socket and os.path.exists(self._unix_socket):
+                os.remove(self._unix_socket)
+
+            self._state = 'aborted'
+
+    # ----------------------------------------------------------------------
+    def stop(self):
+        """
+        """
+        self._serverWorker.stop()
+        self._wakeup()
+        while self._state not in ['aborted', 'idle']:
+            time.sleep(0.1)
+
+        logger.debug('Frame server stopped')
+
+    # ----------------------------------------------------------------------
+    def _accept(self):
+        try:
+            sock, address = self._socket.accept()
+        except BlockingIOError:
+            return
+
+        sock.setblocking(False)
+        self._selector.register(sock, selectors.EVENT_READ, Connection(sock, address))
+        logger.info('Frame server: new client {}'.format(address))
+
+    # ----------------------------------------------------------------------
+    def _close_connection(self, connection):
+        if connection.closed:
+            return
+
+        logger.info('Frame server: client closed {}'.format(connection.address))
+
+        connection.closed = True
+        try:
+            self._selector.unregister(connection.sock)
+        except (KeyError, ValueError):
+            pass
+        connection.sock.close()
+
+        if connection in self._waiting:
+            self._waiting.remove(connection)
+            self._update_listeners()
+
+    # ----------------------------------------------------------------------
+    def _read(self, connection):
+        """
+        reads requests, requests are processed in order, one after another
+
+        :param connection: Connection
+        :return: None
+        """
+        try:
+            data = connection.sock.recv(4096)
+        except (BlockingIOError, InterruptedError):
+            return
+        except ConnectionError:
+            self._close_connection(connection)
+            return
+
+        if not data:
+            self._close_connection(connection)
+            return
+
+        connection.in_buffer += data
+        *lines, rest = connection.in_buffer.split(b'\n')
+        if len(rest) > self.MAX_REQUEST_LEN:
+            raise KillConnection('request too long')
+        connection.in_buffer = bytearray(rest)
+
+        connection.requests.extend(line.decode(errors='replace') for line in lines if line.strip())
+        if len(connection.requests) > self.MAX_QUEUED_REQUESTS:
+            raise KillConnection('too many queued requests')
+
+        self._process_requests(connection)
+
+    # ----------------------------------------------------------------------
+    def _process_requests(self, connection):
+        """
+        processes queued requests of client, stops at request, which waits for new frame
+
+        :param connection: Connection
+        :return: None
+        """
+        while connection.requests and connection.waiter is None and not connection.closed:
+            self._process_request(connection, connection.requests.popleft())
+
+        if connection.out_queue:
+            self._write(connection)
+
+    # ----------------------------------------------------------------------
+    def _process_request(self, connection, request):
+        """
+
+        :param connection: Connection
+        :param request: str
+        :return: None
+        """
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Frame server: processing request '{}'".format(request))
+
+        tokens = request.split()
+        try:
+            if tokens[0] == 'list_cameras':
+                self._send_text(connection, OK, ' '.join(str(camera_id) for camera_id, _ in self._get_cameras()))
+
+            elif tokens[0] == 'get_frame':
+                camera_device = self._get_camera(tokens[1])
+                after = int(tokens[2]) if len(tokens) > 2 else None
+                timeout = float(tokens[3]) if len(tokens) > 3 else self.WAIT_TIMEOUT
+
+                frame, info = camera_device.get_last_frame()
+                if after is None or (info is not None and info.sequence > after):
+                    self._send_frame(connection, frame, info)
+                else:
+                    connection.waiter = (camera_device.camera_id, after, time.monotonic() + timeout)
+                    self._waiting.append(connection)
+                    self._update_listeners()
+
+            else:
+                raise RuntimeError('request unknown')
+
+        except Exception as err:
+            self._send_text(connection, ERROR, repr(err))
+
+    # ----------------------------------------------------------------------
+    def _serve_waiting(self):
+        """
+        sends new frames to waiting clients, replies to the ones, which waited too long
+
+        :return: None
+        """
+        now = time.monotonic()
+        for connection in list(self._waiting):
+            camera_id, after, deadline = connection.waiter
+
+            frame, info = None, None
+            camera_device = self._camera_devices.get(camera_id)
+            if camera_device is not None:
+                frame, info = camera_device.get_last_frame()
+
+            if info is not None and info.sequence > after:
+                self._stop_waiting(connection)
+                self._send_frame(connection, frame, info)
+            elif deadline <= now:
+                self._stop_waiting(connection)
+                self._send_text(connection, NO_FRAME, 'timeout')
+            else:
+                continue
+
+            self._process_requests(connection)
+
+    # ----------------------------------------------------------------------
+    def _stop_waiting(self, connection):
+        connection.waiter = None
+        if connection in self._waiting:
+            self._waiting.remove(connection)
+
+    # ----------------------------------------------------------------------
+    def _update_listeners(self):
+        """
+        adds frame listener to cameras, which have waiting clients, and removes it from the others
+
+        :return: None
+        """
+        needed = {}
+        if not self._serverWorker.stopped():
+            for connection in self._waiting:
+                camera_id = connection.waiter[0]
+                camera_device = self._camera_devices.get(camera_id)
+                if camera_device is not None:
+                    needed[camera_id] = camera_device
+
+        for camera_id, camera_device in list(self._listened_cameras.items()):
+            if needed.get(camera_id) is not camera_device:
+                camera_device.remove_frame_listener(self._frame_received)
+                del self._listened_cameras[camera_id]
+
+        for camera_id, camera_device in needed.items():
+            if camera_id not in self._listened_cameras:
+                camera_device.add_frame_listener(self._frame_received)
+                self._listened_cameras[camera_id] = camera_device
+
+    # ----------------------------------------------------------------------
+    def _frame_received(self, camera_id, frame, info):
+        """
+        frame listener, called from acquisition threads, frame itself is taken later from camera device
+
+        :return: None
+        """
+        self._wakeup()
+
+    # ----------------------------------------------------------------------
+    def _wakeup(self):
+        try:
+            self._wakeup_write.send(b'\0')
+        except (BlockingIOError, OSError):
+            # server is already woken up or closed
+            pass
+
+    # ----------------------------------------------------------------------
+    def _drain_wakeup(self):
+        try:
+            while self._wakeup_read.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+
+    # ----------------------------------------------------------------------
+    def _send_frame(self, connection, frame, info):
+        """
+        queues header and frame buffer
+
+        :param connection: Connection
+        :param frame: np.array or None
+        :param info: FrameInfo or None
+        :return: None
+        """
+        if info is None:
+            self._send_text(connection, NO_FRAME, 'no frame yet')
+            return
+
+        if not frame.flags['C_CONTIGUOUS']:
+            frame = np.ascontiguousarray(frame)
+
+        shape = list(frame.shape) + [0] * (3 - frame.ndim)
+        clip = [int(value) for value in info.clip] if info.clip is not None else [0, 0, 0, 0]
+
+        header = HEADER.pack(MAGIC, OK, frame.ndim, frame.dtype.str.encode(), *shape,
+                             info.sequence, info.event_time or 0., *clip, info.reduction or 1, frame.nbytes)
+
+        connection.out_queue.append(memoryview(header))
+        if frame.nbytes:
+            connection.out_queue.append(memoryview(frame).cast('B'))
+
+    # ----------------------------------------------------------------------
+    def _send_text(self, connection, status, text):
+        """
+        queues header and text payload
+
+        :param connection: Connection
+        :param status: int
+        :param text: str
+        :return: None
+        """
+        payload = text.encode()
+        connection.out_queue.append(memoryview(HEADER.pack(MAGIC, status, 0, b'', 0, 0, 0, 0, 0., 0, 0, 0, 0, 0,
+                                                           len(payload)) + payload))
+
+    # ----------------------------------------------------------------------
+    def _write(self, connection):
+        """
+        sends queued buffers as far as socket accepts, the rest is sent, when socket becomes writable
+
+        :param connection: Connection
+        :return: None
+        """
+        if connection.closed:
+            return
+
+        while connection.out_queue:
+            buffer = connection.out_queue[0]
+            try:
+                sent = connection.sock.send(buffer)
+            except (BlockingIOError, InterruptedError):
+                break
+            except ConnectionError:
+                self._close_connection(connection)
+                return
+
+            if sent < len(buffer):
+                connection.out_queue[0] = buffer[sent:]
+                break
+
+            connection.out_queue.popleft()
+
+        events = selectors.EVENT_READ | selectors.EVENT_WRITE if connection.out_queue else selectors.EVENT_READ
+        if events != connection.events:
+            connection.events = events
+            self._selector.modify(connection.sock, events, connection)
+
+    # ----------------------------------------------------------------------
+    def _get_camera(self, camera_id):
+        """
+
+        :param camera_id: str
+        :return: DataSource2D
+        """
+        camera_id = int(camera_id)
+        for my_id, camera_device in self._get_cameras():
+            if my_id == camera_id:
+                return camera_device
+
+        raise RuntimeError(f'unknown camera {camera_id}')
+
+    # ----------------------------------------------------------------------
+    def _get_cameras(self):
+        """
+
+        :return: list of (camera_id, DataSource2D) of successfully opened cameras
+        """
+        cameras = []
+        for camera_id in sorted(self._cameras_list):
+            camera_device = self._camera_devices.get(camera_id)
+            if camera_device is not None and camera_device.load_status[0]:
+                cameras.append((camera_id, camera_device))
+
+        return cameras
+
+
+# ----------------------------------------------------------------------
+class Connection(object):
+    """
+    client socket with its buffers
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, sock, address):
+
+        self.sock = sock
+        self.address = address
+
+        self.in_buffer = bytearray()
+        self.out_queue = deque()  # memoryviews of headers and frames
+
+        self.events = selectors.EVENT_READ
+        self.closed = False
+
+        self.requests = deque()
+        self.waiter = None  # (camera_id, sequence, deadline), if client waits for new frame
+
+
+# ----------------------------------------------------------------------
+class KillConnection(Exception):
+    pass
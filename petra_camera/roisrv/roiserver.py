@@ -5,63 +5,132 @@
 
 """TCP/IP server exposing some summary statistics about the data frame.
 
+All clients are served by one thread with selectors, each connection has own read and write buffers,
+so one slow client does not delay the others.
+
+Requests are text lines: "command [arguments]\\n", several requests could be sent without waiting for replies,
+replies come in the same order, also terminated with newline.
+Clients, which send requests without newline (old protocol), get one reply per received request without newline.
+
+Reply: "OK;<json>" or "err;<json message>"
+
+After "subscribe [camera_id] [max_rate] [fields]" server pushes a record for every analysed frame of camera:
+"data;<json>\n" with camera id, frame sequence and time, counter ROI index, requested ROI fields and
+number of records, dropped for this subscription, because client did not read them fast enough.
+Fields are comma separated, e.g. "subscribe 0 50 sum,com_x,com_y", by default all statistics are sent.
+
+"wait_for_frame camera_id [after] [timeout]" replies with counter ROI statistics of the first frame,
+acquired after given time (unix time, by default - time of request), "wait_for_sequence camera_id sequence [timeout]"
+- of the first frame with sequence number bigger than given. While client waits, its next requests are queued,
+other clients are served as usual. On timeout reply is 'err;"timeout"'.
+
+"integrate camera_id <n_frames|seconds>s [fields] [timeout]" accumulates counter ROI statistics (by default - sum)
+of consecutive frames, analysed after request, e.g. "integrate 0 10" - 10 frames, "integrate 0 2.5s" - 2.5 seconds,
+and replies with mean, std and count per field. Each frame is counted once, frames, which were not analysed
+(e.g. analysis was slower than camera), are reported as missed.
 """
 
 import json
-
-import select
-import traceback
+import socket
+import selectors
 import time
 
 import logging
-import socket
 
+from collections import deque
 from queue import Queue
 from PyQt5 import QtCore
 
 from petra_camera.utils.propagating_thread import ExcThread
+from petra_camera.utils.roi_statistics import ROI_FIELDS, empty_roi_data
 
 from petra_camera.constants import APP_NAME
 logger = logging.getLogger(APP_NAME)
 
+WAIT = object()  # returned by commands, which reply later
+
+
 # ----------------------------------------------------------------------
 class RoiServer(QtCore.QObject):
     """
     """
 
-    SOCKET_TIMEOUT = .5                            # [s]
+    SELECT_TIMEOUT = .1                            # [s], how often server checks stop request
     MAX_REQUEST_LEN = 256
     MAX_CLIENT_NUMBER = 32
-    CMD_LIST = ["get_sum",]
+    CMD_LIST = ["get_list_of_commands",
+                "get_sum",                         # [camera_id], sum of counter ROI
+                "get_roi_data",                    # [camera_id], statistics of counter ROI
+                "get_all_rois",                    # [camera_id], statistics of all ROIs of camera
+                "get_all_cameras",                 # statistics of all ROIs of all cameras, keyed by camera id
+                "subscribe",                       # [camera_id] [max_rate] [fields], push counter ROI statistics
+                "unsubscribe",                     # [camera_id], stop push, without camera id - all subscriptions
+                "wait_for_frame",                  # camera_id [after] [timeout], statistics of frame after time
+                "wait_for_sequence",               # camera_id sequence [timeout], statistics of next frame
+                "integrate"]                       # camera_id <n_frames|seconds>s [fields] [timeout]
+
+    # commands, which need client connection
+    SESSION_CMD_LIST = ["subscribe", "unsubscribe", "wait_for_frame", "wait_for_sequence", "integrate"]
+
+    WAIT_TIMEOUT = 5.                              # [s], default timeout for wait_for_ commands
+    MAX_QUEUED_REQUESTS = 1000                     # requests, which wait for the end of wait_for_ command
+
+    MAX_OUT_BUFFER = 65536                         # [bytes], records for slower clients are dropped
+    MAX_PENDING_RECORDS = 1000                     # analysed frames, waiting to be sent to subscribers
 
     # ----------------------------------------------------------------------
-    def __init__(self, host, port, cameras_list):
+    def __init__(self, host, port, camera_devices, cameras_list):
+        """
 
-        super(RoiServer, self).__init__()
+        :param host: str
+        :param port: int
+        :param camera_devices: dict, camera_id: DataSource2D, filled by camera loader
+        :param cameras_list: dict, camera_id: camera name, enabled cameras
+        """
 
-        self._camera_device = None
-        self._cameras_list = None
+        super(RoiServer, self).__init__()
 
         self.host = str(host)
         self.port = int(port)
 
+        self._camera_devices = camera_devices
         self._cameras_list = cameras_list
 
         self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)      # TODO
-        self._socket.settimeout(self.SOCKET_TIMEOUT)
+        self._socket.setblocking(False)
         self._socket.bind((self.host, self.port))
 
-        self._connectionMap = []
+        self._selector = selectors.DefaultSelector()
+
+        # analysis threads put new ROIs data here and wake up server thread
+        self._pending_records = deque(maxlen=self.MAX_PENDING_RECORDS)
+        self._wakeup_read, self._wakeup_write = socket.socketpair()
+        self._wakeup_read.setblocking(False)
+        self._wakeup_write.setblocking(False)
+
+        self._subscribers = []          # connections with subscriptions
+        self._waiting = []              # connections, which wait for new frame
+        self._listened_cameras = {}     # camera_id: DataSource2D, to which analysis listener is added
 
         self._state = "idle"
 
         self._errorQueue = Queue()
         self._serverWorker = ExcThread(self.run, 'roiServer', self._errorQueue)
-        
+
         logger.info("ROI server host {}, port {}".format(self.host,
                                                            self.port))
 
+    # ----------------------------------------------------------------------
+    def set_cameras_list(self, cameras_list):
+        """
+        called, when set of enabled cameras changed
+
+        :param cameras_list: dict, camera_id: camera name
+        :return: None
+        """
+        self._cameras_list = cameras_list
+
     # ----------------------------------------------------------------------
     def start(self):
         """
@@ -74,84 +143,218 @@ class RoiServer(QtCore.QObject):
         """
         self._state = "run"
         self._socket.listen(self.MAX_CLIENT_NUMBER)
+        self._selector.register(self._socket, selectors.EVENT_READ, None)
+        self._selector.register(self._wakeup_read, selectors.EVENT_READ, 'wakeup')
 
-        read_list = [self._socket]
-        while not self._serverWorker.stopped():
-            readable, writable, errored = select.select(read_list, [], [], 0.1)
-            for s in readable:
-                if s is self._socket:
-                    connection, address = self._socket.accept()
-                    connection.setblocking(False)
-                    self._connectionMap.append([connection, address])
-                    logger.info('New client added: {}'.format(address))
-
-            for connection, address in self._connectionMap:
-                try:
-                    request = connection.recv(self.MAX_REQUEST_LEN).decode()
-                    if request:
-                        connection.sendall(self._processRequest(request).encode())
-                    else:
-                        logger.info('Client closed: {}'.format(address))
-                        connection.close()
-                        self._connectionMap.remove([connection, address])
-
-                except socket.error as err:
-                    if err.args[0] == 10035:
-                        if self._serverWorker.stopped():
-                            break
-                    elif err.errno == 11:
-                        time.sleep(0.1)
-                    elif err.errno == 10054:
-                        logger.info('Client closed: {}'.format(address))
-                        connection.close()
-                        self._connectionMap.remove([connection, address])
-                    else:
-                        pass
-
-                except KillConnection as _:
-                    logger.error(traceback.format_exc())
-                    logger.info('Client closed: {}'.format(address))
-                    connection.close()
-                    self._connectionMap.remove([connection, address])
-
-                except Exception as _:
-                    logger.error(traceback.format_exc())
-                    break
-
-        self._socket.close()
-        self._state = 'aborted'
+        try:
+            while not self._serverWorker.stopped():
+                for key, mask in self._selector.select(self._get_select_timeout()):
+                    if key.data is None:
+                        self._accept()
+                        continue
+
+                    if key.data == 'wakeup':
+                        self._drain_wakeup()
+                        continue
+
+                    connection = key.data
+                    try:
+                        if mask & selectors.EVENT_READ:
+                            self._read(connection)
+                        if mask & selectors.EVENT_WRITE and not connection.closed:
+                            self._write(connection)
+
+                    except KillConnection as err:
+                        logger.warning(f'Client {connection.address}: {err}')
+                        self._close_connection(connection)
+
+                    except Exception as err:
+                        logger.error(f'Client {connection.address}: {repr(err)}', exc_info=True)
+                        self._close_connection(connection)
+
+                if self._pending_records:
+                    self._send_records()
+
+                if self._waiting:
+                    self._check_wait_timeouts()
+
+                if self._subscribers or self._waiting:
+                    # cameras could be reloaded meanwhile
+                    self._update_listeners()
+
+        finally:
+            for key in list(self._selector.get_map().values()):
+                if isinstance(key.data, Connection):
+                    self._close_connection(key.data)
+
+            self._update_listeners()
+
+            self._selector.close()
+            self._socket.close()
+            self._wakeup_read.close()
+            self._wakeup_write.close()
+            self._state = 'aborted'
 
     # ----------------------------------------------------------------------
     def stop(self):
         """
         """
         self._serverWorker.stop()
-        while self._state != 'aborted':
+        self._wakeup()
+        while self._state not in ['aborted', 'idle']:
             time.sleep(0.1)
 
         logger.debug('ROI server stopped')
 
     # ----------------------------------------------------------------------
-    def _processRequest(self, request):
+    def _accept(self):
+        """
+        accepts new client
+        :return: None
+        """
+        try:
+            sock, address = self._socket.accept()
+        except BlockingIOError:
+            return
+
+        sock.setblocking(False)
+        self._selector.register(sock, selectors.EVENT_READ, Connection(sock, address))
+        logger.info('New client added: {}'.format(address))
+
+    # ----------------------------------------------------------------------
+    def _close_connection(self, connection):
+        """
+
+        :param connection: Connection
+        :return: None
+        """
+        if connection.closed:
+            return
+
+        logger.info('Client closed: {}'.format(connection.address))
+
+        connection.closed = True
+        try:
+            self._selector.unregister(connection.sock)
+        except (KeyError, ValueError):
+            pass
+        connection.sock.close()
+
+        if connection in self._subscribers or connection in self._waiting:
+            if connection in self._subscribers:
+                self._subscribers.remove(connection)
+            if connection in self._waiting:
+                self._waiting.remove(connection)
+            self._update_listeners()
+
+    # ----------------------------------------------------------------------
+    def _read(self, connection):
+        """
+        reads all available data, processes all complete requests
+
+        :param connection: Connection
+        :return: None
+        """
+        try:
+            data = connection.sock.recv(4096)
+        except (BlockingIOError, InterruptedError):
+            return
+        except ConnectionError:
+            self._close_connection(connection)
+            return
+
+        if not data:
+            self._close_connection(connection)
+            return
+
+        for request in connection.get_requests(data, self.MAX_REQUEST_LEN):
+            if request.strip():
+                connection.requests.append(request)
+
+        if len(connection.requests) > self.MAX_QUEUED_REQUESTS:
+            raise KillConnection('too many queued requests')
+
+        self._process_requests(connection)
+
+    # ----------------------------------------------------------------------
+    def _process_requests(self, connection):
+        """
+        processes queued requests of client in order, stops at request, which waits for new frame
+
+        :param connection: Connection
+        :return: None
+        """
+        while connection.requests and connection.waiter is None and not connection.closed:
+            response = self._processRequest(connection.requests.popleft(), connection)
+            if response is not None:
+                self._add_reply(connection, response)
+
+        if connection.out_buffer:
+            self._write(connection)
+
+    # ----------------------------------------------------------------------
+    def _add_reply(self, connection, response):
+        connection.out_buffer += (response + ('\n' if connection.framed else '')).encode()
+
+    # ----------------------------------------------------------------------
+    def _write(self, connection):
+        """
+        sends as much of pending replies as socket accepts, the rest is sent, when socket becomes writable
+
+        :param connection: Connection
+        :return: None
+        """
+        if connection.closed:
+            return
+
+        try:
+            sent = connection.sock.send(connection.out_buffer)
+        except (BlockingIOError, InterruptedError):
+            sent = 0
+        except ConnectionError:
+            self._close_connection(connection)
+            return
+
+        del connection.out_buffer[:sent]
+
+        events = selectors.EVENT_READ | selectors.EVENT_WRITE if connection.out_buffer else selectors.EVENT_READ
+        if events != connection.events:
+            connection.events = events
+            self._selector.modify(connection.sock, events, connection)
+
+    # ----------------------------------------------------------------------
+    def _processRequest(self, request, connection=None):
         """
         Returns:
-            (str) response, e.g.: "ok;manipulator;x;12.0"
+            (str) response, e.g.: "OK;12.0"
         """
-        response = ''
-        print(__file__, "processing request '{}'".format(request))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("ROI server: processing request '{}'".format(request))
 
         tokens = request.split()
 
+        if not tokens or tokens[0] not in self.CMD_LIST:
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("ROI server: unknown request '{}'".format(request))
+            return self._make_response("err", 'request unknown')
+
         try:
-            if len(tokens)> 1:
-                response = self._make_response("OK", getattr(self, tokens[0])(tokens[1:]))
+            if tokens[0] in self.SESSION_CMD_LIST:
+                result = getattr(self, tokens[0])(connection, *tokens[1:])
             else:
-                response = self._make_response("OK", getattr(self, tokens[0])())
+                result = getattr(self, tokens[0])(*tokens[1:])
 
-        except Exception as err:
-            response = self._make_response("err", 'request unknown')
+            # reply will be sent, when frame comes
+            if result is WAIT:
+                return None
 
-        print(__file__, "response '{}'".format(response))
+            response = self._make_response("OK", result)
+
+        except Exception as err:
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("ROI server: cannot process request '{}': {}".format(request, repr(err)))
+            # e.g. wrong argument or unknown camera
+            response = self._make_response("err", repr(err))
 
         return response
 
@@ -161,17 +364,651 @@ class RoiServer(QtCore.QObject):
         """
         return "{};{}".format(flag, json.dumps(message))
 
+    # ----------------------------------------------------------------------
+    def _get_camera(self, camera_id=None):
+        """
+
+        :param camera_id: str or None, if None - first opened camera
+        :return: DataSource2D
+        """
+        if camera_id is None:
+            cameras = self._get_cameras()
+            if not cameras:
+                raise RuntimeError('no cameras')
+            return cameras[0][1]
+
+        camera_id = int(camera_id)
+        for my_id, camera_device in self._get_cameras():
+            if my_id == camera_id:
+                return camera_device
+
+        raise RuntimeError(f'unknown camera {camera_id}')
+
+    # ----------------------------------------------------------------------
+    def _get_cameras(self):
+        """
+
+        :return: list of (camera_id, DataSource2D) of successfully opened cameras
+        """
+        cameras = []
+        for camera_id in sorted(self._cameras_list):
+            camera_device = self._camera_devices.get(camera_id)
+            if camera_device is not None and camera_device.load_status[0]:
+                cameras.append((camera_id, camera_device))
+
+        return cameras
+
     # ----------------------------------------------------------------------
     def get_list_of_commands(self):
 
         return self.CMD_LIST
 
     # ----------------------------------------------------------------------
-    def get_sum(self):
+    def get_sum(self, camera_id=None):
+
+        return self._get_camera(camera_id).get_active_roi_value('sum')
+
+    # ----------------------------------------------------------------------
+    def get_roi_data(self, camera_id=None):
+        """
+        statistics of counter ROI with sequence number, timestamps and geometry of the frame they belong to
+        """
+        return self._get_camera(camera_id).get_active_roi_data()
+
+    # ----------------------------------------------------------------------
+    def get_all_rois(self, camera_id=None):
+        """
+        statistics of all ROIs of camera, calculated for the same frame
+        """
+        return self._get_camera(camera_id).get_all_roi_data()
+
+    # ----------------------------------------------------------------------
+    def get_all_cameras(self):
+        """
+        statistics of all ROIs of all cameras, keyed by camera id
+        """
+        result = {}
+        for camera_id, camera_device in self._get_cameras():
+            data = camera_device.get_all_roi_data()
+            data['name'] = self._cameras_list.get(camera_id, '')
+            result[camera_id] = data
+
+        return result
+
+    # ----------------------------------------------------------------------
+    def subscribe(self, connection, camera_id=None, max_rate=0, fields=None):
+        """
+        starts to push statistics of counter ROI of camera to client
+
+        :param connection: Connection
+        :param camera_id: str, if not given - first opened camera
+        :param max_rate: str, [records/s], 0 - record for every analysed frame
+        :param fields: str, comma separated ROI fields, if not given - all fields
+        :return: dict, subscription parameters
+        """
+        if connection is None:
+            raise RuntimeError('no connection')
+
+        camera_device = self._get_camera(camera_id)
+
+        max_rate = float(max_rate)
+        if max_rate < 0:
+            raise ValueError('negative rate')
+
+        if fields is not None:
+            fields = fields.split(',')
+            for field in fields:
+                if field not in ROI_FIELDS:
+                    raise ValueError(f'unknown field {field}')
+        else:
+            fields = list(ROI_FIELDS)
+
+        subscription = Subscription(camera_device.camera_id, max_rate, fields)
+        connection.subscriptions[subscription.camera_id] = subscription
+
+        # records are streamed, so they have to be separated
+        connection.framed = True
+
+        if connection not in self._subscribers:
+            self._subscribers.append(connection)
+        self._update_listeners()
+
+        return {'camera': subscription.camera_id, 'max_rate': max_rate, 'fields': fields}
+
+    # ----------------------------------------------------------------------
+    def unsubscribe(self, connection, camera_id=None):
+        """
+
+        :param connection: Connection
+        :param camera_id: str, if not given - all subscriptions of client
+        :return: list of camera ids, which are still subscribed
+        """
+        if connection is None:
+            raise RuntimeError('no connection')
+
+        if camera_id is None:
+            connection.subscriptions = {}
+        else:
+            connection.subscriptions.pop(int(camera_id), None)
+
+        if not connection.subscriptions and connection in self._subscribers:
+            self._subscribers.remove(connection)
+        self._update_listeners()
+
+        return list(connection.subscriptions.keys())
+
+    # ----------------------------------------------------------------------
+    def wait_for_frame(self, connection, camera_id, after=None, timeout=None):
+        """
+        statistics of counter ROI of the first frame, acquired after given time
+
+        :param connection: Connection
+        :param camera_id: str
+        :param after: str, unix time, if not given - now
+        :param timeout: str, [s]
+        :return: dict as get_roi_data or WAIT
+        """
+        after = time.time() if after is None else float(after)
+        return self._start_waiting(connection, camera_id, 'time', after, timeout)
+
+    # ----------------------------------------------------------------------
+    def wait_for_sequence(self, connection, camera_id, sequence, timeout=None):
+        """
+        statistics of counter ROI of the first frame with sequence number bigger than given
+
+        :param connection: Connection
+        :param camera_id: str
+        :param sequence: str
+        :param timeout: str, [s]
+        :return: dict as get_roi_data or WAIT
+        """
+        return self._start_waiting(connection, camera_id, 'sequence', int(sequence), timeout)
+
+    # ----------------------------------------------------------------------
+    def _start_waiting(self, connection, camera_id, key, value, timeout):
+        """
+        replies immediately, if analysed frame is already new enough, otherwise makes client wait
+
+        :param connection: Connection
+        :param camera_id: str
+        :param key: str, FrameInfo field to compare or 'time' (see _frame_time)
+        :param value: field value, the frame has to be newer than
+        :param timeout: str, [s] or None
+        :return: dict as get_roi_data or WAIT
+        """
+        if connection is None:
+            raise RuntimeError('no connection')
+
+        camera_device = self._get_camera(camera_id)
+        timeout = self.WAIT_TIMEOUT if timeout is None else float(timeout)
+
+        waiter = Waiter(camera_device.camera_id, key, value, time.monotonic() + timeout)
+
+        # listener first, so frame analysed in between is not missed
+        connection.waiter = waiter
+        self._waiting.append(connection)
+        self._update_listeners()
+
+        reply = waiter.add_frame(camera_device.get_all_roi_data())
+        if reply is not None:
+            self._stop_waiting(connection)
+            return reply
+
+        return WAIT
+
+    # ----------------------------------------------------------------------
+    def integrate(self, connection, camera_id, amount, fields='sum', timeout=None):
+        """
+        accumulates statistics of counter ROI over consecutive analysed frames
+
+        :param connection: Connection
+        :param camera_id: str
+        :param amount: str, number of frames or number of seconds with 's' at the end
+        :param fields: str, comma separated ROI fields
+        :param timeout: str, [s], max time between frames
+        :return: WAIT, reply with mean, std and count comes later
+        """
+        if connection is None:
+            raise RuntimeError('no connection')
+
+        camera_device = self._get_camera(camera_id)
+        timeout = self.WAIT_TIMEOUT if timeout is None else float(timeout)
+
+        fields = fields.split(',')
+        for field in fields:
+            if field not in ROI_FIELDS:
+                raise ValueError(f'unknown field {field}')
+
+        if amount.endswith('s'):
+            num_frames, duration = None, float(amount[:-1])
+            if duration <= 0:
+                raise ValueError('duration has to be positive')
+        else:
+            num_frames, duration = int(amount), None
+            if num_frames < 1:
+                raise ValueError('number of frames has to be positive')
+
+        connection.waiter = Integrator(camera_device.camera_id, fields, num_frames, duration, timeout)
+        self._waiting.append(connection)
+        self._update_listeners()
+
+        return WAIT
+
+    # ----------------------------------------------------------------------
+    def _stop_waiting(self, connection):
+        connection.waiter = None
+        if connection in self._waiting:
+            self._waiting.remove(connection)
+        self._update_listeners()
+
+    # ----------------------------------------------------------------------
+    def _check_wait_timeouts(self):
+        """
+        replies with error to clients, which waited too long
+
+        :return: None
+        """
+        now = time.monotonic()
+        for connection in list(self._waiting):
+            if connection.waiter.deadline <= now:
+                flag, message = connection.waiter.finish()
+                self._stop_waiting(connection)
+                self._add_reply(connection, self._make_response(flag, message))
+                self._process_requests(connection)
+
+    # ----------------------------------------------------------------------
+    def _get_select_timeout(self):
+        """
+
+        :return: float, [s] time till the next wait timeout, but not longer than SELECT_TIMEOUT
+        """
+        if not self._waiting:
+            return self.SELECT_TIMEOUT
+
+        deadline = min(connection.waiter.deadline for connection in self._waiting)
+        return min(max(deadline - time.monotonic(), 0), self.SELECT_TIMEOUT)
+
+    # ----------------------------------------------------------------------
+    def _update_listeners(self):
+        """
+        adds analysis listener to cameras, which have subscribers or waiting clients,
+        and removes it from the others
+
+        :return: None
+        """
+        needed = {}
+        if not self._serverWorker.stopped():
+            camera_ids = [camera_id for connection in self._subscribers for camera_id in connection.subscriptions]
+            camera_ids += [connection.waiter.camera_id for connection in self._waiting]
+
+            for camera_id in camera_ids:
+                camera_device = self._camera_devices.get(camera_id)
+                if camera_device is not None:
+                    needed[camera_id] = camera_device
+
+        for camera_id, camera_device in list(self._listened_cameras.items()):
+            if needed.get(camera_id) is not camera_device:
+                camera_device.remove_analysis_listener(self._analysis_done)
+                del self._listened_cameras[camera_id]
+
+        for camera_id, camera_device in needed.items():
+            if camera_id not in self._listened_cameras:
+                camera_device.add_analysis_listener(self._analysis_done)
+                self._listened_cameras[camera_id] = camera_device
+
+    # ----------------------------------------------------------------------
+    def _analysis_done(self, camera_id, data):
+        """
+        analysis listener, called from analysis threads
+
+        :param camera_id: int
+        :param data: dict from DataSource2D.get_all_roi_data
+        :return: None
+        """
+        self._pending_records.append((camera_id, data))
+        self._wakeup()
+
+    # ----------------------------------------------------------------------
+    def _wakeup(self):
+        try:
+            self._wakeup_write.send(b'\0')
+        except (BlockingIOError, OSError):
+            # server is already woken up or closed
+            pass
+
+    # ----------------------------------------------------------------------
+    def _drain_wakeup(self):
+        try:
+            while self._wakeup_read.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+
+    # ----------------------------------------------------------------------
+    def _send_records(self):
+        """
+        sends new ROIs data to subscribers, considering their rate limits and buffers
+
+        :return: None
+        """
+        now = time.monotonic()
+        while self._pending_records:
+            camera_id, data = self._pending_records.popleft()
+
+            for connection in list(self._waiting):
+                if connection.waiter.camera_id != camera_id:
+                    continue
+
+                reply = connection.waiter.add_frame(data)
+                if reply is not None:
+                    self._stop_waiting(connection)
+                    self._add_reply(connection, self._make_response("OK", reply))
+                    self._process_requests(connection)
+
+            for connection in list(self._subscribers):
+                subscription = connection.subscriptions.get(camera_id)
+                if subscription is None:
+                    continue
+
+                if not subscription.is_due(now):
+                    continue
+
+                if len(connection.out_buffer) > self.MAX_OUT_BUFFER:
+                    # client does not read fast enough, it gets the latest data, when it catches up
+                    subscription.dropped += 1
+                    continue
+
+                subscription.last_sent = now
+                connection.out_buffer += ('data;' + json.dumps(subscription.make_record(data)) + '\n').encode()
+
+        for connection in list(self._subscribers):
+            if connection.out_buffer and not connection.closed:
+                self._write(connection)
+
+
+# ----------------------------------------------------------------------
+class Connection(object):
+    """
+    client socket with its buffers
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, sock, address):
+
+        self.sock = sock
+        self.address = address
+
+        self.in_buffer = bytearray()
+        self.out_buffer = bytearray()
+
+        self.events = selectors.EVENT_READ
+        self.closed = False
+
+        self.framed = False  # client sends newline terminated requests
+
+        self.subscriptions = {}  # camera_id: Subscription
+
+        self.requests = deque()  # received requests, which wait for processing
+        self.waiter = None  # Waiter or Integrator, if client waits for new frames
+
+    # ----------------------------------------------------------------------
+    def get_requests(self, data, max_length):
+        """
+        adds received data to buffer and returns complete requests
+
+        :param data: bytes
+        :param max_length: int, max request length
+        :return: list of requests
+        """
+        self.in_buffer += data
+
+        if b'\n' in self.in_buffer:
+            self.framed = True
+
+        if not self.framed:
+            # old clients send one request per message and do not terminate it
+            request, self.in_buffer = self.in_buffer, bytearray()
+            if len(request) > max_length:
+                raise KillConnection('request too long')
+
+            return [request.decode(errors='replace')]
+
+        *lines, rest = self.in_buffer.split(b'\n')
+        if len(rest) > max_length:
+            raise KillConnection('request too long')
+
+        self.in_buffer = bytearray(rest)
+
+        return [line.decode(errors='replace').rstrip('\r') for line in lines]
+
+
+# ----------------------------------------------------------------------
+class Subscription(object):
+    """
+    push subscription of client to camera
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, camera_id, max_rate, fields):
+
+        self.camera_id = camera_id
+        self.min_interval = 1 / max_rate if max_rate > 0 else 0
+        self.fields = fields
+
+        self.last_sent = None
+        self.dropped = 0
+
+    # ----------------------------------------------------------------------
+    def is_due(self, now):
+        return self.last_sent is None or now - self.last_sent >= self.min_interval
+
+    # ----------------------------------------------------------------------
+    def make_record(self, data):
+        """
+
+        :param data: dict from DataSource2D.get_all_roi_data
+        :return: dict
+        """
+        frame = data['frame'] or {}
+        record = {'camera': self.camera_id,
+                  'sequence': frame.get('sequence'),
+                  'time': _frame_time(frame),
+                  'roi': data['counter_roi'],
+                  'dropped': self.dropped}
+
+        roi = _counter_roi(data)
+        for field in self.fields:
+            record[field] = roi.get(field)
+
+        return record
+
+
+# ----------------------------------------------------------------------
+class Waiter(object):
+    """
+    client request, which waits for frame newer than given time or sequence number
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, camera_id, key, value, deadline):
+
+        self.camera_id = camera_id
+        self.key = key
+        self.value = value
+        self.deadline = deadline
+
+    # ----------------------------------------------------------------------
+    def add_frame(self, data):
+        """
+
+        :param data: dict from DataSource2D.get_all_roi_data
+        :return: dict in the same format as DataSource2D.get_active_roi_data, if frame is new enough, otherwise None
+        """
+        if data['frame'] is None:
+            return None
+
+        value = _frame_time(data['frame']) if self.key == 'time' else data['frame'].get(self.key)
+        if value is None or value <= self.value:
+            return None
+
+        reply = dict(_counter_roi(data))
+        reply['frame'] = data['frame']
+
+        return reply
+
+    # ----------------------------------------------------------------------
+    def finish(self):
+        """
+        called after deadline
+
+        :return: (flag, message) of reply
+        """
+        return 'err', 'timeout'
+
+
+# ----------------------------------------------------------------------
+class Integrator(object):
+    """
+    client request, which accumulates ROI statistics over given number of frames or time
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, camera_id, fields, num_frames, duration, timeout):
+        """
+
+        :param camera_id: int
+        :param fields: list of ROI fields
+        :param num_frames: int or None
+        :param duration: float, [s] or None
+        :param timeout: float, [s], max time between frames
+        """
+        self.camera_id = camera_id
+        self.fields = fields
+
+        self._num_frames = num_frames
+        self._timeout = timeout
+
+        self._start = time.monotonic()
+        self._end = self._start + duration if duration is not None else None
+        # the same in unix time, to compare with frame process time
+        self._end_time = time.time() + duration if duration is not None else None
+
+        self.deadline = self._end if self._end is not None else self._start + timeout
+
+        self._frames = 0
+        self._first_frame = None
+        self._last_frame = None
+
+        # running mean and sum of squared deviations (Welford) per field
+        self._count = dict.fromkeys(fields, 0)
+        self._mean = dict.fromkeys(fields, 0.)
+        self._m2 = dict.fromkeys(fields, 0.)
+
+    # ----------------------------------------------------------------------
+    def add_frame(self, data):
+        """
+
+        :param data: dict from DataSource2D.get_all_roi_data
+        :return: dict with results, when integration is finished, otherwise None
+        """
+        frame = data['frame']
+        if frame is None:
+            return None
+
+        # frame, analysed after integration time, could come before deadline was noticed
+        if self._end_time is not None and frame.get('process_time') is not None and \
+                frame['process_time'] > self._end_time:
+            return self._make_result() if self._frames else None
+
+        # the same frame could be reported again only if camera was restarted
+        if self._last_frame is not None and frame['sequence'] <= self._last_frame['sequence']:
+            return None
+
+        if self._first_frame is None:
+            self._first_frame = frame
+        self._last_frame = frame
+        self._frames += 1
+
+        roi = _counter_roi(data)
+        for field in self.fields:
+            value = roi.get(field)
+            if value is None:
+                continue
+            self._count[field] += 1
+            delta = value - self._mean[field]
+            self._mean[field] += delta / self._count[field]
+            self._m2[field] += delta * (value - self._mean[field])
+
+        if self._num_frames is not None:
+            if self._frames >= self._num_frames:
+                return self._make_result()
+
+            self.deadline = time.monotonic() + self._timeout
+
+        return None
+
+    # ----------------------------------------------------------------------
+    def finish(self):
+        """
+        called after deadline: end of integration time or timeout
+
+        :return: (flag, message) of reply
+        """
+        if self._end is not None and self._frames:
+            return 'OK', self._make_result()
+
+        return 'err', 'timeout'
+
+    # ----------------------------------------------------------------------
+    def _make_result(self):
+        """
+
+        :return: dict, mean, std and count per field and frames range
+        """
+        result = {'frames': self._frames,
+                  'first_sequence': self._first_frame['sequence'],
+                  'last_sequence': self._last_frame['sequence'],
+                  'missed': self._last_frame['sequence'] - self._first_frame['sequence'] + 1 - self._frames,
+                  'start_time': _frame_time(self._first_frame),
+                  'end_time': _frame_time(self._last_frame)}
+
+        for field in self.fields:
+            count = self._count[field]
+            result[field] = {'mean': self._mean[field] if count else None,
+                             'std': (self._m2[field] / count) ** 0.5 if count else None,
+                             'count': count}
+
+        return result
+
+
+# ----------------------------------------------------------------------
+def _counter_roi(data):
+    """
+
+    :param data: dict from DataSource2D.get_all_roi_data
+    :return: dict, statistics of counter ROI
+    """
+    if 0 <= data['counter_roi'] < len(data['rois']):
+        return data['rois'][data['counter_roi']]
+
+    return empty_roi_data()
+
+
+# ----------------------------------------------------------------------
+def _frame_time(frame):
+    """
+    not all cameras provide event time (e.g. polled or file based ones), then the time, when frame was received
+
+    :param frame: dict, FrameInfo fields
+    :return: float, unix time or None
+    """
+    for key in ('event_time', 'receive_time', 'process_time'):
+        if frame.get(key) is not None:
+            return frame[key]
+
+    return None
 
-        return self._camera_device.get_active_roi_value('sum')
 
 # ----------------------------------------------------------------------
 class KillConnection(Exception):
     pass
-
@@ -0,0 +1,266 @@
+# ----------------------------------------------------------------------
+# Author:        yury.matveev@desy.de
+# ----------------------------------------------------------------------
+
+"""
+Ingestion of image files, which are written by detector to watched folder.
+
+File system events only register file as pending (observer thread never decodes). File is decoded when it is
+complete: writer closed it, writer started the next file, or (after debounce time without events) its size
+did not change for stable time. Only the newest complete file is kept, older ones are skipped, so at any burst
+rate the latest image is shown within one decode time. Decoding is done in small worker pool; results of
+older files, which were decoded after newer ones, are not published.
+"""
+
+import os
+import sys
+import time
+import threading
+import logging
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from petra_camera.constants import APP_NAME
+logger = logging.getLogger(APP_NAME)
+
+WORKERS = 2
+DEBOUNCE = 0.05     # [s], file is checked after this time without events
+STABLE_TIME = 0.1   # [s], file size has to be unchanged for this time
+SPARE_BUFFERS = 4   # output buffers in pool in addition to one per worker
+
+
+# ----------------------------------------------------------------------
+class BufferPool(object):
+    """
+    Preallocated output frames for decoders. Published frames can be kept by consumers (last frame, recorder
+    queue, etc.), so buffer is reused only if nobody except pool references it anymore.
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, size):
+        """
+
+        :param size: int, max number of buffers in pool
+        """
+        self._size = size
+        self._buffers = []
+        self._lock = threading.Lock()
+
+    # ----------------------------------------------------------------------
+    def get(self, shape, dtype):
+        """
+
+        :param shape: tuple
+        :param dtype: np.dtype
+        :return: np.array, content is undefined
+        """
+        shape, dtype = tuple(shape), np.dtype(dtype)
+        with self._lock:
+            free = None
+            for ind in range(len(self._buffers)):
+                # references: pool list and getrefcount argument
+                if sys.getrefcount(self._buffers[ind]) <= 2:
+                    if self._buffers[ind].shape == shape and self._buffers[ind].dtype == dtype:
+                        return self._buffers[ind]
+                    free = ind
+
+            buffer = np.empty(shape, dtype=dtype)
+            if free is not None:
+                # frame geometry was changed, buffer of old size is not needed
+                self._buffers[free] = buffer
+            elif len(self._buffers) < self._size:
+                self._buffers.append(buffer)
+
+            return buffer
+
+
+# ----------------------------------------------------------------------
+class FileIngest(object):
+    """
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, name, decode, publish, workers=WORKERS, wait_stable=True,
+                 debounce=DEBOUNCE, stable_time=STABLE_TIME):
+        """
+
+        :param name: str, for log and threads names
+        :param decode: callable(file_name) -> np.array or None, called from worker threads
+        :param publish: callable(np.array), called with decoded frames, newest file wins
+        :param workers: int, number of decoding threads
+        :param wait_stable: bool, if False - file is decoded after each event (e.g. SWMR files, which can be
+                            read while they are written)
+        :param debounce: float, [s]
+        :param stable_time: float, [s]
+        """
+        self._name = name
+        self._decode = decode
+        self._publish = publish
+        self._workers = max(int(workers), 1)
+        self._wait_stable = wait_stable
+        self._debounce = debounce
+        self._stable_time = stable_time
+
+        self._condition = threading.Condition(threading.Lock())
+
+        self._pending = None        # dict: file, last_event, size, size_time - newest file, maybe not complete
+        self._ready = None          # (sequence, file name) - newest complete file
+        self._sequence = 0          # of files, which came to ready
+        self._published = 0         # sequence of last published file
+        self._in_flight = 0
+
+        self._executor = None
+        self._scheduler = None
+        self._run = False
+
+        self.statistics = {'events': 0, 'skipped': 0, 'decoded': 0, 'failed': 0}
+
+    # ----------------------------------------------------------------------
+    def start(self):
+        """
+        starts scheduler and workers
+        :return: None
+        """
+        if self._run:
+            return
+
+        with self._condition:
+            self._pending = None
+            self._ready = None
+            self._run = True
+
+        self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix=f'{self._name}_Decode')
+        self._scheduler = threading.Thread(target=self._schedule, name=f'{self._name}_Ingest', daemon=True)
+        self._scheduler.start()
+
+    # ----------------------------------------------------------------------
+    def stop(self):
+        """
+        stops scheduler, waits for running decodes, pending files are dropped
+        :return: None
+        """
+        if not self._run:
+            return
+
+        with self._condition:
+            self._run = False
+            self._condition.notify_all()
+
+        self._scheduler.join()
+        self._executor.shutdown(wait=True)
+
+    # ----------------------------------------------------------------------
+    def file_event(self, file_name, closed=False):
+        """
+        called from file system observer for created/modified/closed files, never waits
+
+        :param file_name: str
+        :param closed: bool, writer closed the file
+        :return: None
+        """
+        now = time.monotonic()
+        with self._condition:
+            self.statistics['events'] += 1
+
+            if self._pending is not None and self._pending['file'] != file_name:
+                # writer started the next file, so the previous one is complete
+                self._set_ready(self._pending['file'])
+                self._pending = None
+
+            if closed or not self._wait_stable:
+                if self._pending is not None:
+                    self._pending = None
+                self._set_ready(file_name)
+            elif self._pending is None:
+                self._pending = {'file': file_name, 'last_event': now, 'size': -1, 'size_time': now}
+            else:
+                self._pending['last_event'] = now
+
+            self._condition.notify_all()
+
+    # ----------------------------------------------------------------------
+    def _set_ready(self, file_name):
+        if self._ready is not None and self._ready[1] != file_name:
+            self.statistics['skipped'] += 1
+
+        self._sequence += 1
+        self._ready = (self._sequence, file_name)
+
+    # ----------------------------------------------------------------------
+    def _check_pending(self, now):
+        """
+        moves pending file to ready, if it is complete
+
+        :param now: float, monotonic time
+        :return: float, time to next check or None
+        """
+        pending = self._pending
+        if now - pending['last_event'] < self._debounce:
+            return self._debounce - (now - pending['last_event'])
+
+        try:
+            size = os.path.getsize(pending['file'])
+        except OSError:
+            # file was removed or renamed
+            self._pending = None
+            return None
+
+        if size != pending['size']:
+            pending['size'], pending['size_time'] = size, now
+            return self._stable_time
+
+        if now - pending['size_time'] < self._stable_time:
+            return self._stable_time - (now - pending['size_time'])
+
+        self._set_ready(pending['file'])
+        self._pending = None
+
+        return None
+
+    # ----------------------------------------------------------------------
+    def _schedule(self):
+        with self._condition:
+            while self._run:
+                timeout = None
+                if self._pending is not None:
+                    timeout = self._check_pending(time.monotonic())
+
+                if self._ready is not None and self._in_flight < self._workers:
+                    sequence, file_name = self._ready
+                    self._ready = None
+                    self._in_flight += 1
+                    self._executor.submit(self._process, sequence, file_name)
+                    continue
+
+                self._condition.wait(timeout)
+
+    # ----------------------------------------------------------------------
+    def _process(self, sequence, file_name):
+        """
+        decodes file in worker thread
+
+        :param sequence: int
+        :param file_name: str
+        :return: None
+        """
+        frame = None
+        try:
+            frame = self._decode(file_name)
+        except Exception as err:
+            logger.debug(f'{self._name}: cannot decode {file_name}: {err}')
+            with self._condition:
+                self.statistics['failed'] += 1
+
+        with self._condition:
+            self._in_flight -= 1
+            if frame is not None:
+                self.statistics['decoded'] += 1
+                if sequence > self._published:
+                    self._published = sequence
+                    self._publish(frame)
+                else:
+                    self.statistics['skipped'] += 1
+
+            self._condition.notify_all()
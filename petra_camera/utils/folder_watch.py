@@ -0,0 +1,350 @@
+# ----------------------------------------------------------------------
+# Author:        yury.matveev@desy.de
+# ----------------------------------------------------------------------
+
+"""
+Watching of folder, where detector writes files.
+
+Modes:
+
+    recursive:  watchdog observer on the whole folder tree (one inotify watch per subfolder, slow start
+                for big beamtime folders)
+    newest:     only the newest subfolder is watched (newest by modification time at each level, down to
+                folder without subfolders), watches are moved, when new subfolder appears. Only one
+                watch per level is needed, so start and folder switch are fast
+    polling:    the same folders as for newest, but without inotify: modification times of watched folders
+                are checked periodically and only changed folders are listed. For file systems, where
+                inotify is not reliable (e.g. GPFS changes, made on other nodes)
+"""
+
+import os
+import fnmatch
+import threading
+import logging
+
+from watchdog.observers import Observer
+from watchdog.events import FileSystemEventHandler
+
+from petra_camera.constants import APP_NAME
+logger = logging.getLogger(APP_NAME)
+
+WATCH_MODES = ('recursive', 'newest', 'polling')
+
+POLL_PERIOD = 0.5   # [s]
+MAX_DEPTH = 8       # max levels of subfolders to follow
+
+
+# ----------------------------------------------------------------------
+def newest_folders(path, max_depth=MAX_DEPTH):
+    """
+    follows the newest subfolder at each level
+
+    :param path: str, root folder
+    :param max_depth: int
+    :return: list of str, folders from root to the newest one
+    """
+    folders = [path]
+    for _ in range(max_depth):
+        newest, newest_time = None, None
+        try:
+            with os.scandir(folders[-1]) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        try:
+                            mtime = entry.stat(follow_symlinks=False).st_mtime_ns
+                        except OSError:
+                            continue
+                        if newest is None or (mtime, entry.name) > (newest_time, os.path.basename(newest)):
+                            newest, newest_time = entry.path, mtime
+        except OSError as err:
+            logger.debug(f'Cannot list {folders[-1]}: {err}')
+
+        if newest is None:
+            break
+
+        folders.append(newest)
+
+    return folders
+
+
+# ----------------------------------------------------------------------
+class WatchHandler(FileSystemEventHandler):
+    """
+    passes watchdog events to FolderWatcher
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, watcher):
+        super(WatchHandler, self).__init__()
+        self._watcher = watcher
+
+    # ----------------------------------------------------------------------
+    def on_created(self, event):
+        if event.is_directory:
+            self._watcher.folder_created(event.src_path)
+        else:
+            self._watcher.file_event(event.src_path)
+
+    # ----------------------------------------------------------------------
+    def on_moved(self, event):
+        if event.is_directory:
+            self._watcher.folder_created(event.dest_path)
+        else:
+            self._watcher.file_event(event.dest_path)
+
+    # ----------------------------------------------------------------------
+    def on_modified(self, event):
+        if not event.is_directory:
+            self._watcher.file_event(event.src_path)
+
+    # ----------------------------------------------------------------------
+    def on_closed(self, event):
+        if not event.is_directory:
+            self._watcher.file_event(event.src_path, closed=True)
+
+
+# ----------------------------------------------------------------------
+class FolderWatcher(object):
+    """
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, name, patterns, callback, mode='recursive', poll_period=POLL_PERIOD, max_depth=MAX_DEPTH):
+        """
+
+        :param name: str, for log and thread name
+        :param patterns: list of str, e.g. ['*.tif']
+        :param callback: callable(file_name, closed=False), called for created/modified/closed files
+        :param mode: str, one of WATCH_MODES
+        :param poll_period: float, [s], for polling mode
+        :param max_depth: int, levels of subfolders to follow in newest and polling modes
+        """
+        if mode not in WATCH_MODES:
+            raise ValueError(f'Unknown watch mode {mode}, possible: {", ".join(WATCH_MODES)}')
+
+        self._name = name
+        self._patterns = patterns
+        self._callback = callback
+        self._mode = mode
+        self._poll_period = poll_period
+        self._max_depth = max_depth
+
+        self._lock = threading.RLock()
+
+        self._path = None
+        self._folders = []      # followed folders, from root to the newest
+
+        self._observer = None
+        self._watches = {}      # folder: ObservedWatch
+
+        self._poller = None
+        self._stop_event = threading.Event()
+        self._mtimes = {}       # folder: mtime at last poll
+        self._known_files = set()
+        self._last_file = None  # the last reported file and its (size, mtime)
+        self._last_stat = None
+
+    # ----------------------------------------------------------------------
+    def start(self, path):
+        """
+
+        :param path: str, root folder
+        :return: None
+        """
+        self.stop()
+
+        self._path = path
+        self._folders = []
+
+        if self._mode == 'polling':
+            self._folders = newest_folders(path, self._max_depth)
+            self._mtimes = {folder: self._mtime(folder) for folder in self._folders}
+            # files, which are already there, are not reported
+            self._known_files = set(self._list_files(self._folders[-1]))
+            self._last_file = None
+
+            self._stop_event.clear()
+            self._poller = threading.Thread(target=self._poll, name=f'{self._name}_FolderPoller', daemon=True)
+            self._poller.start()
+
+        else:
+            self._observer = Observer()
+            if self._mode == 'recursive':
+                self._observer.schedule(WatchHandler(self), path, recursive=True)
+            else:
+                self._update_folders(path, report_files=False)
+            self._observer.start()
+
+        logger.info(f'{self._name}: watching {self.get_folder()} ({self._mode})')
+
+    # ----------------------------------------------------------------------
+    def stop(self):
+        """
+        :return: None
+        """
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+            self._watches = {}
+
+        if self._poller is not None:
+            self._stop_event.set()
+            self._poller.join()
+            self._poller = None
+
+    # ----------------------------------------------------------------------
+    def get_folder(self):
+        """
+
+        :return: str, the newest followed folder (root for recursive mode)
+        """
+        with self._lock:
+            return self._folders[-1] if self._folders else self._path
+
+    # ----------------------------------------------------------------------
+    def _matches(self, file_name):
+        name = os.path.basename(file_name)
+        return any(fnmatch.fnmatch(name, pattern) for pattern in self._patterns)
+
+    # ----------------------------------------------------------------------
+    def _list_files(self, folder):
+        try:
+            with os.scandir(folder) as entries:
+                return sorted(entry.path for entry in entries
+                              if entry.is_file(follow_symlinks=False) and self._matches(entry.name))
+        except OSError:
+            return []
+
+    # ----------------------------------------------------------------------
+    @staticmethod
+    def _mtime(folder):
+        try:
+            return os.stat(folder).st_mtime_ns
+        except OSError:
+            return None
+
+    # ----------------------------------------------------------------------
+    def file_event(self, file_name, closed=False):
+        if self._matches(file_name):
+            self._callback(file_name, closed)
+
+    # ----------------------------------------------------------------------
+    def folder_created(self, folder):
+        """
+        new subfolder in one of watched folders: watches are moved to it
+
+        :param folder: str
+        :return: None
+        """
+        if self._mode == 'newest':
+            self._update_folders(os.path.dirname(folder))
+
+    # ----------------------------------------------------------------------
+    def _update_folders(self, parent, report_files=True):
+        """
+        follows the newest subfolders from parent and moves watches
+
+        :param parent: str, folder, where new subfolder appeared
+        :param report_files: bool, report files, which are already in the new newest folder
+        :return: None
+        """
+        with self._lock:
+            level = self._folders.index(parent) if parent in self._folders else 0
+            folders = self._folders[:level] + newest_folders(self._folders[level] if level else self._path,
+                                                             self._max_depth - level)
+
+            if folders == self._folders:
+                return
+
+            while True:
+                for folder in [folder for folder in self._watches if folder not in folders]:
+                    self._observer.unschedule(self._watches.pop(folder))
+
+                for folder in folders:
+                    if folder not in self._watches:
+                        try:
+                            self._watches[folder] = self._observer.schedule(WatchHandler(self), folder,
+                                                                            recursive=False)
+                        except OSError as err:
+                            logger.debug(f'{self._name}: cannot watch {folder}: {err}')
+
+                self._folders = folders
+
+                # subfolder, created before watch was added to its parent (e.g. by mkdir -p), gives no event
+                folders = folders[:level] + newest_folders(folders[level], self._max_depth - level)
+                if folders == self._folders:
+                    break
+
+        logger.debug(f'{self._name}: following {folders[-1]}')
+
+        if report_files:
+            # files could be created before watch was added
+            for file_name in self._list_files(folders[-1]):
+                self._callback(file_name, False)
+
+    # ----------------------------------------------------------------------
+    def _poll(self):
+        while not self._stop_event.wait(self._poll_period):
+            try:
+                self._poll_folders()
+            except Exception as err:
+                logger.error(f'{self._name}: error during folder polling: {err}')
+
+    # ----------------------------------------------------------------------
+    def _poll_folders(self):
+        """
+        lists only folders, which were changed since last poll
+
+        :return: None
+        """
+        changed = False
+        for level, folder in enumerate(self._folders):
+            mtime = self._mtime(folder)
+            if mtime == self._mtimes.get(folder):
+                continue
+
+            changed = True
+            self._mtimes[folder] = mtime
+
+            folders = self._folders[:level] + newest_folders(folder, self._max_depth - level)
+            if folders != self._folders:
+                with self._lock:
+                    self._folders = folders
+                self._mtimes = {folder: self._mtimes.get(folder) or self._mtime(folder) for folder in folders}
+                # new subfolder: all its files are new
+                self._known_files = set()
+                self._last_file = None
+                logger.debug(f'{self._name}: following {folders[-1]}')
+                break
+
+        if changed:
+            files = self._list_files(self._folders[-1])
+            for file_name in files:
+                if file_name not in self._known_files:
+                    self._report_file(file_name)
+            self._known_files = set(files)
+
+        elif self._last_file is not None:
+            # file, which is still written (e.g. NeXus file with growing stack) does not change folder mtime
+            self._report_file(self._last_file)
+
+    # ----------------------------------------------------------------------
+    def _report_file(self, file_name):
+        """
+        reports file in polling mode, if it is new or was changed since last report
+
+        :param file_name: str
+        :return: None
+        """
+        try:
+            stat = os.stat(file_name)
+        except OSError:
+            return
+
+        if file_name == self._last_file and (stat.st_size, stat.st_mtime_ns) == self._last_stat:
+            return
+
+        self._last_file = file_name
+        self._last_stat = (stat.st_size, stat.st_mtime_ns)
+        self._callback(file_name, False)
@@ -0,0 +1,108 @@
+# ----------------------------------------------------------------------
+# Author:        yury.matveev@desy.de
+# ----------------------------------------------------------------------
+
+"""
+Lock protected latest-frame slot used to hand frames between threads
+"""
+
+import threading
+
+
+# ----------------------------------------------------------------------
+class LatestFrame(object):
+    """
+    Keeps only the newest frame. The writer only swaps a reference under the lock, so it never waits for
+    the reader; the reader always gets the newest complete frame and can block until one arrives.
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self):
+
+        self._condition = threading.Condition(threading.Lock())
+
+        self._frame = None
+        self._sequence = 0        # sequence of the last written frame
+        self._read_sequence = 0   # sequence of the last consumed frame
+        self._woken = False
+
+        self.overwritten = 0      # frames, which were replaced before reader took them
+
+    # ----------------------------------------------------------------------
+    def put(self, frame):
+        """
+        stores new frame and wakes up reader
+
+        :param frame: new frame
+        :return: int, sequence number of frame
+        """
+        with self._condition:
+            if self._sequence != self._read_sequence:
+                self.overwritten += 1
+
+            self._frame = frame
+            self._sequence += 1
+            self._condition.notify_all()
+
+            return self._sequence
+
+    # ----------------------------------------------------------------------
+    def get(self, timeout=None):
+        """
+        takes the newest frame, if there is no new one - waits for it
+
+        :param timeout: float, max waiting time in seconds, 0 - do not wait, None - wait forever
+        :return: (sequence, frame) or (None, None) if there was no new frame
+        """
+        with self._condition:
+            if self._sequence == self._read_sequence and timeout != 0:
+                self._condition.wait_for(lambda: self._sequence != self._read_sequence or self._woken, timeout)
+
+            self._woken = False
+
+            if self._sequence == self._read_sequence:
+                return None, None
+
+            self._read_sequence = self._sequence
+            self._condition.notify_all()
+            return self._sequence, self._frame
+
+    # ----------------------------------------------------------------------
+    def wait_consumed(self, timeout=None):
+        """
+        waits till reader takes the last frame (e.g. for writers, which must not lose frames)
+
+        :param timeout: float, max waiting time in seconds, None - wait forever
+        :return: bool, True if there is no unread frame
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: self._sequence == self._read_sequence, timeout)
+
+    # ----------------------------------------------------------------------
+    def peek(self):
+        """
+        returns the newest frame without marking it as consumed
+
+        :return: (sequence, frame)
+        """
+        with self._condition:
+            return self._sequence, self._frame
+
+    # ----------------------------------------------------------------------
+    def reset_statistics(self):
+        """
+        resets overwritten frames counter
+        :return: None
+        """
+        with self._condition:
+            self.overwritten = 0
+
+    # ----------------------------------------------------------------------
+    def wake(self):
+        """
+        interrupts waiting reader (e.g. to stop thread)
+        :return: None
+        """
+        with self._condition:
+            self._woken = True
+            self._condition.notify_all()
@@ -0,0 +1,276 @@
+# ----------------------------------------------------------------------
+# Author:        yury.matveev@desy.de
+# ----------------------------------------------------------------------
+
+"""
+In-memory history of the last frames of camera.
+
+Memory for all frames is allocated once, with the first frame (or when frame does not fit to slot anymore),
+frames are copied into slots in their native data type. Size of history is given either by number of frames
+or by memory budget in MB.
+"""
+
+import json
+import threading
+import logging
+
+import numpy as np
+
+from petra_camera.constants import APP_NAME
+logger = logging.getLogger(APP_NAME)
+
+MB = 2 ** 20
+
+
+# ----------------------------------------------------------------------
+class FrameHistory(object):
+    """
+    Ring of frames with their FrameInfo. Writer (acquisition thread) never allocates memory after the ring
+    was created and never waits for readers longer than one frame copy.
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, max_frames=None, max_mb=None):
+        """
+
+        :param max_frames: int, number of frames to keep
+        :param max_mb: float, memory budget in MB, used if max_frames is not given
+        """
+        if not max_frames and not max_mb:
+            raise ValueError('Either max_frames or max_mb has to be given')
+
+        self._max_frames = int(max_frames) if max_frames else None
+        self._max_mb = float(max_mb) if max_mb else None
+
+        self._lock = threading.Lock()
+
+        self._frames = None           # np.array (slots, *slot shape), allocated with the first frame
+        self._shapes = None           # np.array (slots, 3), shape of frame in each slot
+        self._infos = []              # FrameInfo of frame in each slot
+        self._count = 0               # number of frames, ever written
+        self._paused = 0              # recording is paused, while > 0
+        self._disabled = False        # budget is smaller than one frame
+
+        self.slot_shape = None
+        self.dtype = None
+
+    # ----------------------------------------------------------------------
+    def _allocate(self, slot_shape, dtype):
+        """
+        allocates ring memory
+
+        :param slot_shape: tuple, max frame shape
+        :param dtype: np.dtype
+        :return: bool, success
+        """
+        slot_bytes = int(np.prod(slot_shape)) * np.dtype(dtype).itemsize
+        if self._max_frames:
+            slots = self._max_frames
+        else:
+            slots = int(self._max_mb * MB // slot_bytes)
+
+        if slots < 1:
+            logger.warning(f'Frame history: budget {self._max_mb} MB is smaller than one frame '
+                           f'({slot_bytes / MB:.1f} MB), history disabled')
+            return False
+
+        self._frames = None
+        self._frames = np.zeros((slots,) + tuple(slot_shape), dtype=dtype)
+        self._shapes = np.zeros((slots, 3), dtype=np.int64)
+        self._infos = [None] * slots
+        self._count = 0
+
+        self.slot_shape = tuple(slot_shape)
+        self.dtype = np.dtype(dtype)
+
+        logger.info(f'Frame history: {slots} frames x {slot_bytes / MB:.1f} MB')
+
+        return True
+
+    # ----------------------------------------------------------------------
+    def _fits(self, frame):
+        return self._frames is not None and frame.dtype == self.dtype and frame.ndim == len(self.slot_shape) and \
+               all(size <= slot for size, slot in zip(frame.shape, self.slot_shape))
+
+    # ----------------------------------------------------------------------
+    def add(self, frame, info, max_shape=None):
+        """
+        copies frame to the next slot, if frame does not fit to slot (data type or size were changed),
+        history is cleared and ring is allocated again
+
+        :param frame: np.array
+        :param info: FrameInfo
+        :param max_shape: tuple, max frame shape (e.g. full sensor), used to size slots with the first frame
+        :return: None
+        """
+        with self._lock:
+            if self._paused or self._disabled:
+                return
+
+            if not self._fits(frame):
+                slot_shape = frame.shape
+                if max_shape is not None and len(max_shape) == frame.ndim:
+                    slot_shape = tuple(max(size, limit) for size, limit in zip(frame.shape, max_shape))
+                if not self._allocate(slot_shape, frame.dtype):
+                    self._disabled = True
+                    return
+
+            slot = self._count % len(self._infos)
+            self._count += 1
+
+            if frame.ndim == 2:
+                np.copyto(self._frames[slot, :frame.shape[0], :frame.shape[1]], frame)
+            else:
+                np.copyto(self._frames[slot, :frame.shape[0], :frame.shape[1], :frame.shape[2]], frame)
+            self._shapes[slot, :frame.ndim] = frame.shape
+            self._infos[slot] = info
+
+    # ----------------------------------------------------------------------
+    def __len__(self):
+        with self._lock:
+            return min(self._count, len(self._infos))
+
+    # ----------------------------------------------------------------------
+    def memory(self):
+        """
+
+        :return: int, reserved memory in bytes. OS maps the pages only when ring is written first time,
+                 so till the history is filled, process RSS contains only part of it
+        """
+        frames = self._frames
+        return 0 if frames is None else frames.nbytes
+
+    # ----------------------------------------------------------------------
+    def _slot(self, index):
+        """
+
+        :param index: int, 0 - the oldest frame in history, -1 - the newest
+        :return: int, slot number
+        """
+        size = min(self._count, len(self._infos))
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError('Frame history index out of range')
+
+        return (self._count - size + index) % len(self._infos)
+
+    # ----------------------------------------------------------------------
+    def _view(self, slot):
+        ndim = len(self.slot_shape)
+        return self._frames[(slot,) + tuple(slice(0, size) for size in self._shapes[slot, :ndim])]
+
+    # ----------------------------------------------------------------------
+    def get(self, index):
+        """
+        copy of frame from history
+
+        :param index: int, 0 - the oldest frame in history, -1 - the newest
+        :return: (np.array, FrameInfo)
+        """
+        with self._lock:
+            slot = self._slot(index)
+            return self._view(slot).copy(), self._infos[slot]
+
+    # ----------------------------------------------------------------------
+    def get_infos(self):
+        """
+
+        :return: list of FrameInfo, from the oldest to the newest
+        """
+        with self._lock:
+            size = min(self._count, len(self._infos))
+            return [self._infos[self._slot(index)] for index in range(size)]
+
+    # ----------------------------------------------------------------------
+    def indexes_since(self, seconds):
+        """
+
+        :param seconds: float
+        :return: range of indexes of frames, received within last seconds
+        """
+        infos = self.get_infos()
+        if not infos:
+            return range(0)
+
+        last_time = _frame_time(infos[-1])
+        first = len(infos)
+        while first > 0 and last_time - _frame_time(infos[first - 1]) <= seconds:
+            first -= 1
+
+        return range(first, len(infos))
+
+    # ----------------------------------------------------------------------
+    def pause(self):
+        """
+        stops recording, e.g. to keep history unchanged while it is saved or viewed,
+        each pause() has to be followed by resume()
+
+        :return: None
+        """
+        with self._lock:
+            self._paused += 1
+
+    # ----------------------------------------------------------------------
+    def resume(self):
+        """
+        resumes recording after pause()
+        :return: None
+        """
+        with self._lock:
+            self._paused = max(self._paused - 1, 0)
+
+    # ----------------------------------------------------------------------
+    def save(self, file_name, seconds):
+        """
+        saves frames of last seconds: frames to <file_name>.npy (frames are padded to the biggest frame),
+        FrameInfo and shape of each frame to <file_name>.json. Recording is paused while saving.
+
+        :param file_name: str, without extension
+        :param seconds: float
+        :return: int, number of saved frames
+        """
+        self.pause()
+        try:
+            indexes = self.indexes_since(seconds)
+            if not len(indexes):
+                return 0
+
+            with self._lock:
+                ndim = len(self.slot_shape)
+                slots = [self._slot(index) for index in indexes]
+                shape = tuple(int(size) for size in self._shapes[slots, :ndim].max(axis=0))
+
+            data = np.lib.format.open_memmap(file_name + '.npy', mode='w+', dtype=self.dtype,
+                                             shape=(len(slots),) + shape)
+            meta = []
+            for ind, slot in enumerate(slots):
+                frame = self._view(slot)
+                data[(ind,) + tuple(slice(0, size) for size in frame.shape)] = frame
+                meta.append({'shape': frame.shape, 'info': self._infos[slot].as_dict()})
+
+            data.flush()
+            del data
+
+            with open(file_name + '.json', 'w') as f:
+                json.dump(meta, f, indent=1)
+
+            return len(slots)
+
+        finally:
+            self.resume()
+
+    # ----------------------------------------------------------------------
+    def clear(self):
+        """
+        forgets all frames, memory is kept
+        :return: None
+        """
+        with self._lock:
+            self._count = 0
+            self._infos = [None] * len(self._infos)
+
+
+# ----------------------------------------------------------------------
+def _frame_time(info):
+    return info.event_time or info.receive_time or info.process_time or 0.
@@ -0,0 +1,95 @@
+# ----------------------------------------------------------------------
+# Author:        yury.matveev@desy.de
+# ----------------------------------------------------------------------
+
+"""
+Immutable metadata record, which travels together with frame from camera proxy to display
+"""
+
+
+# ----------------------------------------------------------------------
+class FrameInfo(object):
+    """
+    Sequence number, timestamps and geometry of one frame. Geometry is taken at the moment the frame was
+    clipped/rotated, so consumers do not need to ask camera proxy (which can be already changed) at render time.
+
+    All timestamps are time.time() based, so they can be compared with Tango event time.
+    Instances cannot be modified, use replace() to get a copy with new values.
+    """
+
+    __slots__ = ('sequence',        # int, frame number given by camera proxy
+                 'event_time',      # float or None, time stamp of Tango event (or camera)
+                 'receive_time',    # float, when camera proxy got the frame
+                 'process_time',    # float or None, when DataSource2D took the frame
+                 'display_time',    # float or None, when frame was shown
+                 'clip',            # (x, y, w, h) - picture clip of frame
+                 'reduction',       # int, picture reduction of frame
+                 'rotation',        # int, rotation angle / 90
+                 'flip_v',          # bool
+                 'flip_h',          # bool
+                 'dtype')           # str, frame data type
+
+    # ----------------------------------------------------------------------
+    def __init__(self, sequence=0, event_time=None, receive_time=None, process_time=None, display_time=None,
+                 clip=(0, 0, 0, 0), reduction=1, rotation=0, flip_v=False, flip_h=False, dtype=''):
+
+        _set = super(FrameInfo, self).__setattr__
+
+        _set('sequence', sequence)
+        _set('event_time', event_time)
+        _set('receive_time', receive_time)
+        _set('process_time', process_time)
+        _set('display_time', display_time)
+        _set('clip', tuple(clip))
+        _set('reduction', reduction)
+        _set('rotation', rotation)
+        _set('flip_v', flip_v)
+        _set('flip_h', flip_h)
+        _set('dtype', dtype)
+
+    # ----------------------------------------------------------------------
+    def __setattr__(self, key, value):
+        raise AttributeError('FrameInfo is immutable, use replace()')
+
+    # ----------------------------------------------------------------------
+    def __delattr__(self, key):
+        raise AttributeError('FrameInfo is immutable')
+
+    # ----------------------------------------------------------------------
+    def __repr__(self):
+        return 'FrameInfo({})'.format(', '.join('{}={!r}'.format(key, value) for key, value in self.as_dict().items()))
+
+    # ----------------------------------------------------------------------
+    def replace(self, **kwargs):
+        """
+        returns copy with changed fields
+
+        :param kwargs: fields to be changed
+        :return: FrameInfo
+        """
+        values = self.as_dict()
+        values.update(kwargs)
+
+        return FrameInfo(**values)
+
+    # ----------------------------------------------------------------------
+    def as_dict(self):
+        """
+
+        :return: dict with all fields, can be sent as json
+        """
+        return {key: getattr(self, key) for key in self.__slots__}
+
+    # ----------------------------------------------------------------------
+    def latency(self, start='receive_time', end='display_time'):
+        """
+
+        :param start: str, name of first timestamp
+        :param end: str, name of second timestamp
+        :return: float, [s] time between two stages, None if any of them is not known
+        """
+        start, end = getattr(self, start), getattr(self, end)
+        if start is None or end is None:
+            return None
+
+        return end - start
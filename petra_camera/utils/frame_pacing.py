@@ -0,0 +1,104 @@
+# ----------------------------------------------------------------------
+# Author:        yury.matveev@desy.de
+# ----------------------------------------------------------------------
+
+"""
+Deadline based frame pacing for acquisition threads
+"""
+
+import time
+
+
+# ----------------------------------------------------------------------
+class FramePacer(object):
+    """
+    Schedules frame processing on fixed slots of the monotonic clock. Processing time is taken into account,
+    missed slots are skipped instead of being caught up, so the rate does not drift with analysis cost.
+    """
+
+    JITTER = 0.1        # part of period, frames which come earlier than slot by this value are taken immediately
+    RATE_WINDOW = 1.    # [s], window to calculate achieved rate
+
+    # ----------------------------------------------------------------------
+    def __init__(self, rate):
+
+        self.requested_rate = 1
+        self._period = 1.
+
+        self.set_rate(rate)
+        self.reset()
+
+    # ----------------------------------------------------------------------
+    def set_rate(self, rate):
+        """
+
+        :param rate: float, requested frames per second
+        :return: None
+        """
+        self.requested_rate = max(rate, 1e-3)
+        self._period = 1. / self.requested_rate
+
+    # ----------------------------------------------------------------------
+    def reset(self):
+        """
+        drops schedule and statistics (e.g. at acquisition start)
+        :return: None
+        """
+        self._next_deadline = None
+
+        self.achieved_rate = 0.
+        self.skipped_slots = 0
+
+        self._window_start = time.monotonic()
+        self._window_frames = 0
+
+    # ----------------------------------------------------------------------
+    def time_to_deadline(self):
+        """
+
+        :return: float, seconds till next slot, 0 if frame can be processed now
+        """
+        if self._next_deadline is None:
+            return 0
+
+        delay = self._next_deadline - time.monotonic()
+        if delay <= self._period * self.JITTER:
+            return 0
+
+        return delay
+
+    # ----------------------------------------------------------------------
+    def frame_done(self):
+        """
+        has to be called after frame was processed, moves deadline to the next free slot
+        :return: None
+        """
+        now = time.monotonic()
+
+        if self._next_deadline is None:
+            self._next_deadline = now
+
+        self._next_deadline += self._period
+
+        if self._next_deadline <= now:
+            missed = int((now - self._next_deadline) // self._period) + 1
+            self.skipped_slots += missed
+            self._next_deadline += missed * self._period
+
+        self._window_frames += 1
+        if now - self._window_start >= self.RATE_WINDOW:
+            self.achieved_rate = self._window_frames / (now - self._window_start)
+            self._window_frames = 0
+            self._window_start = now
+
+    # ----------------------------------------------------------------------
+    def get_rate(self):
+        """
+
+        :return: (float, float) achieved and requested rates
+        """
+        if time.monotonic() - self._window_start > 2 * self.RATE_WINDOW:
+            # no frames for a long time
+            return 0., self.requested_rate
+
+        return self.achieved_rate, self.requested_rate
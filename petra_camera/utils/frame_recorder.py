@@ -0,0 +1,347 @@
+# ----------------------------------------------------------------------
+# Author:        yury.matveev@desy.de
+# ----------------------------------------------------------------------
+
+"""
+Continuous recording of frames to file.
+
+Acquisition thread only puts frame references to bounded queue (frames from camera proxy are replaced, not
+modified, so they do not need to be copied), separate writer thread takes them from queue and writes to disk.
+If writer cannot keep up and queue is full, new frames are dropped and counted, acquisition never waits.
+
+Formats (selected by file extension):
+
+    .h5, .hdf5, .nxs - chunked HDF5 (one chunk per frame), datasets:
+                       /entry/data/data - frames, /entry/data/sequence, event_time, receive_time, clip, reduction
+    .npy             - frames to memory mapped npy file (file is created for max_frames and truncated on stop),
+                       frame info to json file with the same name
+"""
+
+import os
+import io
+import json
+import queue
+import time
+import threading
+import logging
+
+import numpy as np
+
+try:
+    import h5py
+    h5py_available = True
+except ImportError:
+    h5py_available = False
+
+from petra_camera.constants import APP_NAME
+logger = logging.getLogger(APP_NAME)
+
+QUEUE_SIZE = 32          # frames, waiting for writer
+NPY_FRAMES = 1000        # default number of frames for npy file
+GROW_STEP = 64           # HDF5 datasets are extended by this number of frames
+
+HDF5_EXTENSIONS = ('.h5', '.hdf5', '.nxs')
+
+MB = 2 ** 20
+
+
+# ----------------------------------------------------------------------
+class FrameRecorder(threading.Thread):
+    """
+    Writer thread, add_frame can be used as DataSource2D frame listener
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, file_name, camera_name='', max_frames=0, queue_size=QUEUE_SIZE):
+        """
+
+        :param file_name: str, extension defines format
+        :param camera_name: str, saved as attribute to HDF5 file
+        :param max_frames: int, recording is finished after this number of frames, 0 - no limit (for HDF5)
+        :param queue_size: int, max number of frames, waiting to be written
+        """
+        super(FrameRecorder, self).__init__(name=f'{camera_name}_Recorder', daemon=True)
+
+        extension = os.path.splitext(file_name)[1].lower()
+        if extension in HDF5_EXTENSIONS:
+            if not h5py_available:
+                raise RuntimeError('h5py is not installed, cannot record to HDF5')
+            self._writer = Hdf5Writer(file_name, camera_name)
+        elif extension == '.npy':
+            max_frames = max_frames if max_frames else NPY_FRAMES
+            self._writer = NpyWriter(file_name, max_frames)
+        else:
+            raise ValueError(f'Unknown file format: {extension}')
+
+        self.file_name = file_name
+        self._max_frames = max_frames
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stop_event = threading.Event()
+        self._accept = True
+
+        self._accepted = 0      # frames, put to queue
+        self._written = 0
+        self._dropped = 0       # queue was full
+        self._skipped = 0       # frame shape or type differ from the first frame
+        self._bytes = 0
+        self._write_time = 0.
+
+        self._start_time = None
+        self._finish_time = None
+
+        self.error = None
+
+    # ----------------------------------------------------------------------
+    def add_frame(self, camera_id, frame, info):
+        """
+        called from acquisition thread, never waits
+
+        :param camera_id: int
+        :param frame: np.array
+        :param info: FrameInfo
+        :return: None
+        """
+        if not self._accept:
+            return
+
+        if self._max_frames and self._accepted >= self._max_frames:
+            self._accept = False
+            return
+
+        try:
+            self._queue.put_nowait((frame, info))
+            self._accepted += 1
+        except queue.Full:
+            self._dropped += 1
+
+    # ----------------------------------------------------------------------
+    def stop(self):
+        """
+        stops accepting frames, waits till queued frames are written and file is closed
+        :return: None
+        """
+        self._accept = False
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
+
+    # ----------------------------------------------------------------------
+    def is_recording(self):
+        """
+
+        :return: bool, False if recording was finished (max frames reached, error or stop)
+        """
+        return self._accept and self.error is None
+
+    # ----------------------------------------------------------------------
+    def get_statistics(self):
+        """
+
+        :return: dict: frames - written frames, dropped - frames dropped because writer was too slow,
+                       skipped - frames with different shape, queued - frames in queue,
+                       fps, mb_per_s - average write rate since start, disk_mb_per_s - rate of disk writes only,
+                       recording - bool, error - str or None
+        """
+        if self._start_time is None:
+            elapsed = 0
+        else:
+            elapsed = (self._finish_time or time.time()) - self._start_time
+
+        return {'frames': self._written,
+                'dropped': self._dropped,
+                'skipped': self._skipped,
+                'queued': self._queue.qsize(),
+                'fps': self._written / elapsed if elapsed else 0.,
+                'mb_per_s': self._bytes / MB / elapsed if elapsed else 0.,
+                'disk_mb_per_s': self._bytes / MB / self._write_time if self._write_time else 0.,
+                'recording': self.is_recording(),
+                'error': self.error}
+
+    # ----------------------------------------------------------------------
+    def run(self):
+        self._start_time = time.time()
+        try:
+            while True:
+                try:
+                    frame, info = self._queue.get(timeout=0.1)
+                except queue.Empty:
+                    if self._stop_event.is_set() or not self._accept:
+                        break
+                    continue
+
+                if not self._writer.fits(frame):
+                    if not self._skipped:
+                        logger.warning(f'{self.file_name}: frame {frame.shape} {frame.dtype} differs '
+                                       f'from the first frame, skipped')
+                    self._skipped += 1
+                    continue
+
+                start = time.time()
+                self._writer.write(self._written, frame, info)
+                self._write_time += time.time() - start
+
+                self._written += 1
+                self._bytes += frame.nbytes
+
+        except Exception as err:
+            logger.error(f'Error during recording to {self.file_name}: {err}', exc_info=True)
+            self.error = str(err)
+            self._accept = False
+
+        finally:
+            try:
+                self._writer.close(self._written)
+            except Exception as err:
+                logger.error(f'Cannot close {self.file_name}: {err}', exc_info=True)
+                if self.error is None:
+                    self.error = str(err)
+
+            self._finish_time = time.time()
+
+        logger.info(f'Recording to {self.file_name} finished: {self._written} frames, {self._dropped} dropped')
+
+
+# ----------------------------------------------------------------------
+class Hdf5Writer(object):
+    """
+    frames to chunked HDF5 dataset, datasets are created with the first frame and extended by GROW_STEP frames
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, file_name, camera_name):
+
+        self._file = h5py.File(file_name, 'w')
+        self._file.attrs['camera'] = camera_name
+        self._file.attrs['start_time'] = time.time()
+
+        self._group = self._file.create_group('entry/data')
+        self._data = None
+        self._meta = {}
+
+    # ----------------------------------------------------------------------
+    def fits(self, frame):
+        return self._data is None or (frame.shape == self._data.shape[1:] and frame.dtype == self._data.dtype)
+
+    # ----------------------------------------------------------------------
+    def _create(self, frame):
+        self._data = self._group.create_dataset('data', shape=(GROW_STEP,) + frame.shape,
+                                                maxshape=(None,) + frame.shape,
+                                                chunks=(1,) + frame.shape, dtype=frame.dtype)
+
+        for name, dtype, shape in (('sequence', np.int64, ()), ('event_time', np.float64, ()),
+                                   ('receive_time', np.float64, ()), ('clip', np.int32, (4,)),
+                                   ('reduction', np.int32, ())):
+            self._meta[name] = self._group.create_dataset(name, shape=(GROW_STEP,) + shape,
+                                                          maxshape=(None,) + shape,
+                                                          chunks=(GROW_STEP,) + shape, dtype=dtype)
+
+    # ----------------------------------------------------------------------
+    def write(self, index, frame, info):
+        """
+
+        :param index: int, number of frame in file
+        :param frame: np.array
+        :param info: FrameInfo
+        :return: None
+        """
+        if self._data is None:
+            self._create(frame)
+
+        if index >= self._data.shape[0]:
+            for dataset in [self._data] + list(self._meta.values()):
+                dataset.resize(index + GROW_STEP, axis=0)
+
+        self._data.write_direct(np.ascontiguousarray(frame), dest_sel=np.s_[index])
+
+        self._meta['sequence'][index] = info.sequence
+        self._meta['event_time'][index] = info.event_time if info.event_time is not None else np.nan
+        self._meta['receive_time'][index] = info.receive_time if info.receive_time is not None else np.nan
+        self._meta['clip'][index] = info.clip
+        self._meta['reduction'][index] = info.reduction
+
+    # ----------------------------------------------------------------------
+    def close(self, frames):
+        """
+
+        :param frames: int, number of written frames, datasets are cut to this size
+        :return: None
+        """
+        if self._data is not None:
+            for dataset in [self._data] + list(self._meta.values()):
+                dataset.resize(frames, axis=0)
+
+        self._file.close()
+
+
+# ----------------------------------------------------------------------
+class NpyWriter(object):
+    """
+    frames to memory mapped npy file, which is created with the first frame for max_frames,
+    on close file is cut to the number of written frames
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, file_name, max_frames):
+
+        self._file_name = file_name
+        self._max_frames = max_frames
+
+        self._data = None
+        self._infos = []
+
+    # ----------------------------------------------------------------------
+    def fits(self, frame):
+        return self._data is None or (frame.shape == self._data.shape[1:] and frame.dtype == self._data.dtype)
+
+    # ----------------------------------------------------------------------
+    def write(self, index, frame, info):
+        """
+
+        :param index: int, number of frame in file
+        :param frame: np.array
+        :param info: FrameInfo
+        :return: None
+        """
+        if self._data is None:
+            self._data = np.lib.format.open_memmap(self._file_name, mode='w+', dtype=frame.dtype,
+                                                   shape=(self._max_frames,) + frame.shape)
+
+        if index >= self._max_frames:
+            raise RuntimeError(f'npy file is full ({self._max_frames} frames)')
+
+        self._data[index] = frame
+        self._infos.append(info.as_dict())
+
+    # ----------------------------------------------------------------------
+    def close(self, frames):
+        """
+
+        :param frames: int, number of written frames, file is cut to this size
+        :return: None
+        """
+        if self._data is None:
+            return
+
+        shape, dtype, offset = self._data.shape, self._data.dtype, self._data.offset
+        self._data.flush()
+        self._data = None
+
+        with open(os.path.splitext(self._file_name)[0] + '.json', 'w') as f:
+            json.dump(self._infos, f, indent=1)
+
+        if frames == shape[0]:
+            return
+
+        # new header has to have the same size, as old one (it is padded, so usually it is the case)
+        header = io.BytesIO()
+        np.lib.format.write_array_header_1_0(header, {'descr': np.lib.format.dtype_to_descr(dtype),
+                                                      'fortran_order': False,
+                                                      'shape': (frames,) + shape[1:]})
+        if len(header.getvalue()) != offset:
+            logger.warning(f'{self._file_name}: cannot cut file, only first {frames} frames are valid')
+            return
+
+        with open(self._file_name, 'r+b') as f:
+            f.write(header.getvalue())
+            f.truncate(offset + frames * int(np.prod(shape[1:])) * dtype.itemsize)
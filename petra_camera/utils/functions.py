@@ -55,10 +55,8 @@ def FWHM(data):
     try:
         half_max = (np.amax(data) - np.amin(data)) / 2
 
-        diff = np.sign(data - half_max)
-        left_idx = np.where(diff > 0)[0][0]
-        right_idx = np.where(diff > 0)[0][-1]
-        return right_idx - left_idx  # return the difference (full width)
+        above = np.flatnonzero(data > half_max)
+        return above[-1] - above[0]  # return the difference (full width)
     except:
         return 0
 
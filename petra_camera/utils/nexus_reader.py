@@ -0,0 +1,151 @@
+# ----------------------------------------------------------------------
+# Author:        yury.matveev@desy.de
+# ----------------------------------------------------------------------
+
+"""
+Reader of frames from NeXus/HDF5 files, which can be still written by detector (SWMR).
+Only requested clip of frame is read from file.
+"""
+
+import logging
+
+import numpy as np
+
+try:
+    import h5py
+    h5py_available = True
+except ImportError:
+    h5py_available = False
+
+from petra_camera.constants import APP_NAME
+logger = logging.getLogger(APP_NAME)
+
+DEFAULT_DATASETS = ('entry/data/data', 'entry/instrument/detector/data')
+
+
+# ----------------------------------------------------------------------
+def find_frames_dataset(h5_file, dataset=None):
+    """
+
+    :param h5_file: h5py.File
+    :param dataset: str, path of dataset, None - one of DEFAULT_DATASETS or the first dataset with ndim >= 2
+    :return: h5py.Dataset
+    """
+    if dataset is not None:
+        return h5_file[dataset]
+
+    for name in DEFAULT_DATASETS:
+        if name in h5_file:
+            return h5_file[name]
+
+    datasets = []
+    h5_file.visititems(lambda name, item: datasets.append(item)
+                       if isinstance(item, h5py.Dataset) and item.ndim >= 2 else None)
+    if not datasets:
+        raise RuntimeError(f'No frames in {h5_file.filename}')
+
+    return datasets[0]
+
+
+# ----------------------------------------------------------------------
+class NexusFrameReader(object):
+    """
+    Keeps the last file open, so following events for the same file do not reopen it
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, dataset=None):
+        """
+
+        :param dataset: str, path of frames dataset, None - found automatically
+        """
+        if not h5py_available:
+            raise RuntimeError('h5py is not installed, cannot read NeXus files')
+
+        self._dataset_name = dataset
+
+        self._file_name = None
+        self._file = None
+        self._dataset = None
+        self._swmr = False
+        self._last_index = -1
+
+    # ----------------------------------------------------------------------
+    def _open(self, file_name):
+        """
+        opens file in SWMR mode, if file was not written in SWMR mode - in normal mode
+
+        :param file_name: str
+        :return: None
+        """
+        self.close()
+
+        try:
+            self._file = h5py.File(file_name, 'r', libver='latest', swmr=True)
+            self._swmr = True
+        except (OSError, ValueError):
+            self._file = h5py.File(file_name, 'r')
+            self._swmr = False
+
+        self._file_name = file_name
+        self._dataset = find_frames_dataset(self._file, self._dataset_name)
+        self._last_index = -1
+
+        logger.debug(f'{file_name} opened{" (SWMR)" if self._swmr else ""}: {self._dataset.name} {self._dataset.shape}')
+
+    # ----------------------------------------------------------------------
+    def read_last(self, file_name, clip, only_new=True, buffers=None):
+        """
+        reads clip of the last frame in file
+
+        :param file_name: str
+        :param clip: (x0, y0, x1, y1)
+        :param only_new: bool, if True and there is no new frame since last call - None is returned
+        :param buffers: BufferPool, if given - frame is read directly to buffer from pool
+        :return: np.array or None if there is no (new) frame
+        """
+        if file_name != self._file_name:
+            self._open(file_name)
+        elif self._swmr:
+            self._dataset.refresh()
+
+        if self._dataset.ndim == 2:
+            index = 0
+            selection = ()
+        else:
+            index = self._dataset.shape[0] - 1
+            selection = (index,)
+
+        if index < 0 or (only_new and index == self._last_index):
+            return None
+
+        self._last_index = index
+
+        x0, y0, x1, y1 = clip
+        selection += (slice(x0, x1), slice(y0, y1))
+
+        if buffers is None:
+            return self._dataset[selection]
+
+        shape = tuple(len(range(*part.indices(size))) for part, size in zip(selection[-2:], self._dataset.shape[-2:]))
+        frame = buffers.get(shape, self._dataset.dtype)
+        if frame.size:
+            self._dataset.read_direct(frame, source_sel=np.s_[selection])
+
+        return frame
+
+    # ----------------------------------------------------------------------
+    def close(self):
+        """
+        closes cached file
+        :return: None
+        """
+        if self._file is not None:
+            try:
+                self._file.close()
+            except Exception as err:
+                logger.debug(f'Cannot close {self._file_name}: {err}')
+
+        self._file_name = None
+        self._file = None
+        self._dataset = None
@@ -0,0 +1,376 @@
+# ----------------------------------------------------------------------
+# Author:        yury.matveev@desy.de
+# ----------------------------------------------------------------------
+
+"""
+Numpy-only engine, which calculates statistics for all ROIs of frame in one pass,
+and integral image for O(1) rectangular sums
+"""
+
+import threading
+
+import numpy as np
+
+from petra_camera.utils.functions import FWHM
+
+ROI_FIELDS = ['max_x', 'max_y', 'max_v',
+              'min_x', 'min_y', 'min_v',
+              'com_x', 'com_y', 'com_v',
+              'fwhm_x', 'fwhm_y', 'sum']
+
+# building integral image costs several times more per pixel than summing pixels, so for statistics only
+# it is built, when ROIs cover their bounding box at least this many times
+INTEGRAL_GAIN = 4
+
+
+# ----------------------------------------------------------------------
+def empty_roi_data():
+    """
+
+    :return: dict with all ROI statistics fields set to None
+    """
+    return dict.fromkeys(ROI_FIELDS)
+
+
+# ----------------------------------------------------------------------
+def _to_python(value):
+    """
+    converts numpy scalar to python one, so the results can be sent as json
+    """
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+# ----------------------------------------------------------------------
+def _to_gray(frame, buffer):
+    """
+    color frames are reduced to mean of channels into reused float64 buffer
+
+    :param frame: 2d or 3d np.array
+    :param buffer: np.array or None, buffer from previous call
+    :return: (2d np.array, buffer)
+    """
+    if frame.ndim == 2:
+        return frame, buffer
+
+    if buffer is None or buffer.shape != frame.shape[:2]:
+        buffer = np.empty(frame.shape[:2], dtype=np.float64)
+
+    np.add.reduce(frame, axis=2, dtype=np.float64, out=buffer)
+    buffer /= frame.shape[2]
+
+    return buffer, buffer
+
+
+# ----------------------------------------------------------------------
+class RoiStatistics(object):
+    """
+    Calculates min/max with positions, sum, center of mass, FWHM and projections for all ROIs.
+    Geometry and sums of all ROIs are calculated at once. If integral image of frame is available
+    (or ROIs overlap so much, that it is cheaper to build it for their bounding box), sums and projections are
+    taken from it, so only extrema need pixels of ROI. The source frame is never modified.
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self):
+
+        self._indexes = {}  # cached pixel indexes per axis length
+        self._gray = None   # reused buffer for color frames
+
+        self._integral_image = IntegralImage()  # for bounding box of overlapping ROIs
+
+        self.projections = []  # last calculated (x, y) projections per ROI
+
+    # ----------------------------------------------------------------------
+    def _get_indexes(self, length):
+        if length not in self._indexes:
+            self._indexes[length] = np.arange(length, dtype=np.float64)
+
+        return self._indexes[length]
+
+    # ----------------------------------------------------------------------
+    def _get_table(self, frame, integral_image, x0, y0, x1, y1, active):
+        """
+
+        :return: (summed-area table or None, (x, y) - frame indexes of table origin)
+        """
+        if integral_image is not None:
+            table = integral_image.table
+            if table is not None and table.shape == (frame.shape[0] + 1, frame.shape[1] + 1):
+                return table, (0, 0)
+
+        if not active.any():
+            return None, (0, 0)
+
+        box_x0, box_y0 = x0[active].min(), y0[active].min()
+        box_x1, box_y1 = x1[active].max(), y1[active].max()
+
+        area = ((x1 - x0) * (y1 - y0))[active].sum()
+        if area < INTEGRAL_GAIN * (box_x1 - box_x0) * (box_y1 - box_y0):
+            return None, (0, 0)
+
+        self._integral_image.build(frame[box_x0:box_x1, box_y0:box_y1], (0, 0), 1)
+
+        return self._integral_image.table, (box_x0, box_y0)
+
+    # ----------------------------------------------------------------------
+    def calculate(self, frame, rois, clip, reduction, integral_image=None):
+        """
+
+        :param frame: 2d (or 3d for color) np.array, as displayed
+        :param rois: list of dicts with ROIs parameters (x, y, w, h, bg, visible)
+        :param clip: (x, y, w, h) - picture clip of frame
+        :param reduction: int, picture reduction of frame
+        :param integral_image: IntegralImage, built for the same frame, or None
+        :return: list with dict of statistics or None (for invisible or empty ROI) per ROI
+        """
+        results = []
+        self.projections = []
+
+        if frame is None:
+            return results
+
+        # ---------- once per frame ----------
+        frame, self._gray = _to_gray(frame, self._gray)
+
+        frame_w, frame_h = frame.shape[:2]
+        origin_x, origin_y = clip[0], clip[1]
+        reduction = max(int(reduction), 1)
+        integer_data = frame.dtype.kind in 'iub'
+
+        # ---------- geometry and sums of all ROIs ----------
+        rectangles = np.array([(roi['x'], roi['y'], roi['w'], roi['h']) for roi in rois],
+                              dtype=np.float64).reshape(-1, 4)
+
+        x0 = np.clip((rectangles[:, 0] - origin_x) // reduction, 0, frame_w).astype(np.int64)
+        y0 = np.clip((rectangles[:, 1] - origin_y) // reduction, 0, frame_h).astype(np.int64)
+        x1 = np.minimum(x0 + (rectangles[:, 2] // reduction).astype(np.int64), frame_w)
+        y1 = np.minimum(y0 + (rectangles[:, 3] // reduction).astype(np.int64), frame_h)
+
+        # thresholded ROIs cannot use integral image
+        active = np.array([roi['visible'] and not roi['bg'] for roi in rois], dtype=bool) & (x1 > x0) & (y1 > y0)
+
+        table, (table_x, table_y) = self._get_table(frame, integral_image, x0, y0, x1, y1, active)
+        if table is not None:
+            # table indexes, ROIs outside of table are not used
+            tx0 = np.clip(x0 - table_x, 0, table.shape[0] - 1)
+            ty0 = np.clip(y0 - table_y, 0, table.shape[1] - 1)
+            tx1 = np.clip(x1 - table_x, 0, table.shape[0] - 1)
+            ty1 = np.clip(y1 - table_y, 0, table.shape[1] - 1)
+            sums = table[tx1, ty1] - table[tx0, ty1] - table[tx1, ty0] + table[tx0, ty0]
+
+        # ---------- per ROI: O(w + h) from table, extrema from pixels ----------
+        for ind, roi in enumerate(rois):
+            block = frame[x0[ind]:x1[ind], y0[ind]:y1[ind]]
+            if not roi['visible'] or block.size == 0:
+                results.append(None)
+                self.projections.append(None)
+                continue
+
+            if table is not None and active[ind]:
+                projection_x = np.diff(table[tx0[ind]:tx1[ind] + 1, ty1[ind]] -
+                                       table[tx0[ind]:tx1[ind] + 1, ty0[ind]]).astype(np.float64)
+                projection_y = np.diff(table[tx1[ind], ty0[ind]:ty1[ind] + 1] -
+                                       table[tx0[ind], ty0[ind]:ty1[ind] + 1]).astype(np.float64)
+                roi_sum = sums[ind]
+            else:
+                if roi['bg']:
+                    # all low values are taken as 0, done on copy to keep the source frame intact
+                    block = np.where(block < roi['bg'], 0, block)
+
+                projection_x = block.sum(axis=1, dtype=np.float64)
+                projection_y = block.sum(axis=0, dtype=np.float64)
+                roi_sum = projection_x.sum()
+
+            self.projections.append((projection_x, projection_y))
+
+            max_idx = np.unravel_index(np.argmax(block), block.shape)
+            min_idx = np.unravel_index(np.argmin(block), block.shape)
+
+            if roi_sum != 0:
+                com_x = np.dot(projection_x, self._get_indexes(len(projection_x))) / roi_sum
+                com_y = np.dot(projection_y, self._get_indexes(len(projection_y))) / roi_sum
+                if not (np.isfinite(com_x) and np.isfinite(com_y)):
+                    com_x, com_y = 0, 0
+            else:
+                com_x, com_y = 0, 0
+
+            com_idx = (min(int(round(com_x)), block.shape[0] - 1), min(int(round(com_y)), block.shape[1] - 1))
+
+            def to_frame(local_x, local_y):
+                return (int(origin_x + (x0[ind] + local_x) * reduction),
+                        int(origin_y + (y0[ind] + local_y) * reduction))
+
+            data = {}
+            data['max_x'], data['max_y'] = to_frame(*max_idx)
+            data['max_v'] = _to_python(np.round(block[max_idx], 3))
+
+            data['min_x'], data['min_y'] = to_frame(*min_idx)
+            data['min_v'] = _to_python(np.round(block[min_idx], 3))
+
+            data['com_x'], data['com_y'] = to_frame(com_x, com_y)
+            data['com_v'] = _to_python(np.round(block[com_idx], 3))
+
+            data['fwhm_x'] = int(FWHM(projection_x) * reduction)
+            data['fwhm_y'] = int(FWHM(projection_y) * reduction)
+
+            data['sum'] = int(roi_sum) if integer_data else float(np.round(roi_sum, 3))
+
+            results.append(data)
+
+        return results
+
+
+# ----------------------------------------------------------------------
+class IntegralImage(object):
+    """
+    Summed-area table of frame: after one pass per frame, the sum of any rectangle is O(1).
+    Coordinates are given in the same (full frame) system as ROIs.
+
+    Table is built in analysis thread and can be read from others (GUI, ROI server). Tables are double-buffered:
+    the new table is built in spare buffer and swapped under lock, readers do lookups under the same lock,
+    so nobody reads a buffer while it is rebuilt.
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self):
+
+        self._lock = threading.Lock()
+
+        self._table = None
+        self._spare = None  # second buffer, so the table can be rebuilt while the current one is read
+        self._gray = None   # reused buffer for color frames
+
+        self._origin = (0, 0)
+        self._reduction = 1
+
+        self.sequence = None  # sequence number of frame, the table was built from
+
+    # ----------------------------------------------------------------------
+    def build(self, frame, clip, reduction, sequence=None):
+        """
+
+        :param frame: 2d (or 3d for color) np.array, as displayed
+        :param clip: (x, y, w, h) - picture clip of frame
+        :param reduction: int, picture reduction of frame
+        :param sequence: int, frame sequence number
+        :return: None
+        """
+        frame, self._gray = _to_gray(frame, self._gray)
+
+        dtype = np.int64 if frame.dtype.kind in 'iub' else np.float64
+        shape = (frame.shape[0] + 1, frame.shape[1] + 1)
+
+        # readers took spare buffer only before the last swap, under lock, so it is free
+        table = self._spare
+        if table is None or table.shape != shape or table.dtype != dtype:
+            table = np.zeros(shape, dtype=dtype)
+
+        # cumulative sum along rows, then rows are added one by one: much faster, than cumsum along axis 0
+        np.cumsum(frame, axis=1, dtype=dtype, out=table[1:, 1:])
+        for row in range(1, shape[0] - 1):
+            np.add(table[row], table[row + 1], out=table[row + 1])
+
+        with self._lock:
+            self._spare, self._table = self._table, table
+            self._origin = (clip[0], clip[1])
+            self._reduction = max(int(reduction), 1)
+            self.sequence = sequence
+
+    # ----------------------------------------------------------------------
+    @property
+    def table(self):
+        """
+        to be used only from thread, which builds table
+
+        :return: the last built summed-area table, (w + 1, h + 1), or None
+        """
+        return self._table
+
+    # ----------------------------------------------------------------------
+    def is_ready(self):
+        return self._table is not None
+
+    # ----------------------------------------------------------------------
+    def _to_indexes(self, x, y, w, h):
+        max_x, max_y = self._table.shape[0] - 1, self._table.shape[1] - 1
+
+        x0 = min(max(int((x - self._origin[0]) // self._reduction), 0), max_x)
+        y0 = min(max(int((y - self._origin[1]) // self._reduction), 0), max_y)
+        x1 = min(x0 + int(w // self._reduction), max_x)
+        y1 = min(y0 + int(h // self._reduction), max_y)
+
+        return x0, y0, x1, y1
+
+    # ----------------------------------------------------------------------
+    def _sum(self, x, y, w, h):
+        """
+        has to be called under lock
+
+        :return: (sum, number of pixels)
+        """
+        x0, y0, x1, y1 = self._to_indexes(x, y, w, h)
+        table = self._table
+
+        return table[x1, y1] - table[x0, y1] - table[x1, y0] + table[x0, y0], (x1 - x0) * (y1 - y0)
+
+    # ----------------------------------------------------------------------
+    def sum(self, x, y, w, h):
+        """
+
+        :param x, y, w, h: rectangle in frame coordinates
+        :return: sum of pixels in rectangle, None if table was not built yet
+        """
+        with self._lock:
+            if self._table is None:
+                return None
+
+            return _to_python(self._sum(x, y, w, h)[0])
+
+    # ----------------------------------------------------------------------
+    def area(self, x, y, w, h):
+        """
+
+        :return: number of frame pixels in rectangle
+        """
+        with self._lock:
+            if self._table is None:
+                return 0
+
+            return self._sum(x, y, w, h)[1]
+
+    # ----------------------------------------------------------------------
+    def background_sum(self, x, y, w, h, background):
+        """
+
+        :param background: constant pedestal per pixel to be subtracted
+        :return: sum of pixels in rectangle minus background * number of pixels
+        """
+        with self._lock:
+            if self._table is None:
+                return None
+
+            value, area = self._sum(x, y, w, h)
+            return _to_python(value - background * area)
+
+    # ----------------------------------------------------------------------
+    def band_sum(self, start, width, axis):
+        """
+
+        :param start: first row (axis=0) or column (axis=1) of band in frame coordinates
+        :param width: band width in frame coordinates
+        :param axis: 0 - band along x (columns of picture), 1 - band along y (rows of picture)
+        :return: sum of pixels in the full length band
+        """
+        with self._lock:
+            table = self._table
+            if table is None:
+                return None
+
+            if axis == 0:
+                x0, _, x1, _ = self._to_indexes(start, 0, width, 0)
+                return _to_python(table[x1, -1] - table[x0, -1])
+            else:
+                _, y0, _, y1 = self._to_indexes(0, start, 0, width)
+                return _to_python(table[-1, y1] - table[-1, y0])
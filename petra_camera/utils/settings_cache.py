@@ -0,0 +1,132 @@
+# ----------------------------------------------------------------------
+# Author:        yury.matveev@desy.de
+# ----------------------------------------------------------------------
+
+"""
+In-memory cache for camera settings with write-through and per source life time
+"""
+
+import threading
+import time
+
+from PyQt5 import QtCore
+
+from petra_camera.constants import APP_NAME
+
+_qsettings = None
+_qsettings_lock = threading.RLock()
+
+
+# ----------------------------------------------------------------------
+def shared_qsettings():
+    """
+    one QSettings handle for the whole application, access has to be done under qsettings_lock()
+
+    :return: QtCore.QSettings
+    """
+    global _qsettings
+    with _qsettings_lock:
+        if _qsettings is None:
+            _qsettings = QtCore.QSettings(APP_NAME)
+        return _qsettings
+
+
+# ----------------------------------------------------------------------
+def qsettings_lock():
+    return _qsettings_lock
+
+
+# ----------------------------------------------------------------------
+class SettingsCache(object):
+    """
+    Keeps raw values of settings. Values from Tango devices expire after source TTL, values from QSettings and
+    values, written through the cache, stay valid till they are overwritten.
+    """
+
+    # [s], None - value never expires
+    TTL = {'qsettings': None,
+           'device_proxy': 1.,
+           'settings_proxy': 1.,
+           'roi_server': 1.,
+           'tango_event': None}  # kept up to date by Tango change events
+
+    # ----------------------------------------------------------------------
+    def __init__(self, ttl=None):
+        """
+
+        :param ttl: dict, source: life time, overrides default TTL
+        """
+        self._ttl = dict(self.TTL)
+        if ttl is not None:
+            self._ttl.update(ttl)
+
+        self._lock = threading.Lock()
+        self._values = {}  # option: (value, expiration time or None)
+
+        self._hits = {}
+        self._misses = {}
+
+    # ----------------------------------------------------------------------
+    def get(self, option, source, loader):
+        """
+        returns cached value or loads it
+
+        :param option: str, setting name
+        :param source: str, setting source (qsettings, device_proxy, ...)
+        :param loader: callable, which returns actual value
+        :return: value
+        """
+        now = time.monotonic()
+        with self._lock:
+            if option in self._values:
+                value, expiration = self._values[option]
+                if expiration is None or expiration > now:
+                    self._hits[source] = self._hits.get(source, 0) + 1
+                    return value
+
+            self._misses[source] = self._misses.get(source, 0) + 1
+
+        value = loader()
+        self.put(option, value, source)
+
+        return value
+
+    # ----------------------------------------------------------------------
+    def put(self, option, value, source='qsettings'):
+        """
+        stores value (e.g. after it was written)
+
+        :param option: str, setting name
+        :param value: new value
+        :param source: str, setting source
+        :return: None
+        """
+        ttl = self._ttl.get(source)
+        with self._lock:
+            self._values[option] = (value, None if ttl is None else time.monotonic() + ttl)
+
+    # ----------------------------------------------------------------------
+    def invalidate(self, option=None):
+        """
+        drops cached value
+
+        :param option: str, setting name, None - all settings
+        :return: None
+        """
+        with self._lock:
+            if option is None:
+                self._values = {}
+            else:
+                self._values.pop(option, None)
+
+    # ----------------------------------------------------------------------
+    def get_statistics(self):
+        """
+
+        :return: dict with hits and misses per source
+        """
+        with self._lock:
+            return {'hits': sum(self._hits.values()),
+                    'misses': sum(self._misses.values()),
+                    'per_source': {source: {'hits': self._hits.get(source, 0), 'misses': self._misses.get(source, 0)}
+                                   for source in set(self._hits) | set(self._misses)}}
@@ -0,0 +1,181 @@
+# ----------------------------------------------------------------------
+# Author:        yury.matveev@desy.de
+# ----------------------------------------------------------------------
+
+"""
+Application-wide service, which reads cameras settings for settings widgets.
+Tango attributes of all requested cameras are grouped per device and read with one read_attributes call.
+"""
+
+import logging
+import threading
+
+from PyQt5 import QtCore
+
+from petra_camera.constants import APP_NAME
+logger = logging.getLogger(APP_NAME)
+
+
+# ----------------------------------------------------------------------
+def refresh_settings(camera_devices, options):
+    """
+    reads Tango attributes of settings for all cameras grouped per device (one read_attributes call per device)
+    and puts them to cameras settings caches
+
+    :param camera_devices: list of DataSource2D
+    :param options: list of settings names
+    :return: int, number of Tango calls
+    """
+    # device name: [proxy, list of attributes, list of (camera_device, source, option, attribute)]
+    devices = {}
+    for camera_device in camera_devices:
+        try:
+            for source, proxy, option, attribute in camera_device.get_tango_settings_map(options):
+                name = proxy.dev_name()
+                if name not in devices:
+                    devices[name] = [proxy, [], []]
+                if attribute not in devices[name][1]:
+                    devices[name][1].append(attribute)
+                devices[name][2].append((camera_device, source, option, attribute))
+        except Exception as err:
+            logger.debug(f'Cannot get settings map of {camera_device.device_name}: {err}')
+
+    for name, (proxy, attributes, consumers) in devices.items():
+        try:
+            values = {attribute: value for attribute, value in zip(attributes, proxy.read_attributes(attributes))}
+        except Exception as err:
+            logger.debug(f'Cannot read settings from {name}: {err}')
+            values = {}
+
+        for camera_device, source, option, attribute in consumers:
+            value = values.get(attribute)
+            if value is None or getattr(value, 'has_failed', False):
+                # will be read separately
+                camera_device.invalidate_settings(option)
+            else:
+                camera_device.update_settings_cache(option, value.value, source)
+
+    return len(devices)
+
+
+# ----------------------------------------------------------------------
+class SettingsPoller(QtCore.QThread):
+    """
+    Widgets request settings of their camera with request(), the poller collects requests, reads all of them
+    in one batch and emits settings_ready(camera_id, values) for each requested camera, if settings were changed
+    """
+
+    # settings, which are shown in settings widget
+    SETTINGS = (('exposure', float),
+                ('gain', int),
+                ('view_x', int),
+                ('view_y', int),
+                ('view_w', int),
+                ('view_h', int),
+                ('FPS', int),
+                ('FPSmax', int),
+                ('background', bool),
+                ('background_sigmas', float))
+
+    COLLECT_TIME = 100  # [ms], time to collect requests from several widgets to one batch
+
+    settings_ready = QtCore.pyqtSignal(object, dict)
+
+    # ----------------------------------------------------------------------
+    def __init__(self):
+        super(SettingsPoller, self).__init__()
+
+        self.setObjectName('settings_poller')
+
+        self._requests_lock = threading.Lock()
+        self._requests = {}  # camera_id: camera_device
+        self._forced = set()  # camera_ids, for which settings have to be sent even if they were not changed
+        self._last_values = {}  # camera_id: last sent values
+
+        self._new_request = threading.Event()
+        self._stop_request = threading.Event()
+
+        self.batches = 0      # statistics: number of batches and read_attributes calls
+        self.tango_calls = 0
+
+    # ----------------------------------------------------------------------
+    def request(self, camera_device, force=False):
+        """
+        asks to read settings of camera, results come with settings_ready signal
+
+        :param camera_device: DataSource2D
+        :param force: bool, if True - settings are sent even if they were not changed since last time
+        :return: None
+        """
+        with self._requests_lock:
+            self._requests[camera_device.camera_id] = camera_device
+            if force:
+                self._forced.add(camera_device.camera_id)
+        self._new_request.set()
+
+    # ----------------------------------------------------------------------
+    def cancel(self, camera_device):
+        """
+        removes pending request (e.g. when camera is closed)
+
+        :param camera_device: DataSource2D
+        :return: None
+        """
+        with self._requests_lock:
+            if self._requests.get(camera_device.camera_id) is camera_device:
+                del self._requests[camera_device.camera_id]
+            self._forced.discard(camera_device.camera_id)
+            self._last_values.pop(camera_device.camera_id, None)
+
+    # ----------------------------------------------------------------------
+    def stop(self):
+        self._stop_request.set()
+        self._new_request.set()
+        self.wait()
+
+    # ----------------------------------------------------------------------
+    def run(self):
+        while not self._stop_request.is_set():
+            self._new_request.wait()
+            if self._stop_request.is_set():
+                break
+
+            # let other widgets to add their requests to the same batch
+            QtCore.QThread.msleep(self.COLLECT_TIME)
+
+            with self._requests_lock:
+                requests, forced = self._requests, self._forced
+                self._requests, self._forced = {}, set()
+                self._new_request.clear()
+
+            if requests:
+                self._read_batch(list(requests.values()), forced)
+
+    # ----------------------------------------------------------------------
+    def _read_batch(self, camera_devices, forced=()):
+        """
+        reads Tango attributes of all cameras in batch, then collects settings (now from cache)
+        and sends them to widgets
+
+        :param camera_devices: list of DataSource2D
+        :param forced: ids of cameras, which settings have to be sent anyway
+        :return: None
+        """
+        self.batches += 1
+        self.tango_calls += refresh_settings(camera_devices, [option for option, _ in self.SETTINGS])
+
+        for camera_device in camera_devices:
+            try:
+                values = {option: camera_device.get_settings(option, cast) for option, cast in self.SETTINGS}
+                values['motor_position'] = camera_device.motor_position()
+                values['reduce'] = camera_device.get_reduction()
+            except Exception as err:
+                logger.error(f'Settings poller: cannot read settings of {camera_device.device_name}: {err}')
+                continue
+
+            with self._requests_lock:
+                if camera_device.camera_id not in forced and self._last_values.get(camera_device.camera_id) == values:
+                    continue
+                self._last_values[camera_device.camera_id] = values
+
+            self.settings_ready.emit(camera_device.camera_id, dict(values))
@@ -0,0 +1,284 @@
+# ----------------------------------------------------------------------
+# Author:        yury.matveev@desy.de
+# ----------------------------------------------------------------------
+
+"""
+Ring buffer of frames in shared memory, for processes on the same host.
+
+Layout of shared memory block:
+
+    ring header (HEADER_SIZE bytes): magic, version, number of slots, slot data size, sequence of last written frame
+    slots: slot header (HEADER_SIZE bytes) + frame data (slot data size, aligned to HEADER_SIZE)
+
+Slot header: lock, frame sequence, event time, ndim, shape (3 values, unused are 0), dtype (numpy dtype.str),
+clip (x, y, w, h), reduction, data size.
+
+Each slot is protected by seqlock: writer makes lock odd, writes header and data and makes lock even again.
+Reader reads lock, data and lock again, data are valid if both locks are equal and even.
+So writer never waits for readers, readers retry, if they were too slow. Frames can be used without copy
+(SharedFrameReader.get_view) for as long as the slot was not reused, i.e. for (slots - 1) frame periods.
+
+Reader example:
+
+    reader = SharedFrameReader('petra_camera_0')
+    frame, header = reader.get_latest()
+"""
+
+import struct
+import logging
+
+import numpy as np
+
+try:
+    from multiprocessing import shared_memory
+    shared_memory_available = True
+except ImportError:
+    shared_memory_available = False
+
+from petra_camera.constants import APP_NAME
+logger = logging.getLogger(APP_NAME)
+
+MAGIC = b'PCSR'
+VERSION = 1
+
+HEADER_SIZE = 128  # ring and slot headers, also data alignment
+
+# magic, version, slots, slot data size, last sequence
+RING_HEADER = struct.Struct('<4sIIQq')
+LAST_SEQUENCE_OFFSET = 4 + 4 + 4 + 8
+
+# lock, sequence, event_time, ndim, shape[3], dtype, clip[4], reduction, data size
+SLOT_HEADER = struct.Struct('<QqdI3I8s4iIQ')
+
+
+# ----------------------------------------------------------------------
+def _data_size(slot_bytes):
+    return (slot_bytes + HEADER_SIZE - 1) // HEADER_SIZE * HEADER_SIZE
+
+
+# ----------------------------------------------------------------------
+class SharedFrameRing(object):
+    """
+    Writer side, owns shared memory block
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, name, slots, slot_bytes):
+        """
+
+        :param name: str, name of shared memory block
+        :param slots: int, number of frames in ring
+        :param slot_bytes: int, max frame size in bytes
+        """
+        if not shared_memory_available:
+            raise RuntimeError('multiprocessing.shared_memory is not available')
+
+        self.name = name
+        self.slots = max(int(slots), 2)
+        self.slot_bytes = _data_size(int(slot_bytes))
+
+        self._slot_size = HEADER_SIZE + self.slot_bytes
+
+        try:
+            self._shm = shared_memory.SharedMemory(name, create=True, size=HEADER_SIZE + self.slots * self._slot_size)
+        except FileExistsError:
+            # left from crashed viewer
+            old = shared_memory.SharedMemory(name)
+            old.close()
+            old.unlink()
+            self._shm = shared_memory.SharedMemory(name, create=True, size=HEADER_SIZE + self.slots * self._slot_size)
+
+        self._buffer = self._shm.buf
+
+        self._locks = [np.ndarray((1,), dtype=np.uint64, buffer=self._buffer, offset=self._slot_offset(slot))
+                       for slot in range(self.slots)]
+        for lock in self._locks:
+            lock[0] = 0
+
+        self._count = 0
+
+        RING_HEADER.pack_into(self._buffer, 0, MAGIC, VERSION, self.slots, self.slot_bytes, -1)
+
+        logger.info(f'Shared frame ring {name}: {self.slots} slots x {self.slot_bytes / 2 ** 20:.1f} MB')
+
+    # ----------------------------------------------------------------------
+    def _slot_offset(self, slot):
+        return HEADER_SIZE + slot * self._slot_size
+
+    # ----------------------------------------------------------------------
+    def publish(self, frame, info):
+        """
+        copies frame to next slot
+
+        :param frame: np.array
+        :param info: FrameInfo
+        :return: bool, False if frame does not fit to slot
+        """
+        if frame.nbytes > self.slot_bytes or frame.ndim > 3:
+            return False
+
+        slot = self._count % self.slots
+        self._count += 1
+
+        offset = self._slot_offset(slot)
+        lock = self._locks[slot]
+
+        lock[0] += 1  # odd: slot is being written
+
+        shape = list(frame.shape) + [0] * (3 - frame.ndim)
+        clip = [int(value) for value in info.clip]
+        SLOT_HEADER.pack_into(self._buffer, offset, int(lock[0]), info.sequence, info.event_time or 0., frame.ndim,
+                              *shape, frame.dtype.str.encode(), *clip, info.reduction, frame.nbytes)
+
+        target = np.ndarray(frame.shape, dtype=frame.dtype, buffer=self._buffer, offset=offset + HEADER_SIZE)
+        np.copyto(target, frame)
+
+        lock[0] += 1  # even: slot is consistent
+
+        struct.pack_into('<q', self._buffer, LAST_SEQUENCE_OFFSET, self._count - 1)
+
+        return True
+
+    # ----------------------------------------------------------------------
+    def close(self):
+        """
+        releases and removes shared memory block
+        :return: None
+        """
+        self._locks = []
+        self._buffer = None
+        try:
+            self._shm.close()
+            self._shm.unlink()
+        except Exception as err:
+            logger.debug(f'Cannot remove shared memory {self.name}: {err}')
+
+
+# ----------------------------------------------------------------------
+class SharedFrameReader(object):
+    """
+    Client side, attaches to ring, created by viewer
+    """
+
+    MAX_ATTEMPTS = 10
+
+    # ----------------------------------------------------------------------
+    def __init__(self, name):
+        """
+
+        :param name: str, name of shared memory block (shared_memory_name of camera, by default petra_camera_<id>)
+        """
+        if not shared_memory_available:
+            raise RuntimeError('multiprocessing.shared_memory is not available')
+
+        try:
+            self._shm = shared_memory.SharedMemory(name, track=False)
+        except TypeError:
+            # python < 3.13: block is registered in resource tracker and would be removed on reader exit
+            self._shm = shared_memory.SharedMemory(name)
+            try:
+                from multiprocessing import resource_tracker
+                resource_tracker.unregister(self._shm._name, 'shared_memory')
+            except Exception:
+                pass
+
+        self._buffer = self._shm.buf
+
+        magic, version, self.slots, self.slot_bytes, _ = RING_HEADER.unpack_from(self._buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            self._shm.close()
+            raise RuntimeError(f'{name} is not a frame ring')
+
+        self._slot_size = HEADER_SIZE + self.slot_bytes
+
+        self._locks = [np.ndarray((1,), dtype=np.uint64, buffer=self._buffer, offset=self._slot_offset(slot))
+                       for slot in range(self.slots)]
+
+    # ----------------------------------------------------------------------
+    def _slot_offset(self, slot):
+        return HEADER_SIZE + slot * self._slot_size
+
+    # ----------------------------------------------------------------------
+    def last_index(self):
+        """
+
+        :return: int, number of last written frame in ring (not camera sequence), -1 if there were no frames
+        """
+        return struct.unpack_from('<q', self._buffer, LAST_SEQUENCE_OFFSET)[0]
+
+    # ----------------------------------------------------------------------
+    def get_view(self, index=None):
+        """
+        frame without copy, has to be checked with is_valid after use
+
+        :param index: int, number of frame in ring, None - last one
+        :return: (np.array, header dict, token) or (None, None, None) if frame is not available.
+                 header: sequence, event_time, clip, reduction
+        """
+        if index is None:
+            index = self.last_index()
+        if index < 0:
+            return None, None, None
+
+        slot = index % self.slots
+        offset = self._slot_offset(slot)
+
+        lock = int(self._locks[slot][0])
+        if lock % 2:
+            return None, None, None
+
+        _, sequence, event_time, ndim, x, y, z, dtype, cx, cy, cw, ch, reduction, _ = \
+            SLOT_HEADER.unpack_from(self._buffer, offset)
+
+        try:
+            shape = (x, y, z)[:ndim]
+            frame = np.ndarray(shape, dtype=np.dtype(dtype.rstrip(b'\0').decode()), buffer=self._buffer,
+                               offset=offset + HEADER_SIZE)
+        except (TypeError, ValueError):
+            # header was being rewritten
+            return None, None, None
+        frame.flags.writeable = False
+
+        header = {'sequence': sequence, 'event_time': event_time, 'clip': (cx, cy, cw, ch), 'reduction': reduction}
+
+        return frame, header, (slot, lock)
+
+    # ----------------------------------------------------------------------
+    def is_valid(self, token):
+        """
+
+        :param token: from get_view
+        :return: bool, True if slot was not overwritten since get_view
+        """
+        slot, lock = token
+        return int(self._locks[slot][0]) == lock
+
+    # ----------------------------------------------------------------------
+    def get_latest(self):
+        """
+        copy of the last frame
+
+        :return: (np.array, header dict) or (None, None)
+        """
+        for _ in range(self.MAX_ATTEMPTS):
+            frame, header, token = self.get_view()
+            if frame is None:
+                if self.last_index() < 0:
+                    return None, None
+                continue
+
+            frame = frame.copy()
+            if self.is_valid(token):
+                return frame, header
+
+        return None, None
+
+    # ----------------------------------------------------------------------
+    def close(self):
+        """
+        detaches from ring, all views from get_view have to be released before
+        :return: None
+        """
+        self._locks = []
+        self._buffer = None
+        self._shm.close()
@@ -0,0 +1,194 @@
+# ----------------------------------------------------------------------
+# Author:        yury.matveev@desy.de
+# ----------------------------------------------------------------------
+
+"""
+Per camera pipeline telemetry: latency histograms per stage and frame drop counters per hand-off
+"""
+
+import bisect
+import threading
+
+
+# ----------------------------------------------------------------------
+class LatencyHistogram(object):
+    """
+    Histogram with fixed, roughly logarithmic, bins. Adding a value is O(log(bins)) and does not allocate,
+    so it can be called for every frame.
+    """
+
+    BINS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)  # [ms], upper edges, the last bin is open
+
+    # ----------------------------------------------------------------------
+    def __init__(self):
+
+        self.reset()
+
+    # ----------------------------------------------------------------------
+    def reset(self):
+        self.counts = [0] * (len(self.BINS) + 1)
+        self.count = 0
+        self.total = 0.
+        self.max = 0.
+        self.last = None
+
+    # ----------------------------------------------------------------------
+    def add(self, value):
+        """
+
+        :param value: float, latency in ms
+        :return: None
+        """
+        self.counts[bisect.bisect_left(self.BINS, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.last = value
+
+    # ----------------------------------------------------------------------
+    def percentile(self, value):
+        """
+
+        :param value: float, percentile 0-100
+        :return: float, upper edge of bin, where the percentile is (but not more than max value), in ms;
+                 None if there is no data
+        """
+        if not self.count:
+            return None
+
+        limit = self.count * value / 100.
+        accumulated = 0
+        for ind, counts in enumerate(self.counts):
+            accumulated += counts
+            if accumulated >= limit:
+                return min(self.BINS[ind], self.max) if ind < len(self.BINS) else self.max
+
+        return self.max
+
+    # ----------------------------------------------------------------------
+    def get_summary(self):
+        """
+
+        :return: dict with count, mean, median, 95 percentile, max and last values in ms
+        """
+        return {'count': self.count,
+                'mean': self.total / self.count if self.count else None,
+                'p50': self.percentile(50),
+                'p95': self.percentile(95),
+                'max': self.max if self.count else None,
+                'last': self.last,
+                'histogram': list(zip(list(self.BINS) + [None], self.counts))}
+
+
+# ----------------------------------------------------------------------
+class PipelineTelemetry(object):
+    """
+    Collects FrameInfo timestamps at the pipeline stages:
+
+    event -> receive:     Tango event (camera time stamp) till camera proxy got the frame
+    receive -> process:   camera proxy till DataSource2D took the frame
+    process -> analysis:  DataSource2D till ROIs statistics and peak search were done
+    process -> display:   DataSource2D till frame was painted
+    receive -> display:   total
+
+    Drops are counted at each hand-off: frames, overwritten in camera proxy before DataSource2D took them,
+    frames, overwritten before analysis worker took them, and processed frames, which were never painted.
+    """
+
+    STAGES = (('transport', 'event_time', 'receive_time'),
+              ('process', 'receive_time', 'process_time'),
+              ('analysis', 'process_time', None),
+              ('display', 'process_time', 'display_time'),
+              ('total', 'receive_time', 'display_time'))
+
+    # ----------------------------------------------------------------------
+    def __init__(self):
+
+        self._lock = threading.Lock()
+
+        self._histograms = {name: LatencyHistogram() for name, _, _ in self.STAGES}
+
+        self.processed = 0
+        self.analysed = 0
+        self.displayed = 0
+        self._last_displayed = None
+
+    # ----------------------------------------------------------------------
+    def reset(self):
+        """
+        drops all statistics (e.g. at acquisition start)
+        :return: None
+        """
+        with self._lock:
+            for histogram in self._histograms.values():
+                histogram.reset()
+
+            self.processed = 0
+            self.analysed = 0
+            self.displayed = 0
+            self._last_displayed = None
+
+    # ----------------------------------------------------------------------
+    def _add(self, name, start, end):
+        if start is not None and end is not None:
+            self._histograms[name].add((end - start) * 1000)
+
+    # ----------------------------------------------------------------------
+    def frame_processed(self, info):
+        """
+        called by DataSource2D, when frame was taken from camera proxy
+
+        :param info: FrameInfo
+        :return: None
+        """
+        with self._lock:
+            self.processed += 1
+            self._add('transport', info.event_time, info.receive_time)
+            self._add('process', info.receive_time, info.process_time)
+
+    # ----------------------------------------------------------------------
+    def frame_analysed(self, info, analysis_time):
+        """
+        called by analysis worker, when ROIs statistics and peak search were done
+
+        :param info: FrameInfo
+        :param analysis_time: float, time.time() when analysis finished
+        :return: None
+        """
+        with self._lock:
+            self.analysed += 1
+            self._add('analysis', info.process_time, analysis_time)
+
+    # ----------------------------------------------------------------------
+    def frame_displayed(self, info):
+        """
+        called by frame viewer, when frame was painted. Repaints of the same frame are ignored
+
+        :param info: FrameInfo
+        :return: None
+        """
+        with self._lock:
+            if info.sequence == self._last_displayed:
+                return
+
+            self._last_displayed = info.sequence
+            self.displayed += 1
+            self._add('display', info.process_time, info.display_time)
+            self._add('total', info.receive_time, info.display_time)
+
+    # ----------------------------------------------------------------------
+    def get_summary(self, acquisition_dropped=0, analysis_dropped=0):
+        """
+
+        :param acquisition_dropped: int, frames, overwritten in camera proxy
+        :param analysis_dropped: int, frames, overwritten before analysis
+        :return: dict with latencies per stage and drop counters per hand-off
+        """
+        with self._lock:
+            return {'latency': {name: histogram.get_summary() for name, histogram in self._histograms.items()},
+                    'frames': {'processed': self.processed,
+                               'analysed': self.analysed,
+                               'displayed': self.displayed},
+                    'dropped': {'acquisition': acquisition_dropped,
+                                'analysis': analysis_dropped,
+                                'display': max(self.processed - self.displayed - 1, 0)}}
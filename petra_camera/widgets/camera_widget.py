@@ -34,7 +34,7 @@ logger = logging.getLogger(APP_NAME)
 # ----------------------------------------------------------------------
 class CameraWidget(QtWidgets.QMainWindow):
 
-    REFRESH_TANGO_SETTINGS_PERIOD = 5000 # how often we update settings with Tango
+    REFRESH_TANGO_SETTINGS_PERIOD = 5000 # how often we poll settings, which are not updated by Tango events
     REFRESH_ICONS_PERIOD = 500 # how often we update settings with Tango
 
     # ----------------------------------------------------------------------
@@ -44,6 +44,7 @@ class CameraWidget(QtWidgets.QMainWindow):
         super(CameraWidget, self).__init__(parent)
 
         self.settings = parent.settings
+        self.settings_poller = parent.settings_poller
 
         self.my_dock = dock
 
@@ -91,6 +92,7 @@ class CameraWidget(QtWidgets.QMainWindow):
         self._settings_widget.close()
         if self._position_control_widget is not None:
             self._position_control_widget.close()
+        self._frame_viewer.close()
 
         self._frame_viewer.save_ui_settings(self.camera_id)
         self._settings_widget.save_ui_settings(self.camera_id)
@@ -118,9 +120,15 @@ class CameraWidget(QtWidgets.QMainWindow):
             else:
                 self._action_start_stop.setIcon(QtGui.QIcon(":/ico/play_16px.png"))
                 self._action_start_stop.setEnabled(True)
+
+            achieved, requested = self.camera_device.get_frame_rate()
+            self._lb_acq_rate.setText(f"Acq: {achieved:.1f}/{requested:.0f} FPS")
         except Exception as err:
             logger.exception(f"Exception: camera state: {err}")
 
+        self._display_telemetry(self.camera_device.get_telemetry())
+        self._display_recording(self.camera_device.get_recording_statistics())
+
         try:
             position = self.camera_device.motor_position()
 
@@ -160,6 +168,84 @@ class CameraWidget(QtWidgets.QMainWindow):
         """
         self._lb_fps.setText("{:.2f} FPS".format(fps))
 
+    # ----------------------------------------------------------------------
+    def _display_telemetry(self, telemetry):
+        """
+
+        :param telemetry: dict from DataSource2D.get_telemetry
+        :return: None
+        """
+        total = telemetry['latency']['total']
+        dropped = telemetry['dropped']
+
+        if total['count']:
+            self._lb_latency.setText(f"Lat: {total['p50']:.0f}/{total['p95']:.0f} ms")
+        else:
+            self._lb_latency.setText("Lat: -")
+
+        self._lb_dropped.setText(f"Drop: {dropped['acquisition']}/{dropped['analysis']}/{dropped['display']}")
+
+        tooltip = ['Latency, ms (mean / p50 / p95 / max):']
+        for stage, values in telemetry['latency'].items():
+            if values['count']:
+                tooltip.append(f"{stage}: {values['mean']:.1f} / {values['p50']:.1f} / "
+                               f"{values['p95']:.1f} / {values['max']:.1f}")
+            else:
+                tooltip.append(f"{stage}: -")
+
+        self._lb_latency.setToolTip('\n'.join(tooltip))
+
+    # ----------------------------------------------------------------------
+    def _start_stop_recording(self, start):
+        """
+
+        :param start: bool, record action state
+        :return: None
+        """
+        if start:
+            if not self._frame_viewer.start_recording():
+                self._record_action.setChecked(False)
+        else:
+            self._recording_finished(self.camera_device.stop_recording())
+
+    # ----------------------------------------------------------------------
+    def _recording_finished(self, statistics):
+        """
+
+        :param statistics: dict from DataSource2D.stop_recording
+        :return: None
+        """
+        self._record_action.setChecked(False)
+        self._lb_recording.setVisible(False)
+
+        if statistics is None:
+            return
+
+        self.statusBar().showMessage(f"Recording finished: {statistics['frames']} frames, "
+                                     f"{statistics['mb_per_s']:.1f} MB/s, {statistics['dropped']} dropped", 10000)
+        if statistics['error'] is not None:
+            report_error(statistics['error'], self, True)
+
+    # ----------------------------------------------------------------------
+    def _display_recording(self, statistics):
+        """
+
+        :param statistics: dict from DataSource2D.get_recording_statistics or None
+        :return: None
+        """
+        if statistics is None:
+            self._lb_recording.setVisible(False)
+            return
+
+        if not statistics['recording'] and not statistics['queued']:
+            # max frames reached or writer error
+            self._recording_finished(self.camera_device.stop_recording())
+            return
+
+        self._lb_recording.setText(f"Rec: {statistics['frames']} fr, {statistics['mb_per_s']:.0f} MB/s, "
+                                   f"drop {statistics['dropped']}")
+        self._lb_recording.setVisible(True)
+
     # ----------------------------------------------------------------------
     def _viewer_cursor_moved(self, x, y):
         """
@@ -224,8 +310,27 @@ class CameraWidget(QtWidgets.QMainWindow):
         self._lb_fps = QtWidgets.QLabel("FPS: -")
         self._lb_fps.setMinimumWidth(70)
 
+        self._lb_acq_rate = QtWidgets.QLabel("Acq: -")
+        self._lb_acq_rate.setMinimumWidth(100)
+        self._lb_acq_rate.setToolTip("Achieved/requested acquisition rate")
+
+        self._lb_latency = QtWidgets.QLabel("Lat: -")
+        self._lb_latency.setMinimumWidth(90)
+
+        self._lb_dropped = QtWidgets.QLabel("Drop: -")
+        self._lb_dropped.setMinimumWidth(90)
+        self._lb_dropped.setToolTip("Dropped frames: acquisition/analysis/display")
+
         self.statusBar().addPermanentWidget(self._lb_cursor_pos)
         self.statusBar().addPermanentWidget(self._lb_fps)
+        self.statusBar().addPermanentWidget(self._lb_acq_rate)
+        self.statusBar().addPermanentWidget(self._lb_latency)
+        self.statusBar().addPermanentWidget(self._lb_dropped)
+
+        self._lb_recording = QtWidgets.QLabel("")
+        self._lb_recording.setToolTip("Recording: written frames, write rate, frames dropped by recorder")
+        self._lb_recording.setVisible(False)
+        self.statusBar().addPermanentWidget(self._lb_recording)
 
         self.setCentralWidget(None)
 
@@ -309,6 +414,7 @@ class CameraWidget(QtWidgets.QMainWindow):
         self._save_img_action.triggered.connect(self._frame_viewer.save_to_image)
         self._save_ascii_action.triggered.connect(partial(self._frame_viewer.save_to_file, fmt="csv"))
         self._save_numpy_action.triggered.connect(partial(self._frame_viewer.save_to_file, fmt="npy"))
+        self._record_action.triggered.connect(self._start_stop_recording)
 
         self._move_motor_action.triggered.connect(lambda: self.camera_device.move_motor())
 
@@ -366,6 +472,11 @@ class CameraWidget(QtWidgets.QMainWindow):
 
         self._save_numpy_action = saveMenu.addAction("Numpy")
 
+        saveMenu.addSeparator()
+
+        self._record_action = saveMenu.addAction("Record...")
+        self._record_action.setCheckable(True)
+
         return saveMenu
 
     # ----------------------------------------------------------------------
@@ -19,6 +19,7 @@ from datetime import datetime
 from PyQt5 import QtCore, QtWidgets, QtGui, QtPrintSupport
 
 from petra_camera.utils.functions import get_save_path
+from petra_camera.utils.errors import report_error
 from petra_camera.widgets.base_widget import BaseWidget
 from petra_camera.gui.FrameViewer_ui import Ui_FrameViewer
 from petra_camera.utils.gui_elements import ImageMarker, PeakMarker, LineSegmentItem
@@ -33,6 +34,8 @@ DATETIME = "%Y-%m-%d %H:%M:%S"
 LABEL_BRUSH = (30, 144, 255, 170)
 LABEL_COLOR = (255, 255, 255)
 
+HISTORY_SECONDS = 5.  # default length of history to be saved
+
 
 # ----------------------------------------------------------------------
 class FrameViewer(BaseWidget):
@@ -55,6 +58,7 @@ class FrameViewer(BaseWidget):
         # ----------------------------------------------------------------------
 
         self._last_frame = None # stores last read frame
+        self._last_frame_info = None # FrameInfo of last shown frame
         self._last_msg = ''
 
         self._acq_started = time.time()
@@ -68,6 +72,10 @@ class FrameViewer(BaseWidget):
 
         self._hist = None
 
+        self._history_index = None  # index of shown frame from history, None - live frames are shown
+        self._history_bar = None
+        self._history_seconds = HISTORY_SECONDS
+
         # ----------------------------------------------------------------------
         #                UI setup
         # ----------------------------------------------------------------------
@@ -124,6 +132,18 @@ class FrameViewer(BaseWidget):
         self._peak_markers = PeakMarker()
         self._ui.image_view.view.addItem(self._peak_markers, ignoreBounds=True)
 
+        # ----------------------------------------------------------------------
+        #               Frame history functionality
+        # ----------------------------------------------------------------------
+
+        self._action_save_history = QtWidgets.QAction('Save last seconds...', self)
+        self._action_save_history.triggered.connect(lambda checked: self.save_history())
+
+        if self._camera_device.history is not None:
+            self._context_menu.addSeparator()
+            self._context_menu.addAction(self._action_save_history)
+            self._make_history_bar()
+
         # ----------------------------------------------------------------------
         #                        Ui signals
         # ----------------------------------------------------------------------
@@ -270,53 +290,22 @@ class FrameViewer(BaseWidget):
         slot for new frame signal from camera
         :return:
         """
+        if self._history_index is not None:
+            # user looks at frame from history, live frames are not shown
+            return
+
         if hasattr(self, "_load_label"):
             self._load_label.setVisible(True)
 
         try:
-            self._last_frame = self._camera_device.get_frame()
+            frame, info = self._camera_device.get_frame(with_info=True)
             self._last_msg = self._camera_device.get_msg()
 
-            picture_size = self._camera_device.get_picture_clip()
-            reduction = self._camera_device.get_reduction()
-
-            # preparing kwargs for image set or update
-            set_kwargs = {'pos': (picture_size[0], picture_size[1]),
-                          'scale': (reduction, reduction)}
-
-            if self._camera_device.levels['auto_levels']:
-                set_kwargs['autoRange'] = True
-                update_kwargs = {'autoLevels': True}
-            else:
-                set_kwargs['levels'] = (self._camera_device.levels['levels'][0], self._camera_device.levels['levels'][1])
-                update_kwargs = {'levels': (self._camera_device.levels['levels'][0], self._camera_device.levels['levels'][1])}
-
-            # we have to disconnect histogram
-            with QtCore.QMutexLocker(self._parent.hist_lock):
-                with self._parent.block_hist_signals():
-
-                    if self._set_new_image or self._camera_device.set_new_image:
-                        self._ui.image_view.setImage(self._last_frame, **set_kwargs)
-                        self._ui.image_view.imageItem.setToolTip(self._last_msg)
-                        self._set_new_image = False
-                        self._camera_device.set_new_image = False
-                        try:
-                            self._ui.image_view.autoRange()
-                        except:
-                            pass
-                    else:
-                        self._ui.image_view.imageItem.updateImage(self._last_frame, **update_kwargs)
-                        self._camera_device.image_need_repaint = False
-
-            if self._camera_device.levels['auto_levels']:
-                self._camera_device.levels['levels'] = self._hist.getLevels()
-
-            self._redraw_projections()
+            self._display_frame(frame, info)
 
-            self._peak_markers.new_scale(self._view_rect.width(), self._view_rect.height())
-            self._center_search_item.new_scale(self._view_rect.width(), self._view_rect.height())
-
-            self._show_labels()
+            if info is not None:
+                self._last_frame_info = info.replace(display_time=time.time())
+                self._camera_device.frame_displayed(self._last_frame_info)
 
             # FPS counter
             self._fps_counter += 1
@@ -331,6 +320,208 @@ class FrameViewer(BaseWidget):
         if hasattr(self, "_load_label"):
             self._load_label.setVisible(False)
 
+        if self._history_bar is not None:
+            self._refresh_history_bar()
+
+    # ----------------------------------------------------------------------
+    def _display_frame(self, frame, info):
+        """
+        shows frame
+
+        :param frame: 2d np.array
+        :param info: FrameInfo or None
+        :return: None
+        """
+        self._last_frame = frame
+
+        # geometry is taken from the frame itself, camera settings can be already changed
+        if info is not None:
+            picture_size, reduction = info.clip, info.reduction
+        else:
+            picture_size = self._camera_device.get_picture_clip()
+            reduction = self._camera_device.get_reduction()
+
+        # preparing kwargs for image set or update
+        set_kwargs = {'pos': (picture_size[0], picture_size[1]),
+                      'scale': (reduction, reduction)}
+
+        if self._camera_device.levels['auto_levels']:
+            set_kwargs['autoRange'] = True
+            update_kwargs = {'autoLevels': True}
+        else:
+            set_kwargs['levels'] = (self._camera_device.levels['levels'][0], self._camera_device.levels['levels'][1])
+            update_kwargs = {'levels': (self._camera_device.levels['levels'][0], self._camera_device.levels['levels'][1])}
+
+        # we have to disconnect histogram
+        with QtCore.QMutexLocker(self._parent.hist_lock):
+            with self._parent.block_hist_signals():
+
+                if self._set_new_image or self._camera_device.set_new_image:
+                    self._ui.image_view.setImage(self._last_frame, **set_kwargs)
+                    self._ui.image_view.imageItem.setToolTip(self._last_msg)
+                    self._set_new_image = False
+                    self._camera_device.set_new_image = False
+                    try:
+                        self._ui.image_view.autoRange()
+                    except:
+                        pass
+                else:
+                    self._ui.image_view.imageItem.updateImage(self._last_frame, **update_kwargs)
+                    self._camera_device.image_need_repaint = False
+
+        if self._camera_device.levels['auto_levels']:
+            self._camera_device.levels['levels'] = self._hist.getLevels()
+
+        self._redraw_projections()
+
+        self._peak_markers.new_scale(self._view_rect.width(), self._view_rect.height())
+        self._center_search_item.new_scale(self._view_rect.width(), self._view_rect.height())
+
+        self._show_labels()
+
+    # ----------------------------------------------------------------------
+    #                  Frame history functionality
+    # ----------------------------------------------------------------------
+    def _make_history_bar(self):
+        """
+        adds scrubber for frame history under the image
+        :return: None
+        """
+        self._history_bar = QtWidgets.QWidget(self)
+        layout = QtWidgets.QHBoxLayout(self._history_bar)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        self._bt_history_live = QtWidgets.QToolButton(self._history_bar)
+        self._bt_history_live.setText('Live')
+        self._bt_history_live.setEnabled(False)
+        self._bt_history_live.clicked.connect(self._history_to_live)
+        layout.addWidget(self._bt_history_live)
+
+        self._sl_history = QtWidgets.QSlider(QtCore.Qt.Horizontal, self._history_bar)
+        self._sl_history.setRange(0, 0)
+        self._sl_history.valueChanged.connect(self._history_scrolled)
+        layout.addWidget(self._sl_history)
+
+        self._lb_history = QtWidgets.QLabel('Live', self._history_bar)
+        self._lb_history.setMinimumWidth(150)
+        layout.addWidget(self._lb_history)
+
+        bt_save = QtWidgets.QToolButton(self._history_bar)
+        bt_save.setDefaultAction(self._action_save_history)
+        layout.addWidget(bt_save)
+
+        self._ui.horizontalLayout.removeWidget(self._ui.splitter_x)
+        main_layout = QtWidgets.QVBoxLayout()
+        main_layout.addWidget(self._ui.splitter_x)
+        main_layout.addWidget(self._history_bar)
+        self._ui.horizontalLayout.addLayout(main_layout)
+
+    # ----------------------------------------------------------------------
+    def _refresh_history_bar(self):
+        """
+        moves scrubber to the newest frame
+        :return: None
+        """
+        frames = len(self._camera_device.history)
+        self._sl_history.blockSignals(True)
+        self._sl_history.setRange(0, max(frames - 1, 0))
+        self._sl_history.setValue(max(frames - 1, 0))
+        self._sl_history.blockSignals(False)
+
+        self._lb_history.setText(f'Live, {frames} frames')
+
+    # ----------------------------------------------------------------------
+    def _history_scrolled(self, index):
+        """
+        slot for scrubber: shows frame from history, recording of history is paused until user returns to live
+
+        :param index: int
+        :return: None
+        """
+        history = self._camera_device.history
+        if self._history_index is None:
+            history.pause()
+            self._bt_history_live.setEnabled(True)
+
+        self._history_index = index
+
+        try:
+            frame, info = self._camera_device.get_history_frame(index)
+        except IndexError:
+            self._history_to_live()
+            return
+
+        self._display_frame(frame, info)
+
+        infos = history.get_infos()
+        delay = (info.event_time or info.receive_time or 0) - (infos[-1].event_time or infos[-1].receive_time or 0)
+        self._lb_history.setText(f'#{info.sequence}, {delay:.2f} s')
+
+    # ----------------------------------------------------------------------
+    def _history_to_live(self):
+        """
+        returns from history to live frames
+        :return: None
+        """
+        if self._history_index is not None:
+            self._history_index = None
+            self._camera_device.history.resume()
+
+        self._bt_history_live.setEnabled(False)
+        self._refresh_history_bar()
+
+        if self._camera_device.got_first_frame:
+            self.new_frame()
+
+    # ----------------------------------------------------------------------
+    def close(self):
+        """
+        resumes history recording, if viewer is closed while frame from history is shown
+        :return:
+        """
+        if self._history_index is not None:
+            self._history_index = None
+            self._camera_device.history.resume()
+
+        super(FrameViewer, self).close()
+
+    # ----------------------------------------------------------------------
+    def save_history(self):
+        """
+        saves last frames from history to npy file, frame info - to json file with the same name
+        :return: None
+        """
+        history = self._camera_device.history
+        if history is None:
+            return
+
+        seconds, ok = QtWidgets.QInputDialog.getDouble(self, 'Save frame history', 'Save last, s:',
+                                                       self._history_seconds, 0.01, 3600, 2)
+        if not ok:
+            return
+        self._history_seconds = seconds
+
+        default_name = "history_{}.npy".format(datetime.now().strftime(FILE_STAMP))
+        file_name, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Save frame history",
+                                                             os.path.join(self._save_data_folder, default_name),
+                                                             filter=self.tr("Numpy Files (*.npy)"))
+        file_name = str(file_name).strip()
+        if not file_name:
+            return
+
+        self._save_data_folder = os.path.dirname(file_name)
+        if file_name.lower().endswith('.npy'):
+            file_name = file_name[:-4]
+
+        QtWidgets.QApplication.setOverrideCursor(QtCore.Qt.WaitCursor)
+        try:
+            saved = history.save(file_name, seconds)
+            logger.info(f'{saved} frames of {self._camera_device.device_name} saved to {file_name}.npy')
+        except Exception as err:
+            report_error(err, self)
+        finally:
+            QtWidgets.QApplication.restoreOverrideCursor()
+
     # ----------------------------------------------------------------------
     def _redraw_projections(self):
         """
@@ -543,6 +734,10 @@ class FrameViewer(BaseWidget):
                 self._search_in_progress = False
                 self._save_center_search()
 
+            elif action == self._action_save_history:
+                # history is saved by triggered signal of the action
+                pass
+
             else:
                 self._center_search_points = [None, None]
                 self._action_second_point.setVisible(False)
@@ -675,7 +870,7 @@ class FrameViewer(BaseWidget):
         file_name = file_name.strip()
 
         if file_name:
-            data, scale = self._camera_device.get_frame()  # sync with data acq! TODO
+            data = self._camera_device.get_frame()
 
             if fmt.lower() == "csv":
                 np.savetxt(file_name, data)
@@ -684,6 +879,36 @@ class FrameViewer(BaseWidget):
             else:
                 raise ValueError("Unknown format '{}'".format(fmt))
 
+    # ----------------------------------------------------------------------
+    def start_recording(self):
+        """
+        asks user for file and number of frames and starts continuous recording
+        :return: bool, recording started or not
+        """
+        default_name = "record_{}.h5".format(datetime.now().strftime(FILE_STAMP))
+        file_name, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Record To File",
+                                                             os.path.join(self._save_data_folder, default_name),
+                                                             filter=self.tr("HDF5 Files (*.h5 *.hdf5 *.nxs);;"
+                                                                            "Numpy Files (*.npy)"))
+        file_name = str(file_name).strip()
+        if not file_name:
+            return False
+
+        self._save_data_folder = os.path.dirname(file_name)
+
+        max_frames, ok = QtWidgets.QInputDialog.getInt(self, "Record To File",
+                                                       "Max frames (0 - no limit, only for HDF5):", 0, 0)
+        if not ok:
+            return False
+
+        try:
+            self._camera_device.start_recording(file_name, max_frames)
+        except Exception as err:
+            report_error(err, self, True)
+            return False
+
+        return True
+
     # ---------------------------------------------------------------------- 
     def print_image(self):
         """
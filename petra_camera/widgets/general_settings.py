@@ -8,6 +8,7 @@ from PyQt5 import QtWidgets, QtGui, QtCore
 from petra_camera.utils.functions import get_save_path
 from petra_camera.widgets.camera_settings import CameraSettings
 from petra_camera.widgets.batch_progress import BatchProgress
+from petra_camera.widgets.position_control import REFRESH_PERIOD
 from petra_camera.gui.SettingsDialog_ui import Ui_SettingsDialog
 from petra_camera.utils.tango_utils import TangoDBsInfo
 
@@ -122,6 +123,11 @@ class ProgramSetup(QtWidgets.QDialog):
         self._ui.dsb_cross_size.setValue(float(self._settings.option("center_search", "cross")))
         self._ui.dsb_circle_size.setValue(float(self._settings.option("center_search", "circle")))
 
+        if self._settings.has_node('position_control'):
+            self._ui.dsb_position_refresh.setValue(float(self._settings.option("position_control", "refresh_period")))
+        else:
+            self._ui.dsb_position_refresh.setValue(REFRESH_PERIOD)
+
         self.cameras_settings = self._settings.get_nodes('camera')
 
         self.loader_progress = BatchProgress()
@@ -241,6 +247,8 @@ class ProgramSetup(QtWidgets.QDialog):
         general_options.append(("center_search", (("cross", self._ui.dsb_cross_size.value()),
                                                ("circle", self._ui.dsb_circle_size.value()))))
 
+        general_options.append(("position_control", (("refresh_period", self._ui.dsb_position_refresh.value()),)))
+
 
         cameras_settings = []
         for ind in range(self._ui.tb_cameras.count()):
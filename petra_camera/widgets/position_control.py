@@ -14,11 +14,15 @@ from PyQt5 import QtCore
 
 from petra_camera.widgets.base_widget import BaseWidget
 from petra_camera.gui.PositionControl_ui import Ui_PositionControl
+from petra_camera.utils.settings_poller import refresh_settings
 
 from petra_camera.constants import APP_NAME
 logger = logging.getLogger(APP_NAME)
 
-REFRESH_PERIOD = 1
+REFRESH_PERIOD = 1  # [s], default, could be changed with 'refresh_period' of 'position_control' node in config
+MOVE_DELAY = 100  # [ms], slider position is sent to camera, when slider was not moved for this time
+
+PARAMS = (('pan', float), ('tilt', float), ('focus', int), ('zoom', int))
 
 
 # ----------------------------------------------------------------------
@@ -48,7 +52,18 @@ class PositionControl(BaseWidget):
         for param in ['pan', 'tilt', 'focus', 'zoom']:
             getattr(self._ui, f'sl_pos_{param}').valueChanged.connect(lambda value, x=param: self.move_to_sl(x, value))
 
-        self._position_reader = PositionReader(self._camera_device, self._stop_position_reader)
+        # slider moves are debounced: only the final value of each parameter is sent
+        self._pending_moves = {}
+        self._move_timer = QtCore.QTimer(self)
+        self._move_timer.setSingleShot(True)
+        self._move_timer.timeout.connect(self._send_moves)
+
+        if self._settings.has_node('position_control'):
+            refresh_period = float(self._settings.option('position_control', 'refresh_period'))
+        else:
+            refresh_period = REFRESH_PERIOD
+
+        self._position_reader = PositionReader(self._camera_device, self._stop_position_reader, refresh_period)
         self._position_reader.position_ready.connect(self.display_position)
         self._position_reader.start()
 
@@ -81,50 +96,100 @@ class PositionControl(BaseWidget):
             getattr(self._ui, f'sl_pos_{param}').blockSignals(False)
 
     # ----------------------------------------------------------------------
-    def display_position(self):
+    def display_position(self, position):
+        """
+        slot for position reader
+
+        :param position: dict, param: value
+        :return: None
+        """
         with QtCore.QMutexLocker(self._my_mutex):
             with self.block_signals():
                 for params, decimals in zip([['pan', 'tilt'], ['zoom', 'focus']], [2, 0]):
                     for param in params:
                         for ui in ['sl_pos', 'sb_move']:
-                            if not getattr(self._ui, f'{ui}_{param}').hasFocus():
-                                value = getattr(self._position_reader, f'{param}')
+                            if not getattr(self._ui, f'{ui}_{param}').hasFocus() and param not in self._pending_moves:
+                                value = position[param]
                                 getattr(self._ui, f'{ui}_{param}').setValue(value)
                                 getattr(self._ui, f'gb_{param}').setTitle(f'{param.capitalize()}: {value:.{decimals}f}')
 
     # ----------------------------------------------------------------------
     def move_to_sb(self, param):
+        self._pending_moves.pop(param, None)
         self._camera_device.save_settings(param, getattr(self._ui, f'sb_move_{param}').value())
+        self._position_reader.refresh()
 
     # ----------------------------------------------------------------------
     def move_to_sl(self, param, value):
-        self._camera_device.save_settings(param, value)
+        self._pending_moves[param] = value
+        # restarts timer, so nothing is sent while slider is still moving
+        self._move_timer.start(MOVE_DELAY)
+
+    # ----------------------------------------------------------------------
+    def _send_moves(self):
+        """
+        sends the last slider positions to camera
+        :return: None
+        """
+        moves, self._pending_moves = self._pending_moves, {}
+        for param, value in moves.items():
+            self._camera_device.save_settings(param, value)
+
+        self._position_reader.refresh()
+
+    # ----------------------------------------------------------------------
+    def close(self):
+        """
+        stops position reader
+        :return:
+        """
+        self._move_timer.stop()
+        if self._pending_moves:
+            self._send_moves()
+
+        self._stop_position_reader.set()
+        self._position_reader.refresh()
+        self._position_reader.wait()
+
+        super(PositionControl, self).close()
 
 
 # ----------------------------------------------------------------------
 class PositionReader(QtCore.QThread):
+    """
+    reads camera position with given period (all parameters with one Tango call), emits only changed positions
+    """
 
-    position_ready = QtCore.pyqtSignal()
+    position_ready = QtCore.pyqtSignal(dict)
 
-    def __init__(self, camera_device, stop_request):
+    def __init__(self, camera_device, stop_request, refresh_period=REFRESH_PERIOD):
         super().__init__()
         self._camera_device = camera_device
         self._stop_requested = stop_request
+        self._refresh_period = refresh_period
+
+        self._refresh_request = threading.Event()
+
+        self.position = None
 
-        self.pan = None
-        self.tilt = None
-        self.focus = None
-        self.zoom = None
+    # ----------------------------------------------------------------------
+    def refresh(self):
+        """
+        wakes up reader to read position immediately (e.g. after move)
+        :return: None
+        """
+        self._refresh_request.set()
 
     # ----------------------------------------------------------------------
     def run(self):
         while not self._stop_requested.is_set():
 
-            self.pan = self._camera_device.get_settings('pan', float)
-            self.tilt = self._camera_device.get_settings('tilt', float)
-            self.focus = self._camera_device.get_settings('focus', int)
-            self.zoom = self._camera_device.get_settings('zoom', int)
+            refresh_settings([self._camera_device], [param for param, _ in PARAMS])
+            position = {param: self._camera_device.get_settings(param, cast) for param, cast in PARAMS}
 
-            self.position_ready.emit()
+            if position != self.position:
+                self.position = position
+                self.position_ready.emit(dict(position))
 
-            QtCore.QThread.msleep(REFRESH_PERIOD*1000)
\ No newline at end of file
+            self._refresh_request.wait(self._refresh_period)
+            self._refresh_request.clear()
@@ -4,12 +4,10 @@
 
 """
 """
-import threading
 
 import tango
 import subprocess
 import logging
-import time
 
 from PyQt5 import QtCore, QtWidgets
 from distutils.util import strtobool
@@ -55,14 +53,12 @@ class SettingsWidget(BaseWidget):
         # to prevent double code run
         self._settings_mutex = QtCore.QMutex()
 
-        self._start_settings_read = threading.Event()
-        self._stop_settings_reader = threading.Event()
+        # settings are read by application-wide poller
+        self._settings_poller = self._parent.settings_poller
+        self._settings_poller.settings_ready.connect(self.display_tango_settings)
 
-        self._settings_reader = SettingsReader(self._camera_device,
-                                               self._start_settings_read, self._stop_settings_reader)
-        self._settings_reader.settings_ready.connect(self.display_tango_settings)
-        self._settings_reader.setObjectName(f'{self._camera_device.device_name}_settings_reader')
-        self._settings_reader.start()
+        # settings, changed by other clients, come with Tango events
+        self._camera_device.settings_changed.connect(self._tango_setting_changed)
 
         self._load_camera_settings()
 
@@ -139,7 +135,7 @@ class SettingsWidget(BaseWidget):
             self._ui.rb_sqrt_level.setChecked(self._camera_device.level_mode == 'sqrt')
 
             if self._ui.chk_additional_settings.isChecked() or force_read:
-                self._start_settings_read.set()
+                self._settings_poller.request(self._camera_device, force_read)
 
                 self._ui.chk_auto_screen.setChecked(self._camera_device.auto_screen)
 
@@ -152,18 +148,47 @@ class SettingsWidget(BaseWidget):
             self._block_signals(False)
 
     # ----------------------------------------------------------------------
-    def display_tango_settings(self):
+    def _tango_setting_changed(self, option):
+        """
+        slot for camera device settings_changed signal
+
+        :param option: str, setting name
+        :return: None
+        """
+        if self._ui.chk_additional_settings.isChecked():
+            self._settings_poller.request(self._camera_device)
+
+    # ----------------------------------------------------------------------
+    def display_tango_settings(self, camera_id, values):
+        """
+        slot for settings poller
+
+        :param camera_id: camera, whose settings were read
+        :param values: dict, setting: value
+        :return: None
+        """
+        if camera_id != self._camera_device.camera_id:
+            return
+
+        for ui in ['view_w', 'view_h']:
+            if values[ui] == 0:
+                values[ui] = 1
+
+        if values['FPS'] == 0:
+            values['FPS'] = 25
+        if values['FPSmax'] == 0:
+            values['FPSmax'] = 100
 
         with QtCore.QMutexLocker(self._settings_mutex):
             self.blockSignals(True)
 
             if not self._ui.sb_exposure.hasFocus():
-                self._ui.sb_exposure.setValue(self._settings_reader.exposure_time)
+                self._ui.sb_exposure.setValue(values['exposure'])
 
             if not self._ui.sb_gain.hasFocus():
-                self._ui.sb_gain.setValue(self._settings_reader.gain_value)
+                self._ui.sb_gain.setValue(values['gain'])
 
-            motor_position = self._settings_reader.motor_position
+            motor_position = values['motor_position']
             if motor_position is not None:
                 self._ui.but_in_out.setText('Move Out' if motor_position else 'Move In')
                 self._ui.lb_screen_status.setText('Screen is In' if motor_position else 'Screen is Out')
@@ -171,27 +196,27 @@ class SettingsWidget(BaseWidget):
             for ui in ['view_x', 'view_y']:
                 if not getattr(self._ui, 'sb_{}'.format(ui)).hasFocus():
                     getattr(self._ui, 'sb_{}'.format(ui)).setMaximum(1e6)
-                    getattr(self._ui, 'sb_{}'.format(ui)).setValue(getattr(self._settings_reader, ui))
+                    getattr(self._ui, 'sb_{}'.format(ui)).setValue(values[ui])
 
             for ui in ['view_w', 'view_h']:
                 if not getattr(self._ui, 'sb_{}'.format(ui)).hasFocus():
                     getattr(self._ui, 'sb_{}'.format(ui)).setMaximum(1e6)
-                    getattr(self._ui, 'sb_{}'.format(ui)).setValue(getattr(self._settings_reader, ui))
+                    getattr(self._ui, 'sb_{}'.format(ui)).setValue(values[ui])
 
             self._update_picture_size_limits()
 
             if not self._ui.sb_FPS.hasFocus():
-                self._ui.sb_FPS.setMaximum(self._settings_reader.fps_max)
-                self._ui.sb_FPS.setValue(self._settings_reader.fps)
+                self._ui.sb_FPS.setMaximum(values['FPSmax'])
+                self._ui.sb_FPS.setValue(values['FPS'])
 
             if not self._ui.chk_background.hasFocus():
-                self._ui.chk_background.setChecked(self._settings_reader.background)
+                self._ui.chk_background.setChecked(values['background'])
 
             if not self._ui.dsb_sigmas.hasFocus():
-                self._ui.dsb_sigmas.setValue(self._settings_reader.background_sigmas)
+                self._ui.dsb_sigmas.setValue(values['background_sigmas'])
 
             if not self._ui.sb_reduce.hasFocus():
-                self._ui.sb_reduce.setValue(self._settings_reader.reduce)
+                self._ui.sb_reduce.setValue(values['reduce'])
 
             self._block_signals(False)
 
@@ -460,70 +485,8 @@ class SettingsWidget(BaseWidget):
         """
         logger.debug("Closing Settings Widget")
 
-        self._stop_settings_reader.set()
-        while self._settings_reader.isRunning():
-            time.sleep(0.1)
+        self._settings_poller.settings_ready.disconnect(self.display_tango_settings)
+        self._camera_device.settings_changed.disconnect(self._tango_setting_changed)
+        self._settings_poller.cancel(self._camera_device)
 
         super(SettingsWidget, self).close()
-
-
-# ----------------------------------------------------------------------
-class SettingsReader(QtCore.QThread):
-
-    settings_ready = QtCore.pyqtSignal()
-
-    def __init__(self, camera_device, settings_request, stop_request):
-        super().__init__()
-        self._camera_device = camera_device
-        self._settings_request = settings_request
-        self._stop_request = stop_request
-
-        self.exposure_time = None
-        self.gain_value = None
-        self.motor_position = None
-
-        self.view_x = None
-        self.view_y = None
-        self.view_w = None
-        self.view_h = None
-
-        self.fps = None
-        self.fps_max = None
-
-        self.background = None
-        self.background_sigmas = None
-        self.reduce = None
-
-    # ----------------------------------------------------------------------
-    def run(self):
-        while not self._stop_request.is_set():
-            if self._settings_request.is_set():
-
-                self.exposure_time = self._camera_device.get_settings('exposure', float)
-                self.gain_value = self._camera_device.get_settings('gain', int)
-                self.motor_position = self._camera_device.motor_position()
-
-                for ui in ['view_x', 'view_y']:
-                    setattr(self, ui, self._camera_device.get_settings(ui, int))
-
-                for ui in ['view_w', 'view_h']:
-                    value = self._camera_device.get_settings(ui, int)
-                    if value == 0:
-                        value = 1
-                    setattr(self, ui, value)
-
-                self.fps = self._camera_device.get_settings('FPS', int)
-                self.fps_max = self._camera_device.get_settings('FPSmax', int)
-                if self.fps == 0:
-                    self.fps = 25
-                if self.fps_max == 0:
-                    self.fps_max = 100
-
-                self.background = self._camera_device.get_settings('background', bool)
-                self.background_sigmas = self._camera_device.get_settings('background_sigmas', float)
-                self.reduce = self._camera_device.get_reduction()
-
-                self.settings_ready.emit()
-                self._settings_request.clear()
-
-            QtCore.QThread.msleep(100)
\ No newline at end of file
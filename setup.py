@@ -13,11 +13,12 @@ AUTHOR = 'Yury Matveyev'
 REQUIRES_PYTHON = '>=3.7'
 
 # What packages are required for this module to be executed?
-REQUIRED = ['pyqtgraph', 'psutil', 'numpy', 'scipy',
+REQUIRED = ['pyqtgraph', 'psutil', 'numpy',
 ]
 
-EXTRA_REQUIRED = {'LAMBDA': ['watchdog'],
-                  'PEAK': ['scikit-image']
+EXTRA_REQUIRED = {'LAMBDA': ['watchdog', 'h5py'],
+                  'PEAK': ['scikit-image'],
+                  'HDF5': ['h5py']
                   }
 
 # Import the README and use it as the long-description.
@@ -0,0 +1,65 @@
+# ----------------------------------------------------------------------
+# Author:        yury.matveev@desy.de
+# ----------------------------------------------------------------------
+
+"""
+Tests for folder watcher in newest mode
+"""
+
+import os
+import time
+import threading
+
+import pytest
+
+pytest.importorskip('watchdog')
+
+from petra_camera.utils.folder_watch import FolderWatcher
+
+TIMEOUT = 5  # [s]
+
+
+# ----------------------------------------------------------------------
+def _wait_for(condition):
+    end = time.monotonic() + TIMEOUT
+    while time.monotonic() < end:
+        if condition():
+            return True
+        time.sleep(0.01)
+
+    return condition()
+
+
+# ----------------------------------------------------------------------
+@pytest.mark.parametrize('attempt', range(10))
+def test_nested_makedirs(tmp_path, attempt):
+    """
+    run folder with scan subfolder created at once (mkdir -p run/scan): watcher has to follow the scan folder
+    and report files written there
+    """
+    os.makedirs(tmp_path / 'a')
+
+    files = []
+    got_file = threading.Event()
+
+    def callback(file_name, closed=False):
+        files.append(file_name)
+        got_file.set()
+
+    watcher = FolderWatcher('test', ['*.tif'], callback, mode='newest')
+    watcher.start(str(tmp_path))
+    try:
+        assert watcher.get_folder() == str(tmp_path / 'a')
+
+        scan = tmp_path / 'b' / 's1'
+        os.makedirs(scan)
+
+        assert _wait_for(lambda: watcher.get_folder() == str(scan))
+
+        with open(scan / 'frame_00001.tif', 'wb') as f:
+            f.write(b'0')
+
+        assert got_file.wait(TIMEOUT)
+        assert str(scan / 'frame_00001.tif') in files
+    finally:
+        watcher.stop()